@@ -1,32 +1,132 @@
-"""Application to create CDK Environment Pipeline Stack."""
+"""Application to create CDK Environment Pipeline Stack.
+
+Context keys select what is synthesized, EG:
+    cdk synth -c pipeline=tgw-routes
+    cdk synth -c pipeline=tgw-attachments -c envs=datalake-dev,datalake-prod
+Without them every pipeline and env is synthesized.
+
+With -c parallel=true each selected pipeline is synthesized by its own
+worker process and the cloud assemblies are merged, see lib.parallel_synth.
+
+With -c synth_cache=true env stages whose inputs are unchanged are
+served from .cdk-cache instead of being constructed, see lib.stage_cache.
+
+With a shared assembly, downstream pipelines read the bucket the first
+pipeline creates by its name, deploy the first pipeline stack first.
+
+Every synth writes cdk.out/synth-report.json, timing spans aggregated
+per env, stack and resource type. With -c profile=true cProfile and
+tracemalloc output is written too, with -c verbose=true diagnostics are
+printed, see lib.instrumentation.
+
+After synth each template is checked against its env's StackBudget,
+see lib.template_budget, with -c parallel=true by each worker and their
+reports are merged. -c skip_validation=true skips it as well as
+the fleet validation. Their warnings are recorded as events in the
+synth report, which is written before either check fails synth.
+"""
 
 import aws_cdk as cdk
 
 from cdk_env_pipeline.stacks.pipeline_stack import PipelineStack
-from deploy_config import project, _pipelines
+from deploy_config import fleet, load_envs, project, unallocated_envs, _pipelines
+from lib.cidr_allocator import unallocated_error
+from lib.compiled_config import compiled, split_values
+from lib.fleet_validator import validate_fleet
+from lib.instrumentation import instrumentation
+from lib.pipeline_dag import validate_dag
+
+
+def _context_list(app: cdk.App, key: str, allowed: list) -> list:
+    """Return a comma separated context value as a list, None if unset."""
+    value = app.node.try_get_context(key)
+    if value is None:
+        return None
+    names = list(split_values(value))
+    unknown = [v for v in names if v not in allowed]
+    if unknown:
+        raise ValueError(f"unknown {key} {unknown}, expected one of {allowed}")
+    return names
 
 
 app = cdk.App()
+instrumentation.start(
+    profile=str(app.node.try_get_context("profile")).lower() == "true",
+    verbose=str(app.node.try_get_context("verbose")).lower() == "true"
+)
 region = app.node.try_get_context("region")
+pipeline_selection = _context_list(app, "pipeline", _pipelines)
+selected_pipelines = pipeline_selection or _pipelines
+selected_envs = _context_list(app, "envs", [e.name for e in fleet])
+# with config/ only the files of the selected pipelines and envs are parsed
+load_envs(pipeline_selection, selected_envs)
 
-print("pipelines:", _pipelines)
-for n,p in enumerate(_pipelines): # create pipeline stack for each pipeline
-    pipeline_stack = PipelineStack(
-        app,
-        f"{project.name}-{p}Stack",
-        p,
-        n,
-        env=cdk.Environment(
-            account=project.pipeline.tooling_acct.account,
-            region=project.pipeline.tooling_acct.region
-        )
-    )
-    print()
+# a sized env without its committed cidrs would drop its network stack
+if unallocated_envs:
+    raise ValueError(unallocated_error(unallocated_envs))
+
+# fail on overlapping cidrs or exceeded quotas before any construct is created
+if str(app.node.try_get_context("skip_validation")).lower() != "true":
+    with instrumentation.span("validate_fleet"):
+        report = validate_fleet(compiled().envs)
+    for warning in report.warnings:
+        instrumentation.event("fleet warning", warning=warning)
+    if report.errors:
+        instrumentation.write(app.outdir)
+        raise ValueError(f"invalid fleet config:\n{report.format()}")
+
+if project.pipeline.pipeline_dag:
+    validate_dag(project.pipeline.pipeline_dag, _pipelines)
 
-for tag in project.tags:
-    cdk.Tags.of(pipeline_stack).add(
-        tag.key,
-        tag.value
+instrumentation.event("pipelines", selected=",".join(selected_pipelines))
+
+if str(app.node.try_get_context("parallel")).lower() == "true" and len(selected_pipelines) > 1:
+    from lib.parallel_synth import synth_parallel
+    workers = app.node.try_get_context("synth_workers")
+    reports = synth_parallel(
+        __file__,
+        selected_pipelines,
+        app.outdir,
+        workers=int(workers) if workers else None
     )
+    instrumentation.write(app.outdir, extra={"pipelines": reports})
+else:
+    for n,p in enumerate(_pipelines): # create pipeline stack for each pipeline
+        if p not in selected_pipelines:
+            continue
+        with instrumentation.span("pipeline", pipeline=p):
+            pipeline_stack = PipelineStack(
+                app,
+                f"{project.name}-{p}Stack",
+                p,
+                n,
+                env_names=selected_envs,
+                env=cdk.Environment(
+                    account=project.pipeline.tooling_acct.account,
+                    region=project.pipeline.tooling_acct.region
+                )
+            )
+
+        for tag in project.tags:
+            cdk.Tags.of(pipeline_stack).add(
+                tag.key,
+                tag.value
+            )
+
+    with instrumentation.span("app.synth"):
+        app.synth()
+    from lib.stage_cache import stage_cache
+    stage_cache.store()
 
-app.synth()
+    # fail on templates over their stack budget before any of them is deployed
+    if str(app.node.try_get_context("skip_validation")).lower() != "true":
+        from lib.template_budget import check_assembly, stage_budgets
+        with instrumentation.span("template_budget"):
+            budget_report = check_assembly(app.outdir, stage_budgets(app))
+        budget_report.write(app.outdir)
+        for warning in budget_report.warnings:
+            instrumentation.event("template budget warning", warning=warning)
+        if budget_report.errors:
+            instrumentation.write(app.outdir) # the report shows what the failed synth spent its time on
+            raise ValueError(f"templates over budget:\n{budget_report.format()}")
+    instrumentation.write(app.outdir)
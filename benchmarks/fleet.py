@@ -0,0 +1,130 @@
+"""Module to generate synthetic fleets of CDKTargetAWSEnv.
+
+Builds a CDKProject shaped like deploy_config.py, one network account
+with the transit gateway, one inspection vpc, a tgw-routes env and N
+spoke accounts, each with its own non-overlapping /24 out of 10.0.0.0/8.
+"""
+import ipaddress
+import types
+from typing import List
+
+from lib.pipeline_classes import (
+    GitHub,
+    AWSAccount,
+    Tag,
+    Repo,
+    PipelineApproval
+)
+from lib.cdk_project_classes import (
+    CDKProject,
+    CDKEnvPipeline,
+    CDKTargetAWSEnv
+)
+
+PRJ_NAME = "bench-tgw"
+PIPELINES = ["EnvPipeline", "tgw-attachments", "tgw-routes"]
+SUPERNET = ipaddress.ip_network("10.0.0.0/8")
+ONPREM_CIDR = "172.16.0.0/16,172.17.0.0/16"
+
+
+def _account(n: int) -> str:
+    return f"{100000000000 + n}"
+
+
+def _env(n: int, name: str, **kwargs) -> CDKTargetAWSEnv:
+    return CDKTargetAWSEnv(
+        name=name,
+        aws_acct=AWSAccount(account=_account(n)),
+        approvals=PipelineApproval(approver_email="bench@example.com"),
+        tags=[Tag("environment", name)],
+        **kwargs
+    )
+
+
+def generate_envs(spokes: int) -> List[CDKTargetAWSEnv]:
+    """Return the network, inspection and tgw-routes envs plus spokes."""
+    inspection = next(SUPERNET.subnets(new_prefix=23))
+    cidrs = SUPERNET.subnets(new_prefix=24)
+    next(cidrs), next(cidrs)  # both halves of the inspection /23
+    network_cidr = str(next(cidrs))
+    member_stage = f"{PRJ_NAME}-member-stage"
+
+    envs = [
+        _env(
+            0, "network",
+            pipelines="EnvPipeline,tgw-routes",
+            next_pipeline="tgw-attachments",
+            vpc_cidrs=network_cidr,
+            transit_subnet="28",
+            contiguous="True",
+            org_arn_to_share=(
+                "arn:aws:organizations::100000000000:organization/o-bench"
+            )
+        ),
+        _env(
+            1, "inspection",
+            pipelines="tgw-attachments,tgw-routes",
+            wave=member_stage,
+            overall_cidr=str(SUPERNET),
+            onprem_cidr=ONPREM_CIDR,
+            vpc_cidrs=str(inspection),
+            public_subnet="27",
+            private_subnet=",".join(
+                str(s) for s in list(inspection.subnets(new_prefix=27))[4:7]
+            ),
+            transit_subnet=",".join(
+                str(s) for s in list(inspection.subnets(new_prefix=28))[16:19]
+            )
+        ),
+    ]
+    for n in range(spokes):
+        envs.append(_env(
+            n + 2, f"spoke-{n}",
+            pipelines="tgw-attachments,tgw-routes",
+            next_pipeline="tgw-routes" if n == spokes - 1 else None,
+            wave=member_stage,
+            vpc_cidrs=str(next(cidrs)),
+            private_subnet="26",
+            transit_subnet="28",
+            contiguous="True"
+        ))
+    envs.append(_env(
+        0, "tgw-routes",
+        pipelines="tgw-routes",
+        inspection_cidr=str(inspection)
+    ))
+    return envs
+
+
+def generate_project(spokes: int) -> CDKProject:
+    """Return a CDKProject with a synthetic fleet of spokes."""
+    return CDKProject(
+        name=PRJ_NAME,
+        pipeline=CDKEnvPipeline(
+            github=GitHub(
+                org="bench",
+                repo=Repo(name="bench", branch="main"),
+                connection_id=(
+                    "arn:aws:codestar-connections:ap-southeast-2:"
+                    "100000000000:connection/bench"
+                )
+            ),
+            tooling_acct=AWSAccount(account=_account(0))
+        ),
+        envs=generate_envs(spokes),
+        tags=[Tag("project-name", PRJ_NAME)]
+    )
+
+
+def deploy_config_module(spokes: int) -> types.ModuleType:
+    """Return a stand-in for the deploy_config module."""
+    module = types.ModuleType("deploy_config")
+    module._prj_name = PRJ_NAME
+    module._member_stage = f"{PRJ_NAME}-member-stage"
+    module._pipelines = list(PIPELINES)
+    module.project = generate_project(spokes)
+    module.envs = module.project.envs
+    module.fleet = list(module.envs)
+    module.unallocated_envs = []
+    module.load_envs = lambda pipelines=None, env_names=None: None
+    return module
@@ -0,0 +1,275 @@
+"""Benchmark app.py construction and synth against synthetic fleets.
+
+Each fleet size runs app.py in a fresh worker process, offline: the
+deploy_config module is replaced with a generated fleet, transit gateway
+discovery is stubbed and the attachment registry is given as context.
+Per pipeline, stage and stack it records wall time, peak RSS (python
+plus the jsii node process), construct count and template bytes.
+
+EG: python -m benchmarks.synth_benchmark --sizes 10 100 --output bench.json
+    python -m benchmarks.synth_benchmark --baseline bench.json
+
+Exits 1 when --baseline is given and a run regresses past --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+DEFAULT_SIZES = [10, 100, 1000]
+DEFAULT_OUTPUT = "bench_output.json"
+STUB_TGW_ID = "tgw-0bench000000000000"
+
+# metrics compared against a baseline, lower is better for all of them
+COMPARED = ["construct_s", "synth_s", "peak_rss_kb", "constructs",
+            "template_bytes"]
+
+
+def _peak_rss_kb() -> int:
+    """Peak RSS of this process plus its live children (jsii kernel)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    pid = str(os.getpid())
+    for proc in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if not proc.isdigit():
+            continue
+        try:
+            with open(f"/proc/{proc}/stat") as fp:
+                if fp.read().rsplit(")", 1)[1].split()[1] != pid:
+                    continue
+            with open(f"/proc/{proc}/status") as fp:
+                for line in fp:
+                    if line.startswith("VmHWM:"):
+                        peak += int(line.split()[1])
+        except (OSError, IndexError):
+            continue
+    return peak
+
+
+def _lookup_context(project) -> Dict[str, object]:
+    """Return the attachment registry document for every vpc."""
+    from lib.attachment_registry import (
+        CONTEXT_KEY,
+        SYNCED_KEY,
+        AttachmentRegistry,
+        TgwAttachment,
+        attached_envs,
+        synced_stamp
+    )
+    registry = AttachmentRegistry(
+        TgwAttachment(
+            account=env.aws_acct.account,
+            region=env.aws_acct.region,
+            vpc=env.name,
+            attachment_id=f"tgw-attach-{n:017d}",
+            cidr=env.vpc_cidrs
+        )
+        for n, env in enumerate(attached_envs(project.envs))
+    )
+    return {CONTEXT_KEY: registry.to_document(), SYNCED_KEY: synced_stamp()}
+
+
+def _timed(cls, records: List[dict]) -> None:
+    """Wrap cls.__init__ to record wall time and peak RSS per construct."""
+    original = cls.__init__
+
+    def __init__(self, *args, **kwargs):
+        start = time.perf_counter()
+        original(self, *args, **kwargs)
+        records.append({
+            "construct": self,
+            "wall_s": time.perf_counter() - start,
+            "peak_rss_kb": _peak_rss_kb(),
+        })
+    cls.__init__ = __init__
+
+
+def _worker(spokes: int, output: str) -> None:
+    """Build and synth app.py for one fleet size, write metrics to output."""
+    from benchmarks.fleet import deploy_config_module
+    config = deploy_config_module(spokes)
+    sys.modules["deploy_config"] = config
+
+    from lib import discovery
+    discovery.discovery.tgw_id = lambda account, region, scope=None: STUB_TGW_ID
+
+    outdir = tempfile.mkdtemp(prefix="cdk-bench-")
+    os.environ["CDK_OUTDIR"] = outdir
+    os.environ["CDK_CONTEXT_JSON"] = json.dumps(
+        _lookup_context(config.project)
+    )
+
+    import aws_cdk as cdk
+    from lib.cdk_classes import CDKStack
+    from cdk_env_pipeline.stages.env_deploy_stage import EnvDeployStage
+    from cdk_env_pipeline.stacks.pipeline_stack import PipelineStack
+
+    records = {"pipeline": [], "stage": [], "stack": []}
+    _timed(PipelineStack, records["pipeline"])
+    _timed(EnvDeployStage, records["stage"])
+    _timed(CDKStack, records["stack"])
+
+    timings = {}
+    app_synth = cdk.App.synth
+
+    def synth(self, *args, **kwargs):
+        timings["construct_s"] = time.perf_counter() - timings["start"]
+        start = time.perf_counter()
+        assembly = app_synth(self, *args, **kwargs)
+        timings["synth_s"] = time.perf_counter() - start
+        return assembly
+    cdk.App.synth = synth
+
+    app_py = os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), "app.py")
+    timings["start"] = time.perf_counter()
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            runpy.run_path(app_py, run_name="__main__")
+        finally:
+            sys.stdout = stdout
+
+    def template_bytes(stack) -> int:
+        path = os.path.join(cdk.Stage.of(stack).outdir, stack.template_file)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def metrics(record: dict) -> dict:
+        construct = record["construct"]
+        return {
+            "name": construct.node.path,
+            "wall_s": round(record["wall_s"], 4),
+            "peak_rss_kb": record["peak_rss_kb"],
+            "constructs": len(construct.node.find_all()),
+        }
+
+    stacks = []
+    for record in records["stack"]:
+        stack = metrics(record)
+        stack["template_bytes"] = template_bytes(record["construct"])
+        stacks.append(stack)
+    stages = []
+    for record in records["stage"]:
+        stage = metrics(record)
+        stage["stacks"] = [
+            s for s in stacks if s["name"].startswith(f"{stage['name']}/")
+        ]
+        stage["template_bytes"] = sum(
+            s["template_bytes"] for s in stage["stacks"]
+        )
+        stages.append(stage)
+    pipelines = []
+    for record in records["pipeline"]:
+        pipeline = metrics(record)
+        pipeline["template_bytes"] = template_bytes(record["construct"])
+        pipeline["stages"] = [
+            s for s in stages if s["name"].startswith(f"{pipeline['name']}/")
+        ]
+        pipelines.append(pipeline)
+
+    result = {
+        "spokes": spokes,
+        "envs": len(config.project.envs),
+        "construct_s": round(timings["construct_s"], 4),
+        "synth_s": round(timings["synth_s"], 4),
+        "peak_rss_kb": _peak_rss_kb(),
+        "constructs": sum(p["constructs"] for p in pipelines),
+        "template_bytes": sum(
+            p["template_bytes"] + sum(s["template_bytes"] for s in p["stages"])
+            for p in pipelines
+        ),
+        "pipelines": pipelines,
+    }
+    with open(output, "w") as fp:
+        json.dump(result, fp, indent=2)
+
+
+def run(spokes: int) -> dict:
+    """Run one fleet size in a fresh process and return its metrics."""
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as fp:
+        output = fp.name
+    try:
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.synth_benchmark",
+             "--worker", str(spokes), "--output", output],
+            check=True
+        )
+        with open(output) as fp:
+            return json.load(fp)
+    finally:
+        os.remove(output)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Return a message per metric that regressed past tolerance."""
+    regressions = []
+    base_runs = {r["spokes"]: r for r in baseline["runs"]}
+    for r in results["runs"]:
+        base = base_runs.get(r["spokes"])
+        if base is None:
+            continue
+        for metric in COMPARED:
+            if base[metric] and r[metric] > base[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{r['spokes']} spokes: {metric} {base[metric]} -> "
+                    f"{r[metric]} (+{r[metric] / base[metric] - 1:.0%})"
+                )
+    return regressions
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", help="results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed regression as a fraction EG: 0.2")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker is not None:
+        _worker(args.worker, args.output)
+        return
+
+    results = {
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "runs": [],
+    }
+    for spokes in args.sizes:
+        r = run(spokes)
+        print(f"{spokes:>5} spokes: construct {r['construct_s']:.2f}s "
+              f"synth {r['synth_s']:.2f}s rss {r['peak_rss_kb'] // 1024}MB "
+              f"constructs {r['constructs']} "
+              f"templates {r['template_bytes'] // 1024}KB")
+        results["runs"].append(r)
+    with open(args.output, "w") as fp:
+        json.dump(results, fp, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            regressions = compare(results, json.load(fp), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,18 +16,17 @@ These references can be made by referencing the scope passed
 to this class from it's parent, which is a CDKStage.
 
 """
-from typing import List
+from typing import List, Optional, Tuple
 from lib.cdk_classes import (
     CDKResource,
     CDKStack,
     CDKStage,
 )
 from lib.cdk_resource import CDKResourceDef
-from aws_cdk import (
-    aws_ec2,
-    aws_ram,
-    aws_iam,
-)
+from lib.cidr_utils import summarize_cidrs
+from lib.compiled_config import Network, SubnetSpec
+from lib import attachment_registry, network_manifest
+from aws_cdk import aws_ec2
 import aws_cdk as cdk
 
 
@@ -37,15 +36,18 @@ class NetworkStack(CDKStack):
             self,
             stage: CDKStage,
             id: str,
-            overall_cidr: str,
-            onprem_cidr: str,
-            vpc_cidrs: str,
-            transit_subnet: str,
-            private_subnet: str,
-            public_subnet: str,
-            contiguous: str,
+            overall_cidr: Tuple[Network, ...],
+            onprem_cidr: Tuple[Network, ...],
+            vpc_cidrs: Tuple[Network, ...],
+            transit_subnet: Optional[SubnetSpec],
+            private_subnet: Optional[SubnetSpec],
+            public_subnet: Optional[int],
+            contiguous: bool,
             org_arn_to_share: str,
             tgw_id: str,
+            availability_zones: Tuple[str, ...] = ("a", "b", "c"),
+            tgw_prefix_list: bool = False,
+            network_outputs: str = "exports",
             **kwargs,
     ) -> None:
         self.resource_names = []
@@ -58,6 +60,17 @@ class NetworkStack(CDKStack):
         self.contiguous = contiguous
         self.org_arn_to_share = org_arn_to_share
         self.tgw_id = tgw_id
+        self.az_suffixes = list(availability_zones)  # Stack.availability_zones is read only
+        self.tgw_prefix_list = tgw_prefix_list
+        self.network_outputs = network_outputs
+        if network_manifest.publishes_manifest(network_outputs):
+            self.trailing_resources = 1  # the manifest parameter follows the routes
+        self.manifest = {
+            "version": network_manifest.DOCUMENT_VERSION,
+            "env": stage.target.name,
+            "vpcs": [],
+            "tgw_route_tables": {},
+        }
         self.subnet_config_list = []
         super().__init__(stage, id, **kwargs)
 
@@ -65,13 +78,15 @@ class NetworkStack(CDKStack):
     def _provision_resources(self) -> None:
         super()._provision_resources()        
 
-        for n,vpc_cidr in enumerate(self.vpc_cidrs.split(',')):
+        azs = len(self.az_suffixes) # isolated subnets are private then transit, one per AZ each
+        for n,vpc_cidr in enumerate(str(c) for c in self.vpc_cidrs):
             # provision vpc
             v_name = f"ctvpc-{n}"
             cdk_def = self._get_cdk_def(type="Vpc", module="aws_ec2", name_ref="vpc_id",
                 kargs = {
-                    "cidr": vpc_cidr.strip(),
+                    "cidr": vpc_cidr,
                     "vpc_name": v_name,
+                    "max_azs": azs, # subnet tiers are carved per AZ, see lib.cidr_allocator
                 }
             )
 
@@ -79,20 +94,22 @@ class NetworkStack(CDKStack):
             if self.public_subnet != None:
                 self._append_subnet_config_list(name="public-subnet",
                     sub_type=aws_ec2.SubnetType.PUBLIC,
-                    mask=int(self.public_subnet)
+                    mask=self.public_subnet
                 )
-            if self.private_subnet != None and (len(self.subnet_config_list) == 0 or self.contiguous == "True"):               
+            # subnets given as cidrs, not masks, are provisioned per AZ below
+            if self.private_subnet != None and self.private_subnet.mask != None and (len(self.subnet_config_list) == 0 or self.contiguous):
                 self._append_subnet_config_list(name="private-subnet",
                     sub_type=aws_ec2.SubnetType.PRIVATE_ISOLATED,
-                    mask=int(self.private_subnet)
+                    mask=self.private_subnet.mask
                 )
-            if self.transit_subnet != None and (len(self.subnet_config_list) == 0 or self.contiguous == "True"):
+            if self.transit_subnet != None and self.transit_subnet.mask != None and (len(self.subnet_config_list) == 0 or self.contiguous):
                 self._append_subnet_config_list(name="transit-subnet",
                     sub_type=aws_ec2.SubnetType.PRIVATE_ISOLATED,
-                    mask=int(self.transit_subnet)
+                    mask=self.transit_subnet.mask
                 )
-            if len(self.subnet_config_list) > 0:
-                cdk_def.kargs["subnet_configuration"] = self.subnet_config_list            
+            explicit_subnets = any(s != None and len(s.cidrs) > 0 for s in [self.private_subnet, self.transit_subnet])
+            if len(self.subnet_config_list) > 0 or explicit_subnets:
+                cdk_def.kargs["subnet_configuration"] = self.subnet_config_list
 
             self._provision_resource(f"{v_name}", cdk_def)
             self.resources[f"{v_name}{cdk_def.type}"].resource.add_flow_log("flow_log",
@@ -100,30 +117,30 @@ class NetworkStack(CDKStack):
 
             vpc_resource = self.resources[f"{v_name}{cdk_def.type}"].resource
             self._tag_subnets(subnets=vpc_resource.public_subnets, name="public-subnet")
-            self._tag_subnets(subnets=vpc_resource.isolated_subnets[:-3], name="private-subnet")
-            self._tag_subnets(subnets=vpc_resource.isolated_subnets[-3:], name="transit-subnet")
+            self._tag_subnets(subnets=vpc_resource.isolated_subnets[:-azs], name="private-subnet")
+            self._tag_subnets(subnets=vpc_resource.isolated_subnets[-azs:], name="transit-subnet")
             vpc_id = vpc_resource.vpc_id
-            # cfn output for vpc id
-            cdk.CfnOutput(
-                self,
-                "vpc_id_output",
+            # cfn output for vpc id, the first keeps its original id so its export isn't replaced
+            self._export(
+                id = "vpc_id_output" if n == 0 else f"vpc_id_output_{n}",
                 value = vpc_id,
                 export_name = f"vpc-{n}-id"
             )
 
             private_subnet_ids=[]
-            if self.private_subnet != None and (len(self.subnet_config_list) == 0 or self.contiguous == "True"):
-                private_subnet_ids += [ps.subnet_id for ps in vpc_resource.isolated_subnets[:-3]]
+            if self.private_subnet != None and self.private_subnet.mask != None:
+                private_subnet_ids += [ps.subnet_id for ps in vpc_resource.isolated_subnets[:-azs]]
             transit_subnet_ids=[]
             private_route_table_ids = []
-            if self.contiguous != "True":  # provision subnets for non-contiguous subnets
-                if self.private_subnet.find(",") != -1:
-                    self._provision_subnets(subnet_name="private-subnet",subnet_cidrs=self.private_subnet.split(','), vpc_id=vpc_id,subnet_ids=private_subnet_ids,private_route_table_ids=private_route_table_ids)
-                if self.transit_subnet.find(",") != -1:
-                    self._provision_subnets(subnet_name="transit-subnet",subnet_cidrs=self.transit_subnet.split(','), vpc_id=vpc_id,subnet_ids=transit_subnet_ids,private_route_table_ids=private_route_table_ids)
+            if not self.contiguous:  # provision subnets for non-contiguous subnets
+                if self.private_subnet != None and len(self.private_subnet.cidrs) > 0:
+                    self._provision_subnets(subnet_name="private-subnet",subnet_cidrs=self.private_subnet.cidrs, vpc_id=vpc_id,subnet_ids=private_subnet_ids,private_route_table_ids=private_route_table_ids)
+                if self.transit_subnet != None and len(self.transit_subnet.cidrs) > 0:
+                    self._provision_subnets(subnet_name="transit-subnet",subnet_cidrs=self.transit_subnet.cidrs, vpc_id=vpc_id,subnet_ids=transit_subnet_ids,private_route_table_ids=private_route_table_ids)
 
             # transit gateway
             if self.org_arn_to_share != None: # if network vpc
+                from aws_cdk import aws_iam
                 tgw_name = "Demo-tgw"
                 cdk_def_tgw = self._get_cdk_def(type="CfnTransitGateway", module="aws_ec2", name_ref="attr_id",
                     kargs={
@@ -193,10 +210,10 @@ class NetworkStack(CDKStack):
                     )
                     self._provision_resource(rt, cdk_def_tgw_rt)
                     tgw_rt = self.resources[f"{rt}{cdk_def_tgw_rt.type}"].resource
+                    self.manifest["tgw_route_tables"][f"{rt}-id"] = tgw_rt.ref
                     # cfn output for tgw route table ids
-                    cdk.CfnOutput(
-                        self,
-                        f"{rt}-id-output",
+                    self._export(
+                        id = f"{rt}-id-output",
                         value = tgw_rt.ref,
                         export_name = f"{rt}-id"
                     )
@@ -244,7 +261,7 @@ class NetworkStack(CDKStack):
 
             if self.tgw_id != None:
                 # tgw attachment
-                for ps in vpc_resource.isolated_subnets[-3:]:
+                for ps in vpc_resource.isolated_subnets[-azs:]:
                     transit_subnet_ids.append(ps.subnet_id)
                 tgw_attach_name = "Demo-tgw-attach"
                 appliance_mode_support = "disable"
@@ -263,12 +280,19 @@ class NetworkStack(CDKStack):
                 )
                 self._provision_resource(tgw_attach_name, cdk_def_tgw_attach)
                 cdk_def_tgw_attach_res=self.resources[f"{tgw_attach_name}{cdk_def_tgw_attach.type}"].resource
-                # store tgw attachment id in ssm parameter
+                # store tgw attachment record in ssm parameter, collected by the attachment registry
                 tgw_attach_id = cdk_def_tgw_attach_res.attr_id
-                tgw_attach_ssm_name = "demo-tgw-attach"
+                target = self.stage.target
+                tgw_attach_ssm_name = attachment_registry.parameter_name(target.name)
                 cdk_def_ssm = self._get_cdk_def(type="StringParameter", module="aws_ssm", name_ref="parameter_name", 
                     kargs={
-                        "string_value": f"{tgw_attach_id},{vpc_cidr}",
+                        "string_value": self.to_json_string({
+                            "account": target.aws_acct.account,
+                            "region": target.aws_acct.region,
+                            "vpc": target.name,
+                            "attachment_id": tgw_attach_id,
+                            "cidr": vpc_cidr,
+                        }),
                         "parameter_name": tgw_attach_ssm_name
                     }
                 )
@@ -280,46 +304,40 @@ class NetworkStack(CDKStack):
                
                 if self.public_subnet != None: # if inspection vpc
                     # cfn output for route table ids
-                    for n,i in enumerate(private_route_table_ids[:-3]):
-                        cdk.CfnOutput(
-                            self,
-                            f"private_rt_id_output_{n}",
+                    for n,i in enumerate(private_route_table_ids[:-azs]):
+                        self._export(
+                            id = f"private_rt_id_output_{n}",
                             value = i.strip(),
                             export_name = f"private-rt-id-{n}"
                         )
-                    for n,i in enumerate(private_route_table_ids[-3:]):
-                        cdk.CfnOutput(
-                            self,
-                            f"transit_rt_id_output_{n}",
+                    for n,i in enumerate(private_route_table_ids[-azs:]):
+                        self._export(
+                            id = f"transit_rt_id_output_{n}",
                             value = i.strip(),
                             export_name = f"transit-rt-id-{n}"
                         )
                     for n,i in enumerate(public_route_table_ids):
-                        cdk.CfnOutput(
-                            self,
-                            f"public_rt_id_output_{n}",
+                        self._export(
+                            id = f"public_rt_id_output_{n}",
                             value = i.strip(),
                             export_name = f"public-rt-id-{n}"
                         )
                     # cfn output for subnet ids
                     for n,i in enumerate(private_subnet_ids):
-                        cdk.CfnOutput(
-                            self,
-                            f"private_subnet_id_output_{n}",
+                        self._export(
+                            id = f"private_subnet_id_output_{n}",
                             value = i.strip(),
                             export_name = f"private-subnet-id-{n}"
                         )
                     for n,i in enumerate(transit_subnet_ids):    
-                        cdk.CfnOutput(
-                            self,
-                            f"transit_subnet_id_output_{n}",
+                        self._export(
+                            id = f"transit_subnet_id_output_{n}",
                             value = i.strip(),
                             export_name = f"transit-subnet-id-{n}"
                         )
                     for n,i in enumerate([i.subnet_id for i in vpc_resource.public_subnets]):
-                        cdk.CfnOutput(
-                            self,
-                            f"public_subnet_id_output_{n}",
+                        self._export(
+                            id = f"public_subnet_id_output_{n}",
                             value = i.strip(),
                             export_name = f"public-subnet-id-{n}"
                         )
@@ -327,8 +345,21 @@ class NetworkStack(CDKStack):
                 # routes
                 global_cidr = "0.0.0.0/0"
                 if self.public_subnet != None: # if inspection vpc
-                    tgw_dests = [self.overall_cidr] + [c.strip() for c in self.onprem_cidr.split(',')] # route to tgw for overall aws cidr and on-premises cidr
+                    tgw_dests = summarize_cidrs(str(c) for c in self.overall_cidr + self.onprem_cidr) # route to tgw for overall aws cidr and on-premises cidr, collapsed to the fewest prefixes
+                    if self.tgw_prefix_list: # one prefix list route per route table instead of one route per destination
+                        tgw_dests_pl = self._provision_prefix_list("tgw-dests", tgw_dests)
                     for n,r in enumerate(private_route_table_ids+public_route_table_ids): # route on for private and public route tables
+                        if self.tgw_prefix_list:
+                            cdk_def_route = self._get_cdk_def(type="CfnRoute", module="aws_ec2", name_ref="logical_id",
+                                kargs={
+                                    "route_table_id": r,
+                                    "destination_prefix_list_id": tgw_dests_pl,
+                                    "transit_gateway_id": self.tgw_id
+                                }
+                            )
+                            self._provision_resource(f"tgw{n}-prefix-list", cdk_def_route)
+                            self.resources[f"tgw{n}-prefix-list{cdk_def_route.type}"].resource.add_depends_on(cdk_def_tgw_attach_res)
+                            continue
                         for d in tgw_dests:
                             cdk_def_route = self._get_cdk_def(type="CfnRoute", module="aws_ec2", name_ref="logical_id",
                                 kargs={
@@ -360,6 +391,33 @@ class NetworkStack(CDKStack):
                         self._provision_resource(f"tgw{n}-{global_cidr}", cdk_def_route)
                         self.resources[f"tgw{n}-{global_cidr}{cdk_def_route.type}"].resource.add_depends_on(cdk_def_tgw_attach_res)
 
+            self.manifest["vpcs"].append({
+                "cidr": vpc_cidr,
+                "vpc_id": vpc_id,
+                "private_subnet_ids": private_subnet_ids,
+                "transit_subnet_ids": transit_subnet_ids,
+                "public_subnet_ids": [ps.subnet_id for ps in vpc_resource.public_subnets],
+                "private_route_table_ids": private_route_table_ids,
+                "public_route_table_ids": [ps.route_table.route_table_id for ps in vpc_resource.public_subnets],
+            })
+
+        if network_manifest.publishes_manifest(self.network_outputs):
+            # every id above as one document, read with a single lookup
+            manifest_ssm_name = network_manifest.parameter_name(self.stage.target.name)
+            cdk_def_manifest = self._get_cdk_def(type="StringParameter", module="aws_ssm", name_ref="parameter_name",
+                kargs={
+                    "string_value": self.to_json_string(self.manifest),
+                    "parameter_name": manifest_ssm_name
+                }
+            )
+            self._provision_resource(manifest_ssm_name, cdk_def_manifest)
+
+
+    def _export(self, id: str, value: str, export_name: str) -> None:
+        """Create a CfnOutput export, unless the ids are only published in the manifest."""
+        if network_manifest.publishes_exports(self.network_outputs):
+            self._add_output(id=id, value=value, export_name=export_name)
+
 
     def _append_subnet_config_list(self, name: str, sub_type, mask):
         self.subnet_config_list.append(aws_ec2.SubnetConfiguration(
@@ -371,11 +429,11 @@ class NetworkStack(CDKStack):
 
 
     def _provision_subnets(self, subnet_name, subnet_cidrs, vpc_id: str, subnet_ids, private_route_table_ids):
-        for az,s in zip(["a","b","c"],subnet_cidrs):
+        for az,s in zip(self.az_suffixes,subnet_cidrs):
             cdk_def = self._get_cdk_def(type="PrivateSubnet", module="aws_ec2", name_ref="subnet_id",
                 kargs={
                     "availability_zone": f"{cdk.Stack.of(self).region}{az}",
-                    "cidr_block": s.strip(),
+                    "cidr_block": str(s),
                     "vpc_id": vpc_id
                 }
             )
@@ -387,6 +445,20 @@ class NetworkStack(CDKStack):
             private_route_table_ids.append(subnet.route_table.route_table_id)
 
 
+    def _provision_prefix_list(self, name: str, cidrs: List[str]) -> str:
+        """Create a managed prefix list of cidrs, return its id."""
+        cdk_def_pl = self._get_cdk_def(type="CfnPrefixList", module="aws_ec2", name_ref="attr_prefix_list_id",
+            kargs={
+                "address_family": "IPv4",
+                "max_entries": len(cidrs), # each route referencing the list counts max_entries against the route table quota
+                "prefix_list_name": f"{self._prefix()}-{name}",
+                "entries": [aws_ec2.CfnPrefixList.EntryProperty(cidr=c) for c in cidrs]
+            }
+        )
+        self._provision_resource(name, cdk_def_pl)
+        return self.resources[f"{name}{cdk_def_pl.type}"].resource.attr_prefix_list_id
+
+
     def _tag_subnets(self, subnets, name):
         for s in subnets:
             cdk.Tags.of(s).add("Name", f"{name}-{s.availability_zone}")
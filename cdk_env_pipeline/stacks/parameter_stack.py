@@ -22,11 +22,9 @@ from lib.cdk_classes import (
     CDKStage,
 )
 from lib.cdk_resource import CDKResourceDef
-
-from aws_cdk import aws_ssm as ssm
-
-import boto3
-ec2 = boto3.client('ec2')
+from lib.discovery import DiscoveryError, discovery
+from lib.attachment_registry import LEGACY_PARAMETER, attachment_of, parameter_name
+from lib.instrumentation import instrumentation
 
 
 class ParameterStack(CDKStack):
@@ -40,15 +38,27 @@ class ParameterStack(CDKStack):
     ) -> None:
         self.resource_names = []
         
-        self.tgw_id = None
-        try:
-            tgw = ec2.describe_transit_gateways()['TransitGateways'][0]
-            self.tgw_id = tgw['TransitGatewayId']
-        except:
-            pass
+        # memoized per account/region, so only the first stage looks it up
+        self.tgw_id = discovery.tgw_id(
+            account=stage.target.aws_acct.account,
+            region=stage.target.aws_acct.region,
+            scope=stage
+        )
         
         if stack != None:
-            self.tgw_attach = None
-            self.tgw_attach = ssm.StringParameter.value_from_lookup(scope=stack,parameter_name="demo-tgw-attach")
+            target = stage.target
+            # not a context lookup, the parameter doesn't exist before the
+            # network stage's first deploy and cdk fails unresolved lookups
+            try:
+                values = discovery.ssm_parameters(
+                    target.aws_acct.account, target.aws_acct.region,
+                    [parameter_name(target.name), LEGACY_PARAMETER]
+                )
+            except DiscoveryError as e:
+                instrumentation.event("tgw attachment lookup failed", env=target.name, error=str(e))
+                values = {}
+            self.tgw_attach = attachment_of(
+                target, values, target.aws_acct.account, target.aws_acct.region
+            )
         
         super().__init__(stage, id, **kwargs)
@@ -5,15 +5,7 @@ named deployment environments, and create a separate
 codepipeline for each so that one repo branch per env
 can be deployed independent of each other.
 """
-from aws_cdk import (
-    aws_sns as sns,
-    aws_sns_subscriptions as subscriptions,
-    aws_codestarnotifications as notifications,
-    aws_codecommit as codecommit,
-    aws_chatbot as chatbot,
-    aws_iam as iam,
-
-)
+from aws_cdk import aws_iam as iam
 from constructs import Construct
 from typing import List
 
@@ -36,33 +28,227 @@ from lib.pipeline_classes import (
     PipelineApproval,
     Tag
 )
+from lib.cdk_project_classes import BuildProfile
+from lib.pipeline_dag import FAN_IN_GATE, upstreams
+from lib.prewarm import CHANGED_EXIT_CODE
+from lib import fingerprint, network_manifest, tgw_mesh
+from lib.attachment_registry import AttachmentRegistry
+from lib.discovery import discovery
+from lib.stage_cache import stage_cache
+from lib.compiled_config import compiled
+from lib.instrumentation import instrumentation
 from ..stages.env_deploy_stage import EnvDeployStage
 
 from deploy_config import (
+    fleet,
     project
 )
 
+# dependency caches kept between builds when the build profile has a cache
+CACHE_PATHS = ["/root/.npm/**/*", "/root/.cache/pip/**/*", ".cdk-cache/**/*"]
+ASSEMBLY_KEY = "assembly.zip"  # source and cdk.out the first pipeline last deployed
+ASSEMBLY_PREFIX = "assemblies"  # assemblies/<commit>.zip, staged by the first pipeline's synth
+
+
+def assembly_bucket_name() -> str:
+    """Return the name of the versioned bucket holding the shared assembly."""
+    tooling = project.pipeline.tooling_acct
+    return f"{project.name}-assembly-{tooling.account}-{tooling.region}".lower()
+
 
 class PipelineStack(Stack):
     """Create a self-mutating environment deployment pipeline."""
 
-    def __init__(self, scope: Construct, id: str, pipeline: str, pipeline_num: int, **kwargs) -> None:
-        """Initise the class and construct the pipeline."""
+    def __init__(self, scope: Construct, id: str, pipeline: str, pipeline_num: int, env_names: List[str] = None, **kwargs) -> None:
+        """Initise the class and construct the pipeline.
+
+        env_names limits the deploy stages to those envs, for local synths.
+        """
         super().__init__(scope, id, **kwargs)
-        self.commands = [
-                            "npm install -g aws-cdk",
-                            "pip install -r requirements.txt",
-                            "cdk synth --ignore-errors"
-                        ] # commands to run for synth step
         self.pipeline_env = pipeline
         self.pipeline_num = pipeline_num
+        self.build_profile = project.pipeline.build_profile or BuildProfile()
+        self.commands = self._synth_commands(pipeline)
+        self.env_names = env_names
         self.pipeline_name = f"{project.name}-{pipeline}"
         self.sns_topic = None
+        self.next_pipeline = None
+        self.stages = {} # env name -> (stage, pre steps)
+        self.fingerprints = {} # env name -> fingerprint of stages deployed by this run
+        self.upstreams = upstreams(project.pipeline.pipeline_dag or {}, pipeline)
         self.pipeline = self._create_env_pipeline()
         self._add_environments()
-        if project.pipeline.slackbot:
+        if project.pipeline.slackbot or self.next_pipeline or self.upstreams:
             self.pipeline.build_pipeline()
+        if project.pipeline.slackbot:
             self._add_notifications()
+        if self.next_pipeline:
+            self._add_chaining()
+        if self.upstreams:
+            self._add_dag_triggers()
+
+    def _synth_commands(self, pipeline: str) -> List[str]:
+        """Return commands for the synth step, only this pipeline is synthesized.
+
+        With a shared assembly the first pipeline synthesizes every
+        pipeline and stages the result under its commit, published as
+        ASSEMBLY_KEY once it deployed, see _publish_assembly_step. The
+        others reuse it and only re-synth themselves when lookups
+        changed since, any other prewarm failure fails the build.
+        """
+        commands = []
+        if self.build_profile.image is None: # prebuilt images have the cli and requirements installed
+            cli = "aws-cdk"
+            if self.build_profile.cli_version:
+                cli = f"aws-cdk@{self.build_profile.cli_version}"
+            commands += [
+                f"npm install -g {cli}",
+                "pip install -r requirements.txt",
+            ]
+        synth = "cdk synth"
+        if self.build_profile.cache: # unchanged stages are reused from the cached .cdk-cache
+            synth = "cdk synth -c synth_cache=true"
+        if not project.pipeline.shared_assembly:
+            return commands + [
+                "python -m lib.prewarm", # lookups are prewarmed so synth is one pass
+                f"{synth} -c pipeline={pipeline}"
+            ]
+        if self.pipeline_num == 0:
+            return commands + [
+                "python -m lib.prewarm",
+                synth,
+                "zip -qr /tmp/assembly.zip . -x '.git/*' '.cdk-cache/*'",
+                f"aws s3 cp /tmp/assembly.zip s3://{assembly_bucket_name()}/{ASSEMBLY_PREFIX}/$SOURCE_REVISION.zip"
+            ]
+        return commands + [
+            "status=0; python -m lib.prewarm --check || status=$?; "
+            f"if [ $status -eq {CHANGED_EXIT_CODE} ]; then {synth} -c pipeline={pipeline}; "
+            "elif [ $status -ne 0 ]; then exit $status; "
+            "else echo lookups unchanged, reusing shared assembly; fi"
+        ]
+
+    def _build_settings(self) -> dict:
+        """Return CodeBuildOptions settings for the build profile."""
+        from aws_cdk import aws_codebuild as codebuild
+        profile = self.build_profile
+        settings = {}
+        if profile.image or profile.compute_type:
+            settings["build_environment"] = codebuild.BuildEnvironment(
+                build_image=self._build_image(profile.image) if profile.image else None,
+                compute_type=codebuild.ComputeType[profile.compute_type] if profile.compute_type else None
+            )
+        if profile.cache == "local":
+            settings["cache"] = codebuild.Cache.local(
+                codebuild.LocalCacheMode.CUSTOM,
+                codebuild.LocalCacheMode.DOCKER_LAYER
+            )
+        elif profile.cache:
+            from aws_cdk import aws_s3 as s3
+            settings["cache"] = codebuild.Cache.bucket(
+                s3.Bucket.from_bucket_name(self, f"{self.pipeline_name}BuildCache", profile.cache),
+                prefix=self.pipeline_name
+            )
+        if profile.cache:
+            settings["partial_build_spec"] = codebuild.BuildSpec.from_object(
+                {"cache": {"paths": CACHE_PATHS}}
+            )
+        return settings
+
+    def _publishes_assembly(self) -> bool:
+        return project.pipeline.shared_assembly and self.pipeline_num == 0
+
+    def _assembly_policy(self) -> List[iam.PolicyStatement]:
+        """Return permission to stage and publish the shared assembly from the first pipeline."""
+        if not self._publishes_assembly():
+            return []
+        bucket = f"arn:aws:s3:::{assembly_bucket_name()}"
+        return [
+            iam.PolicyStatement(
+                sid="PublishSharedAssembly",
+                actions=["s3:PutObject", "s3:GetObject"],
+                resources=[f"{bucket}/{ASSEMBLY_KEY}", f"{bucket}/{ASSEMBLY_PREFIX}/*"],
+            )
+        ]
+
+    def _publish_assembly_step(self) -> ShellStep:
+        """Return the step publishing this run's staged assembly once it deployed.
+
+        Downstream pipelines start after this pipeline succeeded and
+        read ASSEMBLY_KEY, a newer run only replaces it after its own
+        deploy, so they never get an assembly that isn't deployed.
+        """
+        bucket = assembly_bucket_name()
+        return ShellStep("publish-assembly",
+            env={"SOURCE_REVISION": self.source.source_attribute("CommitId")},
+            commands=[
+                f"aws s3 cp s3://{bucket}/{ASSEMBLY_PREFIX}/$SOURCE_REVISION.zip s3://{bucket}/{ASSEMBLY_KEY}"
+            ]
+        )
+
+    def _fingerprint_policy(self) -> List[iam.PolicyStatement]:
+        """Return permission to record deployed stage fingerprints."""
+        if not project.pipeline.change_aware:
+            return []
+        return [
+            iam.PolicyStatement(
+                sid="RecordStageFingerprints",
+                actions=["ssm:PutParameter"],
+                resources=[self.format_arn(
+                    service="ssm",
+                    resource="parameter",
+                    resource_name=f"{project.name}/fingerprints/{self.pipeline_env}/*"
+                )],
+            )
+        ]
+
+    def _assembly_source(self) -> CodePipelineSource:
+        """Return the shared assembly bucket as source, creating it in the first pipeline."""
+        from aws_cdk import (
+            aws_codepipeline_actions as codepipeline_actions,
+            aws_s3 as s3,
+            Duration,
+        )
+        if self.pipeline_num == 0:
+            s3.Bucket(
+                self,
+                f"{project.name}-SharedAssembly",
+                bucket_name=assembly_bucket_name(),
+                versioned=True,
+                encryption=s3.BucketEncryption.S3_MANAGED,
+                block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+                enforce_ssl=True,
+                lifecycle_rules=[s3.LifecycleRule(
+                    noncurrent_version_expiration=Duration.days(30)
+                )]
+            )
+            return None
+        bucket = s3.Bucket.from_bucket_name(
+            self,
+            f"{project.name}-SharedAssembly",
+            assembly_bucket_name()
+        )
+        return CodePipelineSource.s3(
+            bucket,
+            ASSEMBLY_KEY,
+            trigger=codepipeline_actions.S3Trigger.NONE # started by the upstream pipeline
+        )
+
+    def _build_image(self, image: str):
+        """Return a build image for an ECR or docker registry image uri."""
+        from aws_cdk import aws_codebuild as codebuild
+        if ".dkr.ecr." not in image:
+            return codebuild.LinuxBuildImage.from_docker_registry(image)
+        from aws_cdk import aws_ecr as ecr
+        registry, _, name = image.partition("/")
+        name, _, tag = name.partition(":")
+        account = registry.split(".")[0]
+        region = registry.split(".")[3]
+        repo = ecr.Repository.from_repository_arn(
+            self,
+            f"{self.pipeline_name}SynthImage",
+            f"arn:aws:ecr:{region}:{account}:repository/{name}"
+        )
+        return codebuild.LinuxBuildImage.from_ecr_repository(repo, tag or "latest")
 
     def _create_env_pipeline(self) -> CodePipeline:
         """Create a self mutating cdk pipeline."""
@@ -70,6 +256,7 @@ class PipelineStack(Stack):
         if not source:
             assert("No source config defined for pipeline.")
             exit(1)
+        self.source = source
 
         code_build_defaults = CodeBuildOptions(
             role_policy=[
@@ -77,18 +264,23 @@ class PipelineStack(Stack):
                     sid="EC2DescribeTransitGateways",
                     actions=["ec2:DescribeTransitGateways",
                         "ec2:DescribeTransitGatewayAttachments",
+                        "ec2:DescribeTransitGatewayPeeringAttachments",
+                        "ssm:GetParameters",
+                        "cloudformation:ListExports",
                         "sts:AssumeRole",
                         "codepipeline:StartPipelineExecution"
                     ],
                     resources=["*"],
                 )
-            ] # add permissions for cdk synth
-        )
+            ] + self._assembly_policy() + self._fingerprint_policy(), # add permissions for cdk synth
+            **self._build_settings()
+        ) # applies to synth, self-mutate, asset and deploy step actions
 
         synth = ShellStep(
             "Synth",
             input=source,
-            commands=self.commands
+            commands=self.commands,
+            env={"SOURCE_REVISION": source.source_attribute("CommitId")} if self._publishes_assembly() else None
             #primary_output_directory="member/cdk.out"
         )
 
@@ -98,11 +290,17 @@ class PipelineStack(Stack):
             pipeline_name=self.pipeline_name,
             synth=synth,
             code_build_defaults=code_build_defaults,
+            cli_version=self.build_profile.cli_version,
+            publish_assets_in_parallel=self.build_profile.publish_assets_in_parallel,
             cross_account_keys=True
         )
 
     def _add_notifications(self) -> None:
         """Add chatbot notications for Slack."""
+        from aws_cdk import (
+            aws_chatbot as chatbot,
+            aws_codestarnotifications as notifications,
+        )
         slackbot = project.pipeline.slackbot
         keys = ['channel', 'workspace_id', 'channel_id']
         for key in keys:
@@ -122,65 +320,249 @@ class PipelineStack(Stack):
             detail_type=notifications.DetailType.BASIC
         )
 
+    def _add_chaining(self) -> None:
+        """Start next_pipeline from an EventBridge rule when this pipeline succeeds."""
+        from aws_cdk import (
+            aws_codepipeline as codepipeline,
+            aws_events as events,
+            aws_events_targets as targets,
+        )
+        next_name = f"{project.name}-{self.next_pipeline}"
+        next_pipeline = codepipeline.Pipeline.from_pipeline_arn(
+            self,
+            f"{next_name}Import",
+            self.format_arn(service="codepipeline", resource=next_name)
+        )
+        self.pipeline.pipeline.on_state_change(
+            f"{self.pipeline_name}Chain",
+            target=targets.CodePipeline(next_pipeline),
+            event_pattern=events.EventPattern(detail={"state": ["SUCCEEDED"]})
+        )
+
+    def _add_dag_triggers(self) -> None:
+        """Start this pipeline once its pipeline_dag upstreams have succeeded."""
+        from aws_cdk import (
+            aws_codepipeline as codepipeline,
+            aws_events as events,
+            aws_events_targets as targets,
+        )
+        names = [f"{project.name}-{u}" for u in self.upstreams]
+        upstream_pipelines = [
+            codepipeline.Pipeline.from_pipeline_arn(
+                self,
+                f"{name}Upstream",
+                self.format_arn(service="codepipeline", resource=name)
+            )
+            for name in names
+        ]
+        if len(upstream_pipelines) == 1:
+            target = targets.CodePipeline(self.pipeline.pipeline)
+        else: # fan-in, the gate starts this pipeline after the last upstream
+            target = targets.LambdaFunction(self._fan_in_gate(names))
+        for name, upstream in zip(names, upstream_pipelines):
+            upstream.on_state_change(
+                f"{self.pipeline_name}After{name}",
+                target=target,
+                event_pattern=events.EventPattern(detail={"state": ["SUCCEEDED"]})
+            )
+
+    def _fan_in_gate(self, names: List[str]):
+        """Return a function that starts this pipeline once all of names succeeded."""
+        from aws_cdk import aws_lambda as lambda_, Duration
+        gate = lambda_.Function(
+            self,
+            f"{self.pipeline_name}FanInGate",
+            runtime=lambda_.Runtime.PYTHON_3_11,
+            handler="index.handler",
+            code=lambda_.Code.from_inline(FAN_IN_GATE),
+            timeout=Duration.seconds(30),
+            reserved_concurrent_executions=1, # upstreams finishing together are checked in turn
+            environment={
+                "UPSTREAMS": ",".join(names),
+                "DOWNSTREAM": self.pipeline_name,
+                "STATE_PARAMETER": self._fan_in_state_parameter(),
+            }
+        )
+        gate.add_to_role_policy(iam.PolicyStatement(
+            actions=["codepipeline:ListPipelineExecutions"],
+            resources=[
+                self.format_arn(service="codepipeline", resource=name)
+                for name in names
+            ]
+        ))
+        gate.add_to_role_policy(iam.PolicyStatement(
+            actions=["codepipeline:StartPipelineExecution"],
+            resources=[self.pipeline.pipeline.pipeline_arn]
+        ))
+        gate.add_to_role_policy(iam.PolicyStatement(
+            actions=["ssm:GetParameter", "ssm:PutParameter"],
+            resources=[self.format_arn(
+                service="ssm",
+                resource="parameter",
+                resource_name=self._fan_in_state_parameter().lstrip("/")
+            )]
+        ))
+        return gate
+
+    def _fan_in_state_parameter(self) -> str:
+        """Return the SSM parameter the gate keeps the upstream executions it started after in."""
+        return f"/{project.name}/fan-in/{self.pipeline_env}"
+
     def _add_environments(self):
         """Add each env in config as a deploy stage."""
-        waves = []
-        wave = None
-        print("pipeline:", self.pipeline_env)
-        envs = []
-        for env_def in project.envs:
-            # if not first pipeline, pipeline has to be defined in config file 
-            if env_def.skip or env_def.aws_acct.account == "" or \
-            (self.pipeline_num != 0 and env_def.pipelines == None) or \
-            (env_def.pipelines != None and self.pipeline_env not in env_def.pipelines.split(',')):
+        instrumentation.event("pipeline", pipeline=self.pipeline_env)
+        # if not first pipeline, pipeline has to be defined in config file, see lib.compiled_config
+        envs = [
+            e.source for e in compiled().pipeline_envs(self.pipeline_env, self.env_names)
+        ]
+        loaded = {id(e) for e in project.envs}
+        unloaded = [e.name for e in envs if id(e) not in loaded]
+        if unloaded: # envs built from the config index only have their fleet fields
+            raise ValueError(f"{self.pipeline_env} envs {unloaded} aren't loaded, see deploy_config.load_envs")
+        # next_pipeline is taken from the last env of the pipeline
+        post_env = envs[-1] if envs else None
+        finalize = []
+        if project.pipeline.change_aware: # unchanged stages are left out, so chain and record from a final wave
+            envs = self._changed_envs(envs)
+            if self.fingerprints:
+                finalize.append(ShellStep("record-fingerprints",
+                    commands=fingerprint.record_commands(project.name, self.pipeline_env, self.fingerprints)
+                ))
+        if self._publishes_assembly(): # downstream pipelines read it, so publish before chaining
+            finalize.append(self._publish_assembly_step())
+        if project.pipeline.change_aware or finalize:
+            finalize += (post_env and self._next_pipeline_post(post_env)) or []
+            post_env = None
+        names = [e.name for e in envs]
+        if project.pipeline.waves == "auto":
+            waves = compiled().dependency_waves(self.pipeline_env, names)
+        else:
+            waves = compiled().labelled_waves(self.pipeline_env, names)
+        self._add_waves(waves, post_env)
+        if finalize:
+            self.pipeline.add_wave(f"{self.pipeline_env}-finalize", post=finalize)
+
+    def _changed_envs(self, envs: list) -> list:
+        """Return envs whose stage fingerprint differs from its last deploy."""
+        recorded = self.node.try_get_context(fingerprint.context_key(self.pipeline_env)) or {}
+        changed = []
+        for env_def in envs:
+            env_stage, _ = self._env_stage(env_def)
+            stage_fingerprint = fingerprint.stage_fingerprint(env_stage)
+            if recorded.get(env_def.name) == stage_fingerprint:
+                instrumentation.event("unchanged since last deploy, skipped", env=env_def.name)
+                self.node.try_remove_child(env_stage.node.id)
                 continue
-            envs.append(env_def)
-        for count,env_def in enumerate(envs):
-            env_stage = EnvDeployStage(
-                scope=self,
-                id=f"{project.name}-{env_def.name}-stage",
-                env=Environment(
-                    account=env_def.aws_acct.account,
-                    region=env_def.aws_acct.region
-                ),
-                target=env_def
-            )
-            self._tag_stage(
-                stage=env_stage,
-                extra_tags=env_def.tags)
-            
-            pre_app = self._stage_approval(
-                        stage_name=env_def.name,
-                        approvals=env_def.approvals,
-                        stage=env_stage
-                      )
-
-            # trigger next pipeline if last step and nextpipeline specified
-            if count != len(envs)-1 or env_def.next_pipeline == None: post = None
-            else:
-                post = [ShellStep(f"execute {env_def.next_pipeline}",
-                            commands=[f"aws codepipeline start-pipeline-execution --name {project.name}-{env_def.next_pipeline}"]
-                        )]
-                
-            if env_def.wave == None:
-                self.pipeline.add_stage(
-                    env_stage,
-                    pre=pre_app,
-                    post=post
-                )
+            self.fingerprints[env_def.name] = stage_fingerprint
+            changed.append(env_def)
+        return changed
+
+    def _add_waves(self, waves: list, post_env) -> None:
+        """Add waves in order, see CompiledConfig.labelled_waves and dependency_waves."""
+        for n,wave_def in enumerate(waves):
+            # trigger next pipeline once the last wave has finished
+            post = None
+            if n == len(waves)-1 and post_env is not None:
+                post = self._next_pipeline_post(post_env)
+            if wave_def.name == None:
+                env_stage, pre_app = self._env_stage(wave_def.envs[0].source)
+                self.pipeline.add_stage(env_stage, pre=pre_app, post=post)
+                continue
+            wave = self.pipeline.add_wave(wave_def.name, post=post)
+            for env in wave_def.envs:
+                env_stage, pre_app = self._env_stage(env.source)
+                wave.add_stage(env_stage, pre=pre_app)
+
+    def _env_stage(self, env_def) -> tuple:
+        """Return the deploy stage of an env and its pre-approval steps."""
+        if env_def.name in self.stages:
+            return self.stages[env_def.name]
+        key = self._stage_cache_key(env_def)
+        cached = key and stage_cache.lookup(key)
+        stage_kwargs = dict(
+            scope=self,
+            id=f"{project.name}-{env_def.name}-stage",
+            env=Environment(
+                account=env_def.aws_acct.account,
+                region=env_def.aws_acct.region
+            ),
+            target=env_def
+        )
+        with instrumentation.span("stage", env=env_def.name, pipeline=self.pipeline_env):
+            if cached:
+                from ..stages.cached_stage import CachedStage
+                env_stage = CachedStage(cached=cached, **stage_kwargs)
             else:
-                if env_def.wave not in waves:
-                    waves.append(env_def.wave)
-                    wave = self.pipeline.add_wave(env_def.wave)
-                wave.add_stage(
-                    env_stage,
-                    pre=pre_app,
-                    post=post
-                )
+                env_stage = EnvDeployStage(**stage_kwargs)
+        instrumentation.count("stage", "cached" if cached else "built")
+        if not cached and key:
+            stage_cache.add(env_stage, key, fingerprint.stack_source_hash(env_stage))
+        self._tag_stage(
+            stage=env_stage,
+            extra_tags=env_def.tags)
+        
+        pre_app = self._stage_approval(
+                    stage_name=env_def.name,
+                    approvals=env_def.approvals,
+                    stage=env_stage
+                  )
+        self.stages[env_def.name] = (env_stage, pre_app)
+        return env_stage, pre_app
+
+    def _stage_cache_key(self, env_def) -> str:
+        """Return the synth cache key of an env's stage, None if it can't be cached."""
+        if not stage_cache.enabled(self):
+            return None
+        routes = compiled().env(env_def).routes
+        if (env_def.vpc_cidrs != None or routes) and AttachmentRegistry.from_context(self) is None:
+            return None # stages feeding or reading per-stage attachment lookups are always built
+        tgw_id = None
+        places = []
+        inputs = {"network_outputs": project.pipeline.network_outputs}
+        if env_def.vpc_cidrs != None:
+            tgw_id = discovery.tgw_id(
+                account=env_def.aws_acct.account,
+                region=env_def.aws_acct.region,
+                scope=self
+            )
+            # hubs read the mesh and the tgw ids of their peer regions
+            peerings = tgw_mesh.hub_peerings(compiled().envs, env_def.name)
+            if peerings:
+                places = [(p.account, p.peer_region(env_def.aws_acct.region)) for p in peerings]
+                inputs["peerings"] = peerings
+                inputs["region_cidrs"] = tgw_mesh.region_cidrs(compiled().envs)
+        if routes:
+            inputs["tgw_owners"] = network_manifest.tgw_owner_envs(
+                fleet, env_def.aws_acct.account, env_def.aws_acct.region
+            )
+        return stage_cache.key(
+            self,
+            env_def,
+            tags=project.tags,
+            tgw_id=tgw_id,
+            registry=routes,
+            places=places,
+            inputs=inputs,
+        )
+
+    def _next_pipeline_post(self, env_def) -> list:
+        """Return the post step starting env_def's next_pipeline, if any."""
+        if env_def.next_pipeline == None or project.pipeline.pipeline_dag: return None # dag triggers replace next_pipeline
+        if project.pipeline.chaining == "events": # started by _add_chaining
+            self.next_pipeline = env_def.next_pipeline
+            return None
+        return [ShellStep(f"execute {env_def.next_pipeline}",
+                    commands=[f"aws codepipeline start-pipeline-execution --name {project.name}-{env_def.next_pipeline}"]
+                )]
 
     def _get_pipeline_source(self) -> CodePipelineSource:
         """Return repo source from config."""
-        if self.pipeline_num != 0: trigger_on_push = False # trigger on push only if it's the first pipeline
+        if project.pipeline.shared_assembly:
+            source = self._assembly_source()
+            if source:
+                return source
+        if project.pipeline.pipeline_dag: trigger_on_push = not self.upstreams # dag roots trigger on push
+        elif self.pipeline_num != 0: trigger_on_push = False # trigger on push only if it's the first pipeline
         else: trigger_on_push = True
         if project.pipeline.github:
             github = project.pipeline.github
@@ -191,6 +573,7 @@ class PipelineStack(Stack):
                 trigger_on_push=trigger_on_push
             )
         if project.pipeline.codecommit:
+            from aws_cdk import aws_codecommit as codecommit
             code_repo = project.pipeline.codecommit.repo
             repo = codecommit.Repository.from_repository_name(
                 self,
@@ -249,6 +632,10 @@ class PipelineStack(Stack):
     def _set_sns_topic(self, email: str) -> None:
         """Create a sns topic."""
         if email != '' and not self.sns_topic:
+            from aws_cdk import (
+                aws_sns as sns,
+                aws_sns_subscriptions as subscriptions,
+            )
             self.sns_topic = sns.Topic(
                 self,
                 f"{project.name}-PipelineApprovals"
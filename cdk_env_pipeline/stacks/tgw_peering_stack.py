@@ -0,0 +1,125 @@
+"""Module to create a Transit Gateway Peering Stack.
+
+CDKStack has a _provison_resources() method called from
+__init__(). This uses naming conventions and references
+to CDKResource definitions to create the actual CDK resources.
+
+Much of the functionality is generic rinse and repeat that
+doesn't need a specific class to execute, when it's only the
+names of things that change, or pointing to another resource.
+
+This class can be inherited and the _provision_resources method
+overridden to provision resources that need a lot of cross
+referencing to other objects like buckets, roles etc.
+
+These references can be made by referencing the scope passed
+to this class from it's parent, which is a CDKStage.
+
+"""
+from typing import Dict, Iterable, List
+from lib.cdk_classes import (
+    CDKStack,
+    CDKStage,
+)
+from lib.discovery import discovery
+from lib.instrumentation import instrumentation
+from lib.tgw_mesh import Peering
+import aws_cdk as cdk
+
+
+class TgwPeeringStack(CDKStack):
+    """Create a stack for the peering attachments and routes of a regional hub"""
+    def __init__(
+            self,
+            stage: CDKStage,
+            id: str,
+            tgw_id: str,
+            peerings: Iterable[Peering],
+            region_cidrs: Dict[str, List[str]],
+            route_tables: Dict[str, str],
+            **kwargs,
+    ) -> None:
+        self.resource_names = []
+        self.tgw_id = tgw_id
+        self.peerings = list(peerings)
+        self.region_cidrs = region_cidrs
+        self.route_tables = route_tables  # egress-rt-id and inspection-rt-id of this hub
+
+        super().__init__(stage, id, **kwargs)
+
+
+    def _provision_resources(self) -> None:
+        super()._provision_resources()
+
+        target = self.stage.target
+        region = target.aws_acct.region
+        available = discovery.tgw_peerings(target.aws_acct.account, region, scope=self)
+        for peering in self.peerings:
+            peer_region = peering.peer_region(region)
+            if peering.requester_region == region: # request the peering and accept it in the peer region
+                peer_tgw_id = discovery.tgw_id(peering.account, peer_region, scope=self)
+                if peer_tgw_id is None:
+                    instrumentation.event("peer tgw not deployed yet, peering skipped", env=target.name, peer_region=peer_region)
+                    continue
+                self._provision_peering(peering, peer_region, peer_tgw_id)
+
+            attach_id = available.get(peer_region)
+            if attach_id is None: # routes are added by the first synth after the peering is accepted
+                instrumentation.event("tgw peering not available yet, routes skipped", env=target.name, peer_region=peer_region)
+                continue
+            self._provision_peering_routes(peer_region, attach_id)
+
+
+    def _provision_peering(self, peering: Peering, peer_region: str, peer_tgw_id: str):
+        name = f"peering-{peer_region}"
+        cdk_def_peering = self._get_cdk_def(type="CfnTransitGatewayPeeringAttachment", module="aws_ec2", name_ref="attr_transit_gateway_attachment_id",
+            kargs={
+                "transit_gateway_id": self.tgw_id,
+                "peer_transit_gateway_id": peer_tgw_id,
+                "peer_account_id": peering.account,
+                "peer_region": peer_region,
+                "tags": [cdk.CfnTag(
+                    key="Name",
+                    value=f"tgw-peering-{peering.requester_region}-{peer_region}"
+                )]
+            }
+        )
+        self._provision_resource(name, cdk_def_peering)
+        attach_id = self.resources[f"{name}{cdk_def_peering.type}"].name
+
+        # peering attachments aren't auto accepted, accept it in the peer region
+        from aws_cdk import custom_resources as cr
+        cr.AwsCustomResource(self, f"{name}-accept",
+            on_create=cr.AwsSdkCall(
+                service="EC2",
+                action="acceptTransitGatewayPeeringAttachment",
+                parameters={"TransitGatewayAttachmentId": attach_id},
+                region=peer_region,
+                physical_resource_id=cr.PhysicalResourceId.of(attach_id)
+            ),
+            policy=cr.AwsCustomResourcePolicy.from_sdk_calls(
+                resources=cr.AwsCustomResourcePolicy.ANY_RESOURCE
+            )
+        )
+
+
+    def _provision_peering_routes(self, peer_region: str, attach_id: str):
+        # traffic from the peer region is routed to this region's vpcs by inspection-rt
+        cdk_def_rtass = self._get_cdk_def(type="CfnTransitGatewayRouteTableAssociation", module="aws_ec2", name_ref="logical_id",
+            kargs = {
+                "transit_gateway_attachment_id" : attach_id,
+                "transit_gateway_route_table_id" : self.route_tables["inspection-rt-id"]
+            }
+        )
+        self._provision_resource(f"peering-{peer_region}-rtass", cdk_def_rtass)
+
+        for rt in ["egress-rt", "inspection-rt"]:
+            for cidr in self.region_cidrs.get(peer_region, []): # route to the peer region's vpcs
+                cdk_def_rtroute = self._get_cdk_def(type="CfnTransitGatewayRoute", module="aws_ec2", name_ref="logical_id",
+                    kargs = {
+                        "transit_gateway_attachment_id" : attach_id,
+                        "destination_cidr_block" : cidr,
+                        "transit_gateway_route_table_id" : self.route_tables[f"{rt}-id"]
+                    }
+                )
+                self._provision_resource(f"peering-{peer_region}-{rt}-{cidr}", cdk_def_rtroute)
@@ -16,17 +16,19 @@ These references can be made by referencing the scope passed
 to this class from it's parent, which is a CDKStage.
 
 """
-from typing import List
+import ipaddress
+from typing import Iterable, Optional
+from lib.attachment_registry import TgwAttachment
 from lib.cdk_classes import (
     CDKResource,
     CDKStack,
     CDKStage,
 )
 from lib.cdk_resource import CDKResourceDef
-from aws_cdk import (
-    aws_ec2,
-    aws_ram,
-)
+from lib import network_manifest
+from lib.compiled_config import Network
+from lib.prewarm import route_tables_context_key
+from lib.instrumentation import instrumentation
 import aws_cdk as cdk
 
 
@@ -36,13 +38,18 @@ class TgwRoutesStack(CDKStack):
             self,
             stage: CDKStage,
             id: str,
-            inspection_cidr: str,
-            shared_infra_tgw_attach : List[str],
+            inspection_cidr: Optional[Network],
+            attachments: Iterable[TgwAttachment],
+            network_outputs: str = "exports",
+            tgw_owners: Iterable[str] = (),
             **kwargs,
     ) -> None:
         self.resource_names = []
         self.inspection_cidr = inspection_cidr
-        self.shared_infra_tgw_attach = shared_infra_tgw_attach
+        self.attachments = list(attachments)
+        self.network_outputs = network_outputs
+        self.tgw_owners = list(tgw_owners)
+        self._lookup_pending = False
       
         super().__init__(stage, id, **kwargs)
 
@@ -50,27 +57,65 @@ class TgwRoutesStack(CDKStack):
     def _provision_resources(self) -> None:
         super()._provision_resources()
         
-        egress_rt_id = cdk.Fn.import_value("egress-rt-id")
-        inspection_rt_id = cdk.Fn.import_value("inspection-rt-id")
-        print("egress_rt_id:", egress_rt_id)
-        print("inspection_rt_id:", inspection_rt_id)
-
-        for attach in self.shared_infra_tgw_attach:
-            try:
-                attach_id = attach.split(',')[0].strip()
-                vpc_cidr = attach.split(',')[1].strip()
-                global_cidr = "0.0.0.0/0"
-                
-                if vpc_cidr == self.inspection_cidr: # create association on inspection vpc route table and route to inspection vpc on egress route table
-                    self._provision_tgw_rt_ass(attach_id=attach_id, ass_table_id=inspection_rt_id)
-                    self._provision_tgw_rt_route(attach_id=attach_id, vpc_cidr=global_cidr, rt_table_id=egress_rt_id)
-                else: # create association on egress route table for spoke vpcs and route to vpc on inspection vpc route table
-                    self._provision_tgw_rt_ass(attach_id=attach_id, ass_table_id=egress_rt_id)
-                    self._provision_tgw_rt_route(attach_id=attach_id, vpc_cidr=vpc_cidr, rt_table_id=inspection_rt_id)
-            except IndexError:
-                pass
+        # route table ids resolved by lib.prewarm, else read from the network
+        # manifests, else imported at deploy time while exports are published
+        target = self.stage.target
+        route_tables = self.node.try_get_context(
+            route_tables_context_key(target.aws_acct.account, target.aws_acct.region)
+        ) or self._manifest_route_tables()
+        egress_rt_id = self._route_table_id(route_tables, "egress-rt-id")
+        inspection_rt_id = self._route_table_id(route_tables, "inspection-rt-id")
+        instrumentation.event("tgw route tables", egress_rt_id=egress_rt_id, inspection_rt_id=inspection_rt_id)
+
+        global_cidr = "0.0.0.0/0"
+        for attach in self.attachments:
+            attach_id = attach.attachment_id
+            if ipaddress.ip_network(attach.cidr) == self.inspection_cidr: # create association on inspection vpc route table and route to inspection vpc on egress route table
+                self._provision_tgw_rt_ass(attach_id=attach_id, ass_table_id=inspection_rt_id)
+                self._provision_tgw_rt_route(attach_id=attach_id, vpc_cidr=global_cidr, rt_table_id=egress_rt_id)
+            else: # create association on egress route table for spoke vpcs and route to vpc on inspection vpc route table
+                self._provision_tgw_rt_ass(attach_id=attach_id, ass_table_id=egress_rt_id)
+                self._provision_tgw_rt_route(attach_id=attach_id, vpc_cidr=attach.cidr, rt_table_id=inspection_rt_id)
 
     
+    def _manifest_route_tables(self) -> dict:
+        """Look up the manifest of the tgw owner, {} if not published."""
+        if not network_manifest.publishes_manifest(self.network_outputs):
+            return {}
+        if len(self.tgw_owners) > 1:
+            raise ValueError(
+                f"{self.stage.target.name}: {self.tgw_owners} own a transit gateway "
+                "in the same account and region, expected one"
+            )
+        from aws_cdk import aws_ssm as ssm
+        values = [
+            ssm.StringParameter.value_from_lookup(
+                scope=self,
+                parameter_name=network_manifest.parameter_name(owner)
+            )
+            for owner in self.tgw_owners
+        ]
+        # the cdk cli resolves the lookups and synthesizes again
+        self._lookup_pending = any(network_manifest.is_lookup_dummy(v) for v in values)
+        return network_manifest.route_tables(network_manifest.parse(v) for v in values)
+
+
+    def _route_table_id(self, route_tables: dict, name: str) -> str:
+        """Return a route table id, imported only while the exports are published."""
+        value = route_tables.get(name)
+        if value:
+            return value
+        if network_manifest.publishes_exports(self.network_outputs):
+            return cdk.Fn.import_value(name)
+        if self._lookup_pending:
+            return f"{network_manifest.LOOKUP_DUMMY_PREFIX}{name}"
+        raise ValueError(
+            f"{self.stage.target.name}: {name} is in neither the context nor the "
+            f"network manifest of {self.tgw_owners or 'a tgw owner'}, network_outputs "
+            f"{self.network_outputs} doesn't export it, deploy the tgw owner first"
+        )
+
+
     def _provision_tgw_rt_ass(self, attach_id, ass_table_id):
         cdk_def_rtass = self._get_cdk_def(type="CfnTransitGatewayRouteTableAssociation", module="aws_ec2", name_ref="logical_id",
             kargs = {
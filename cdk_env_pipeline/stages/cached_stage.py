@@ -0,0 +1,36 @@
+"""Class that provides a Stage served from the synth cache."""
+
+from aws_cdk import cx_api
+
+from lib.cdk_classes import (
+    CDKStage
+)
+from lib.cdk_classes import (
+    CDKTargetAWSEnv
+)
+from lib.stage_cache import stage_cache
+from lib.instrumentation import instrumentation
+
+
+class CachedStage(CDKStage):
+    """Stand in for an EnvDeployStage whose cloud assembly is cached.
+
+    No stacks are constructed, synth copies the cached assembly into
+    this stage's outdir instead, see lib.stage_cache.
+    """
+
+    def __init__(self, scope, id, target: CDKTargetAWSEnv, cached: str, **kwargs):
+        """Create an instance of the class."""
+        super().__init__(scope, id, target, **kwargs)
+        self.cached = cached
+        self.stack_source_hash = None
+        self._assembly = None
+        instrumentation.event("target", env=target.name, cached=True)
+
+    def synth(self, *args, **kwargs) -> cx_api.CloudAssembly:
+        """Return the cached assembly, the same one on every call."""
+        if self._assembly is None:
+            meta = stage_cache.restore(self.cached, self.outdir)
+            self.stack_source_hash = meta["stack_source_hash"]
+            self._assembly = cx_api.CloudAssembly(self.outdir)
+        return self._assembly
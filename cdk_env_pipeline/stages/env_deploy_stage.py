@@ -1,72 +1,118 @@
 """Class that provides a Pipeline Environment Stage."""
 
+from dataclasses import asdict
+
 from lib.cdk_classes import (
     CDKStage
 )
 from lib.cdk_classes import (
     CDKTargetAWSEnv
 )
+from lib.attachment_registry import AttachmentRegistry
+from lib import network_manifest, tgw_mesh
+from lib.compiled_config import compiled
+from deploy_config import fleet, project
+from lib.instrumentation import instrumentation
 
-from ..stacks.resource_stack import ResourceStack
-from ..stacks.network_stack import NetworkStack
-from ..stacks.tgw_routes_stack import TgwRoutesStack
-from ..stacks.parameter_stack import ParameterStack
+# stack modules are imported where they are used, so a stage only loads
+# the stacks (and aws_cdk service modules) its target actually needs
 
 
 class EnvDeployStage(CDKStage):
-    """Deploy CDK Resources into the target AWS environment."""
-    shared_infra_tgw_attach = []
+    """Deploy CDK Resources into the target AWS environment.
+
+    Attachments are read from the tgw-attachment-registry context
+    document when it is set (see lib.attachment_registry), otherwise
+    each network stage looks its own attachment up and adds it to the
+    class-level registry.
+
+    With hubs in several regions, each hub's stage peers it with the
+    others (see lib.tgw_mesh) and each region needs its own tgw-routes
+    env, which routes the attachments of its region.
+    """
+    attachments = AttachmentRegistry()
 
     def __init__(self, scope, id, target: CDKTargetAWSEnv, **kwargs):
         """Create an instance of the class."""
         super().__init__(scope, id, target, **kwargs)
-        print("target name:",target.name)
+        instrumentation.event("target", env=target.name)
+        env = compiled().env(target)
     
         # network stack
         if target.vpc_cidrs != None:
+            from ..stacks.network_stack import NetworkStack
+            from ..stacks.parameter_stack import ParameterStack
             # check for existing tgw
             self.tgw_and_tgwrt_stack = ParameterStack(
                 stage=self,
                 id="parameters",
             )
             tgw_id = self.tgw_and_tgwrt_stack.tgw_id
-            print("tgw_id:", tgw_id)
+            instrumentation.event("tgw", env=target.name, tgw_id=tgw_id)
             
             self.network = NetworkStack(
                 stage=self,
                 id="networking",
-                overall_cidr=target.overall_cidr,
-                onprem_cidr=target.onprem_cidr,
-                vpc_cidrs=target.vpc_cidrs,
-                transit_subnet=target.transit_subnet,
-                private_subnet=target.private_subnet,
-                public_subnet=target.public_subnet,
-                contiguous=target.contiguous,
+                overall_cidr=env.overall_cidrs,
+                onprem_cidr=env.onprem_cidrs,
+                vpc_cidrs=env.vpc_cidrs,
+                transit_subnet=env.transit_subnet,
+                private_subnet=env.private_subnet,
+                public_subnet=env.public_subnet,
+                contiguous=env.contiguous,
                 org_arn_to_share=target.org_arn_to_share,
                 tgw_id=tgw_id,
+                availability_zones=env.availability_zones,
+                tgw_prefix_list=target.tgw_prefix_list,
+                network_outputs=project.pipeline.network_outputs,
             )
 
-            self.shared_infra_tgwattach_stack = ParameterStack(
-                stage=self,
-                id="parameters-attach",
-                stack=self.network,
-            )
-            self.shared_infra_tgwattach_stack.add_dependency(self.network)
-            tgw_attach = self.shared_infra_tgwattach_stack.tgw_attach
-            if tgw_attach not in EnvDeployStage.shared_infra_tgw_attach:
-                EnvDeployStage.shared_infra_tgw_attach.append(tgw_attach) # add tgw attachment to list
-            print("shared_infra_tgw_attach:", tgw_attach)
+            # peer this region's hub with the hubs of other regions
+            peerings = tgw_mesh.hub_peerings(compiled().envs, target.name)
+            if peerings and tgw_id is not None:
+                from ..stacks.tgw_peering_stack import TgwPeeringStack
+                self.peering = TgwPeeringStack(
+                    stage=self,
+                    id="tgw-peering",
+                    tgw_id=tgw_id,
+                    peerings=peerings,
+                    region_cidrs=tgw_mesh.region_cidrs(compiled().envs),
+                    route_tables=self.network.manifest["tgw_route_tables"],
+                )
+                self.peering.add_dependency(self.network)
+
+            if AttachmentRegistry.from_context(self) is None: # no registry document, look up this stage's attachment
+                self.shared_infra_tgwattach_stack = ParameterStack(
+                    stage=self,
+                    id="parameters-attach",
+                    stack=self.network,
+                )
+                self.shared_infra_tgwattach_stack.add_dependency(self.network)
+                tgw_attach = self.shared_infra_tgwattach_stack.tgw_attach
+                if tgw_attach is not None:
+                    EnvDeployStage.attachments.add(tgw_attach) # add tgw attachment to registry
+                instrumentation.event("tgw attachment", env=target.name,
+                    attachment=asdict(tgw_attach) if tgw_attach is not None else None)
         
         # tgw routes stack
-        if target.name == "tgw-routes": # if network account, happens after all accounts have been attached to tgw
-            if len(EnvDeployStage.shared_infra_tgw_attach) > 0:
+        if env.routes: # if network account, happens after all accounts have been attached to tgw
+            attachments = AttachmentRegistry.from_context(self) or EnvDeployStage.attachments
+            # each region's transit gateway routes its own attachments
+            attachments = [a for a in attachments if a.region == target.aws_acct.region]
+            if len(attachments) > 0:
+                from ..stacks.tgw_routes_stack import TgwRoutesStack
                 self.tgwroutes = TgwRoutesStack(
                     stage=self,
                     id="tgw-routes",
-                    inspection_cidr=target.inspection_cidr,
-                    shared_infra_tgw_attach=EnvDeployStage.shared_infra_tgw_attach,
+                    inspection_cidr=env.inspection_cidr,
+                    attachments=attachments,
+                    network_outputs=project.pipeline.network_outputs,
+                    tgw_owners=network_manifest.tgw_owner_envs(
+                        fleet, target.aws_acct.account, target.aws_acct.region
+                    ),
                 )
             else: # empty stack if no tgw attachment id or tgw route table id
+                from ..stacks.resource_stack import ResourceStack
                 self.tgwroutes = ResourceStack(
                     stage=self,
                     id="empty",
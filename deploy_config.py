@@ -4,7 +4,14 @@
 never overridden by another branch, allowing unique config per branch.
 This is important for test and deploy into different accounts
 from each branch of the repo.
+
+When a config/ directory exists envs are read from its per-account
+files instead of the list below: app.py calls load_envs with the
+pipelines and envs selected in its context and only the files they
+need are parsed, see lib.config_source. fleet is every env, fleet wide
+checks and plans read it.
 """
+import os
 from typing import List
 
 from lib.pipeline_classes import (
@@ -18,8 +25,11 @@ from lib.pipeline_classes import (
 from lib.cdk_project_classes import (
     CDKProject,
     CDKEnvPipeline,
-    CDKTargetAWSEnv
+    CDKTargetAWSEnv,
 )
+from lib.cidr_allocator import allocate_cidrs, load_state
+from lib.compiled_config import compiled
+from lib.config_source import DEFAULT_CONFIG_DIR, ConfigSource
 
 _prj_name = "multipipeline-tgw"
 _member_stage = f"{_prj_name}-member-stage"
@@ -140,6 +150,41 @@ envs: List[CDKTargetAWSEnv] = [
     )
 ]
 
+config_source = ConfigSource(DEFAULT_CONFIG_DIR, _pipelines) if os.path.isdir(DEFAULT_CONFIG_DIR) else None
+
+"""
+Every env, read by cidr allocation, fleet validation, the tgw mesh and
+tgw owner lookups. With config/ the envs that aren't loaded are built
+from the index, see ConfigSource.fleet.
+"""
+fleet: List[CDKTargetAWSEnv] = config_source.fleet() if config_source else list(envs)
+if config_source:
+    envs = []  # see load_envs
+
+"""
+Envs with cidr_sizing=CIDRSizing(vpc_prefix=24, private_subnet=26, transit_subnet=28)
+and no vpc_cidrs are given a vpc and per-AZ subnets out of the supernet
+by python -m lib.cidr_allocator allocate, which writes them to
+cidr_allocations.json. Commit it, synth only applies it and fails on
+envs listed in unallocated_envs.
+"""
+cidr_supernet = "172.16.128.0/17"
+unallocated_envs = allocate_cidrs(fleet, cidr_supernet, load_state())
+
+
+def load_envs(pipelines: List[str] = None, env_names: List[str] = None) -> None:
+    """Parse the config/ envs pipelines and env_names need, every env if both are None.
+
+    envs, the same list as project.envs, fleet and unallocated_envs are
+    updated in place, modules that imported them see the loaded envs.
+    """
+    if config_source is None:
+        return
+    envs[:] = config_source.load(pipelines, env_names)
+    fleet[:] = config_source.fleet(envs)
+    unallocated_envs[:] = allocate_cidrs(fleet, cidr_supernet, load_state())
+    compiled.cache_clear()
+
 """
 The CDK project that has a code pipeline that provisions
 stack_resources into each TargetAWSEnv account.
@@ -162,6 +207,8 @@ project = CDKProject(
         tooling_acct=AWSAccount(
             account="012345678912", # account number of tooling account e.g. "012345678912"
         ),
+        chaining="shell", # "events" starts next_pipeline from an EventBridge rule instead of a CodeBuild step
+        # pipeline_dag={"tgw-attachments": ["EnvPipeline"], "tgw-routes": ["tgw-attachments"]}, # replaces next_pipeline, allows fan-in
         slackbot=None
     ),
     envs=envs,
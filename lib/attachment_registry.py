@@ -0,0 +1,237 @@
+"""Module to define the transit gateway attachment registry.
+
+Each network stage publishes its attachment as a JSON record in an SSM
+parameter of its own account. The registry collects those records,
+keyed per account, region and vpc, into one document stored under a
+single context key, so the tgw-routes stage reads every attachment in
+one go instead of making a lookup per account.
+
+The document is stamped with when it was synced and the source revision
+(CODEBUILD_RESOLVED_SOURCE_VERSION) it was synced for. Once it is older
+than REGISTRY_TTL, or synced for another revision, it is stale and
+stages look their attachments up again instead. lib.prewarm re-syncs it
+before every pipeline synth.
+
+Records used to be "id,cidr" values of one demo-tgw-attach parameter
+per account. A network stage replaces it with its
+demo-tgw-attach-<env> record on its next deploy, until then the legacy
+value is read for the env of the account whose vpc_cidrs holds the cidr.
+
+Refresh the document in cdk.context.json with:
+    python -m lib.attachment_registry sync
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from lib.compiled_config import split_values
+
+CONTEXT_KEY = "tgw-attachment-registry"
+SYNCED_KEY = "tgw-attachment-registry-synced"  # {"synced_at": epoch seconds, "revision": ...}
+PARAMETER_PREFIX = "demo-tgw-attach"
+LEGACY_PARAMETER = "demo-tgw-attach"  # one "id,cidr" value per account
+DOCUMENT_VERSION = 1
+REGISTRY_TTL = 3600  # seconds a synced document stays fresh
+
+
+def source_revision() -> Optional[str]:
+    """Return the source revision being built, None outside CodeBuild."""
+    return os.environ.get("CODEBUILD_RESOLVED_SOURCE_VERSION")
+
+
+def synced_stamp() -> dict:
+    """Return the SYNCED_KEY value of a document synced now."""
+    return {"synced_at": int(time.time()), "revision": source_revision()}
+
+
+def is_fresh(stamp: Optional[dict], ttl: int = REGISTRY_TTL) -> bool:
+    """Return whether a document synced at stamp can still be used."""
+    if not isinstance(stamp, dict) or "synced_at" not in stamp:
+        return False  # synced before documents were stamped
+    revision = source_revision()
+    if revision is not None and stamp.get("revision") != revision:
+        return False
+    return time.time() - stamp["synced_at"] <= ttl
+
+
+def parameter_name(vpc: str) -> str:
+    """Return the SSM parameter a vpc's attachment record is stored in."""
+    return f"{PARAMETER_PREFIX}-{vpc}"
+
+
+@dataclass(frozen=True)
+class TgwAttachment():
+    """A vpc attached to the transit gateway."""
+
+    account: str
+    region: str
+    vpc: str  # name of the env that owns the vpc
+    attachment_id: str
+    cidr: str
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        return (self.account, self.region, self.vpc)
+
+    @classmethod
+    def from_parameter(
+        cls,
+        value: str,
+        account: str = None,
+        region: str = None,
+        vpc: str = None
+    ) -> Optional["TgwAttachment"]:
+        """Parse a JSON record or a legacy "id,cidr" parameter value.
+
+        Returns None for values that aren't an attachment, EG: the dummy
+        value returned by a lookup that hasn't been resolved yet.
+        """
+        if value is None:
+            return None
+        try:
+            record = json.loads(value)
+        except ValueError:
+            parts = [p.strip() for p in value.split(',')]
+            if len(parts) != 2 or not parts[0].startswith("tgw-attach-"):
+                return None
+            record = {"attachment_id": parts[0], "cidr": parts[1]}
+        if not isinstance(record, dict):
+            return None
+        record = dict({"account": account, "region": region, "vpc": vpc}, **record)
+        try:
+            return cls(**record)
+        except TypeError:
+            return None
+
+
+class AttachmentRegistry():
+    """Attachments keyed by (account, region, vpc) in insertion order.
+
+    Adding an attachment for a key that is already present replaces it
+    in place, so the order stays stable across syncs.
+    """
+
+    def __init__(self, attachments: Iterable[TgwAttachment] = ()) -> None:
+        self._attachments: Dict[Tuple[str, str, str], TgwAttachment] = {}
+        for attachment in attachments:
+            self.add(attachment)
+
+    def add(self, attachment: TgwAttachment) -> None:
+        self._attachments[attachment.key] = attachment
+
+    def get(self, account: str, region: str, vpc: str) -> Optional[TgwAttachment]:
+        return self._attachments.get((account, region, vpc))
+
+    def __iter__(self) -> Iterator[TgwAttachment]:
+        return iter(self._attachments.values())
+
+    def __len__(self) -> int:
+        return len(self._attachments)
+
+    def to_document(self) -> dict:
+        return {
+            "version": DOCUMENT_VERSION,
+            "attachments": [asdict(a) for a in self],
+        }
+
+    @classmethod
+    def from_document(cls, document) -> "AttachmentRegistry":
+        """Load a registry from a document, or its JSON string."""
+        if isinstance(document, str):
+            document = json.loads(document)
+        if document.get("version") != DOCUMENT_VERSION:
+            raise ValueError(
+                f"unsupported attachment registry version {document.get('version')}"
+            )
+        return cls(TgwAttachment(**a) for a in document["attachments"])
+
+    @classmethod
+    def from_context(cls, scope) -> Optional["AttachmentRegistry"]:
+        """Return the registry from scope's context, None if it isn't set or is stale."""
+        document = scope.node.try_get_context(CONTEXT_KEY)
+        if document is None:
+            return None
+        stamp = scope.node.try_get_context(SYNCED_KEY)
+        if not is_fresh(stamp):
+            from lib.instrumentation import instrumentation
+            instrumentation.event("attachment registry stale, looking attachments up per stage", synced=stamp)
+            return None
+        return cls.from_document(document)
+
+
+def attachment_of(env, values: Dict[str, str], account: str, region: str) -> Optional[TgwAttachment]:
+    """Return env's attachment from the values of its account's parameters.
+
+    Its own record, else the legacy value when its cidr is one of env's.
+    """
+    attachment = TgwAttachment.from_parameter(
+        values.get(parameter_name(env.name)),
+        account=account, region=region, vpc=env.name
+    )
+    legacy = TgwAttachment.from_parameter(values.get(LEGACY_PARAMETER))
+    if attachment is None and legacy is not None and legacy.cidr in split_values(env.vpc_cidrs):
+        attachment = TgwAttachment(
+            account, region, env.name, legacy.attachment_id, legacy.cidr
+        )
+    return attachment
+
+
+def attached_envs(envs: Iterable) -> Iterator:
+    """Envs whose network stack attaches a vpc to the transit gateway."""
+    return (e for e in envs if e.vpc_cidrs is not None and not e.skip)
+
+
+def collect(envs: Iterable, discovery=None, workers: int = None) -> AttachmentRegistry:
+    """Read every env's attachment record, accounts in parallel.
+
+    The order is the same whatever order the accounts answer in.
+    """
+    if discovery is None:
+        from lib.discovery import discovery
+    by_account = {}
+    for env in attached_envs(envs):
+        key = (env.aws_acct.account, env.aws_acct.region)
+        by_account.setdefault(key, []).append(env)
+
+    def read(item):
+        (account, region), account_envs = item
+        return discovery.ssm_parameters(
+            account, region,
+            [parameter_name(e.name) for e in account_envs] + [LEGACY_PARAMETER]
+        )
+
+    registry = AttachmentRegistry()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(read, by_account.items()))
+    for ((account, region), account_envs), values in zip(by_account.items(), results):
+        for env in account_envs:
+            attachment = attachment_of(env, values, account, region)
+            if attachment is not None:
+                registry.add(attachment)
+    return registry
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["sync", "show"])
+    args = parser.parse_args(argv)
+
+    from deploy_config import fleet
+    registry = collect(fleet)
+    if args.command == "sync":
+        from lib.discovery import update_context_file
+        update_context_file({
+            CONTEXT_KEY: registry.to_document(),
+            SYNCED_KEY: synced_stamp(),
+        })
+        print(f"{len(registry)} attachments written to {CONTEXT_KEY}")
+    else:
+        print(json.dumps(registry.to_document(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,23 @@
 """Module to define some CDK Helper Classes."""
 
 from aws_cdk import (
+    CfnOutput,
+    CfnResource,
+    Reference,
+    RemovalPolicy,
     Stage,
-    Stack
+    Stack,
+    Tokenization
 )
 
-import importlib
-
+from lib.cdk_registry import registry
+from lib.instrumentation import instrumentation
 from lib.cdk_resource import CDKResourceDef
 
 
 from lib.cdk_project_classes import (
-    CDKTargetAWSEnv
+    CDKTargetAWSEnv,
+    StackBudget
 )
 
 from deploy_config import (
@@ -38,7 +44,29 @@ class CDKStage(Stage):
 
 
 class CDKStack(Stack):
-    """Custom Stack Class with predined helpers."""
+    """Custom Stack Class with predined helpers.
+
+    Resources are counted from the construct tree before each spill
+    decision, so resources added outside _provision_resource, like the
+    flow logs of a Vpc, count too, outputs are counted as they are added.
+    Once the target's StackBudget would be passed,
+    resources of spillable_types go into sibling CDKShardStacks in the
+    same stage, and CDK wires references to them as cross stack exports.
+    Those exports are outputs of this stack, counted with the outputs
+    it adds itself against the outputs budget, which raises ValueError
+    when passed, outputs can't spill as consumers import them by name.
+    Spilling is by provisioning order, so a resource only moves stack
+    when resources provisioned before it are added or removed.
+    """
+    spillable_types = frozenset([
+        "CfnRoute",
+        "CfnTransitGatewayRoute",
+        "CfnTransitGatewayRouteTableAssociation",
+    ])
+    resource_bytes = 400  # estimated template bytes per resource
+    trailing_resources = 0  # resources provisioned after the last spillable one
+    output_bytes = 250  # estimated template bytes per output
+
     def __init__(
         self,
         stage: CDKStage,
@@ -47,7 +75,20 @@ class CDKStack(Stack):
     ) -> None:
         super().__init__(stage, id, **kwargs)
         self.stage = stage
-        self._provision_resources()
+        self.budget = stage.target.stack_budget or StackBudget()
+        self.resource_count = 0
+        self.output_count = 0
+        self.shards = []
+        self._exported = set()  # references of this stack's resources made by its shards
+        with instrumentation.span("provision_resources", stack=self.node.path):
+            self._provision_resources()
+        self._record_counts()
+
+    @property
+    def template_bytes(self) -> int:
+        """Estimated size of the synthesized template."""
+        return self.resource_count * self.resource_bytes + \
+            self.output_count * self.output_bytes
 
     def _provision_resources(self) -> None:
         """Create CDK Resource objects."""
@@ -63,13 +104,76 @@ class CDKStack(Stack):
         resource_name: str,
         cdk_def: CDKResourceDef
     ) -> None:
+        scope = self._scope_for(cdk_def)
+        if scope is not self:
+            self._count_exports(cdk_def.kargs)
         resource = CDKResource(
-            scope=self,
+            scope=scope,
             cdk_def=cdk_def,
             name=resource_name
         )
         self.resources[f"{resource_name}{cdk_def.type}"] = resource
 
+    def _add_output(self, id: str, value: str, export_name: str) -> CfnOutput:
+        """Create a CfnOutput counted against the budget."""
+        self._reserve_outputs(1, id)
+        return CfnOutput(self, id, value=value, export_name=export_name)
+
+    def _reserve_outputs(self, outputs: int, what: str) -> None:
+        if self.output_count + outputs > self.budget.outputs:
+            raise ValueError(
+                f"{self.node.path} {what} needs more than its budget of "
+                f"{self.budget.outputs} outputs, raise stack_budget.outputs "
+                "or move vpcs into another env"
+            )
+        self.output_count += outputs
+
+    def _count_exports(self, kargs: dict) -> None:
+        """Count the exports CDK adds to this stack for kargs of a spilled resource."""
+        new = set()
+        for value in kargs.values():
+            for item in value if isinstance(value, list) else [value]:
+                token = Tokenization.reverse(item, fail_concat=False)
+                if isinstance(token, Reference) and Stack.of(token.target) is self:
+                    key = str(item)
+                    if key not in self._exported:
+                        new.add(key)
+        if new:
+            self._reserve_outputs(len(new), "exports to its shards")
+            self._exported |= new
+
+    def _has_room(self, resources: int = 1) -> bool:
+        self._count_resources()
+        resources += self.trailing_resources
+        return self.resource_count + resources <= self.budget.resources and \
+            self.template_bytes + resources * self.resource_bytes <= self.budget.template_bytes
+
+    def _scope_for(self, cdk_def: CDKResourceDef) -> "CDKStack":
+        """Return this stack, or a shard if the budget is spent."""
+        if cdk_def.type not in self.spillable_types or self._has_room():
+            return self
+        if not self.shards or not self.shards[-1]._has_room():
+            shard = CDKShardStack(
+                stage=self.stage,
+                id=f"{self.node.id}-shard-{len(self.shards) + 1}"
+            )
+            shard.add_dependency(self)
+            self.shards.append(shard)
+        return self.shards[-1]
+
+    def _count_resources(self) -> None:
+        self.resource_count = sum(
+            1 for c in self.node.find_all()
+            if isinstance(c, CfnResource)
+        )
+
+    def _record_counts(self) -> None:
+        """Record the counts of this stack and its shards, once provisioned."""
+        for stack in [self] + self.shards:
+            stack._count_resources()
+            instrumentation.count("stack_resources", stack.node.path, stack.resource_count)
+            instrumentation.count("stack_outputs", stack.node.path, stack.output_count)
+
     def _prefix(self) -> str:
         return f"{project.name}-{self.stage.target.name}"
 
@@ -83,6 +187,25 @@ class CDKStack(Stack):
         )
 
 
+class CDKShardStack(CDKStack):
+    """Sibling stack holding resources spilled from a CDKStack."""
+
+    def __init__(
+        self,
+        stage: CDKStage,
+        id: str,
+        **kwargs,
+    ) -> None:
+        self.resource_names = []
+        super().__init__(stage, id, **kwargs)
+
+    def _scope_for(self, cdk_def: CDKResourceDef) -> CDKStack:
+        return self
+
+    def _record_counts(self) -> None:
+        pass  # filled and recorded by the stack spilling into it
+
+
 class CDKResource():
     """Class to create AWS CDK resources."""
 
@@ -100,28 +223,29 @@ class CDKResource():
     def _create_resource(self) -> None:
         """Create the AWS CDK resource.
 
-        Uses the dynamic nature of Python to import the necessry module and
-        provision a CDK Resource.
+        The construct registry imports the necessary module and resolves
+        the constructor once per (module, type), then we provision a
+        CDK Resource.
 
-        self.resource = getattr(
-            globals()[CDKResourceDef.module],
+        self.resource = registry.resolve(
+            CDKResourceDef.module,
             CDKResourceDef.type
         ) equates to:
-        self.resource = getattr(globals()["aws_s3"], "Bucket") equates to:
+        self.resource = registry.resolve("aws_s3", "Bucket") equates to:
         self.resource = aws_s3.Bucket(**kargs) where:
         **kargs = (scope=self.stack, id=self.id, ...) etc.
 
         """
-        self._import_cdk_module()
-
         kargs = self._get_kargs()
-        self.resource = getattr(
-            globals()[self.cdk_def.module],
-            self.cdk_def.type
-        )(**kargs)
+        with instrumentation.span("create_resource", type=self.cdk_def.type):
+            self.resource = registry.resolve(
+                self.cdk_def.module,
+                self.cdk_def.type
+            )(**kargs)
+        instrumentation.count("resource_type", self.cdk_def.type)
 
         self.resource.apply_removal_policy(
-            self.stack.stage.target.removal_policy
+            self.stack.stage.target.removal_policy or RemovalPolicy.DESTROY
         )
 
         self.name = getattr(self.resource, self.cdk_def.name_ref)
@@ -134,12 +258,6 @@ class CDKResource():
         """
         return f"{self.stack._prefix()}-{name}{self.cdk_def.type}"
 
-    def _import_cdk_module(self) -> None:
-        """Import the aws_cdk module we need to create this resource."""
-        globals()[self.cdk_def.module] = importlib.import_module(
-            f"aws_cdk.{self.cdk_def.module}"
-        )
-
     def _get_kargs(self) -> dict:
         """Construct kargs for CDK resource.
 
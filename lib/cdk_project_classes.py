@@ -1,9 +1,7 @@
 """Module to define some CDK Project Classes."""
 
 from dataclasses import dataclass, field
-from typing import List
-
-import aws_cdk as cdk
+from typing import Dict, List, TYPE_CHECKING
 
 
 from lib.pipeline_classes import (
@@ -15,6 +13,50 @@ from lib.pipeline_classes import (
     Tag
 )
 
+if TYPE_CHECKING:  # aws_cdk is only loaded once constructs are created
+    import aws_cdk as cdk
+
+
+@dataclass
+class CIDRSizing:
+    """Define the block sizes lib.cidr_allocator assigns to an env."""
+
+    vpc_prefix: int
+    private_subnet: int = field(default=None)  # prefix per AZ, EG: 26
+    transit_subnet: int = field(default=None)  # prefix per AZ, EG: 28
+
+
+@dataclass
+class StackBudget:
+    """Define how much of the CloudFormation limits a CDKStack may use.
+
+    Past the budget, high-cardinality resources like routes spill into
+    sibling shard stacks. Limits are 500 resources, 200 outputs, 200
+    parameters and a 1MB template, synthesized templates are checked
+    against the budget by lib.template_budget.
+    """
+
+    resources: int = field(default=450)
+    outputs: int = field(default=180)
+    template_bytes: int = field(default=800000)
+    parameters: int = field(default=180)
+
+
+@dataclass
+class BuildProfile:
+    """Define the CodeBuild settings of every synth and deploy action.
+
+    With an image the CDK CLI and requirements.txt are expected to be
+    baked in (see Dockerfile.synth), so the synth step skips installing
+    them.
+    """
+
+    image: str = field(default=None)  # EG: "012345678912.dkr.ecr.ap-southeast-2.amazonaws.com/cdk-synth:2.100.0"
+    compute_type: str = field(default=None)  # codebuild.ComputeType name, EG: "MEDIUM"
+    cache: str = field(default=None)  # "local" or an S3 bucket name
+    cli_version: str = field(default=None)  # pinned aws-cdk version, EG: "2.100.0"
+    publish_assets_in_parallel: bool = field(default=True)
+
 
 @dataclass
 class CDKTargetAWSEnv:
@@ -25,9 +67,9 @@ class CDKTargetAWSEnv:
     approvals: PipelineApproval
     tags: List[Tag]
     skip: bool = field(default=False)
-    removal_policy: cdk.RemovalPolicy = field(
-        default=cdk.RemovalPolicy.DESTROY
-    )
+    removal_policy: "cdk.RemovalPolicy" = field(
+        default=None
+    )  # None is cdk.RemovalPolicy.DESTROY
     trusted_accounts : str = field(default=None)
     overall_cidr : str = field(default=None)
     onprem_cidr : str = field(default=None)
@@ -41,6 +83,11 @@ class CDKTargetAWSEnv:
     next_pipeline : str = field(default=None)
     pipelines : str = field(default=None)
     inspection_cidr : str = field(default=None)
+    availability_zones : str = field(default="a,b,c")
+    cidr_sizing : CIDRSizing = field(default=None)
+    tgw_prefix_list : bool = field(default=False)
+    stack_budget : StackBudget = field(default=None)
+    depends_on : str = field(default=None)
 
 
 @dataclass
@@ -51,6 +98,23 @@ class CDKEnvPipeline:
     slackbot: SlackBot = field(default=None)
     github: GitHub = field(default=None)
     codecommit: CodeCommit = field(default=None)
+    chaining: str = field(default="shell")  # how next_pipeline is started, "shell" or "events"
+    build_profile: BuildProfile = field(default=None)
+    shared_assembly: bool = field(default=False)  # first pipeline synthesizes for all
+    waves: str = field(default="auto")  # "auto" from env dependencies or "manual" from env wave labels
+    pipeline_dag: Dict[str, List[str]] = field(default=None)  # pipeline -> upstream pipelines, replaces next_pipeline
+    change_aware: bool = field(default=False)  # skip stages unchanged since their last deploy
+    network_outputs: str = field(default="exports")  # "exports", "both" or "manifest", see lib.network_manifest
+
+    def __post_init__(self):
+        if self.chaining not in ("shell", "events"):
+            raise ValueError(f"chaining must be shell or events, not {self.chaining}")
+        if self.waves not in ("auto", "manual"):
+            raise ValueError(f"waves must be auto or manual, not {self.waves}")
+        if self.network_outputs not in ("exports", "both", "manifest"):
+            raise ValueError(
+                f"network_outputs must be exports, both or manifest, not {self.network_outputs}"
+            )
 
 
 @dataclass
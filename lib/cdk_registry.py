@@ -0,0 +1,102 @@
+"""Module to define a cached registry of CDK construct types.
+
+CDKResourceDef names a construct by its aws_cdk module and type EG:
+("aws_ec2", "CfnRoute"). The registry imports the module and resolves
+the constructor once per (module, type) pair, and checks a def's kargs
+against the constructor signature so a typo fails when the def is
+built rather than deep inside jsii.
+"""
+import importlib
+import inspect
+from typing import Callable, Dict, FrozenSet, Iterable, NamedTuple, Tuple
+
+
+class ConstructSignature(NamedTuple):
+    """Keyword arguments a construct constructor accepts."""
+
+    accepted: FrozenSet[str]
+    required: FrozenSet[str]
+    var_keyword: bool
+
+
+# supplied by CDKResource for every construct
+_SCOPE_ARGS = frozenset(["scope", "id"])
+
+
+class ConstructRegistry():
+    """Resolve and cache CDK construct constructors."""
+
+    def __init__(self) -> None:
+        self._constructors: Dict[Tuple[str, str], Callable] = {}
+        self._signatures: Dict[Tuple[str, str], ConstructSignature] = {}
+
+    def resolve(self, module: str, type: str) -> Callable:
+        """Return the constructor for aws_cdk.{module}.{type}."""
+        key = (module, type)
+        constructor = self._constructors.get(key)
+        if constructor is None:
+            cdk_module = importlib.import_module(f"aws_cdk.{module}")
+            try:
+                constructor = getattr(cdk_module, type)
+            except AttributeError:
+                raise TypeError(
+                    f"aws_cdk.{module} has no construct type {type}"
+                ) from None
+            self._constructors[key] = constructor
+        return constructor
+
+    def signature(self, module: str, type: str) -> ConstructSignature:
+        """Return the keyword arguments of the constructor."""
+        key = (module, type)
+        sig = self._signatures.get(key)
+        if sig is None:
+            # jsii classes have a metaclass __call__, so read __init__
+            params = dict(inspect.signature(
+                self.resolve(module, type).__init__
+            ).parameters)
+            params.pop("self", None)
+            kinds = (
+                inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                inspect.Parameter.KEYWORD_ONLY
+            )
+            sig = ConstructSignature(
+                accepted=frozenset(
+                    n for n, p in params.items() if p.kind in kinds
+                ),
+                required=frozenset(
+                    n for n, p in params.items()
+                    if p.kind in kinds and p.default is p.empty
+                ),
+                var_keyword=any(
+                    p.kind == p.VAR_KEYWORD for p in params.values()
+                )
+            )
+            self._signatures[key] = sig
+        return sig
+
+    def validate_kargs(
+        self,
+        module: str,
+        type: str,
+        kargs: Iterable[str]
+    ) -> None:
+        """Raise TypeError if kargs don't fit the constructor."""
+        sig = self.signature(module, type)
+        names = set(kargs) | _SCOPE_ARGS
+        unknown = sorted(names - sig.accepted)
+        if unknown and not sig.var_keyword:
+            raise TypeError(
+                f"aws_cdk.{module}.{type} got unexpected karg(s) "
+                f"{', '.join(unknown)}; accepts "
+                f"{', '.join(sorted(sig.accepted - _SCOPE_ARGS))}"
+            )
+        missing = sorted(sig.required - names)
+        if missing:
+            raise TypeError(
+                f"aws_cdk.{module}.{type} missing required karg(s) "
+                f"{', '.join(missing)}"
+            )
+
+
+"""Registry shared by every CDKResourceDef and CDKResource."""
+registry = ConstructRegistry()
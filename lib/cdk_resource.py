@@ -1,8 +1,12 @@
 """Module to define CDKResource definition."""
 
 from dataclasses import dataclass, field
-from typing import List
-import aws_cdk as cdk
+from typing import List, TYPE_CHECKING
+
+from lib.cdk_registry import registry
+
+if TYPE_CHECKING:  # aws_cdk is only loaded once constructs are created
+    import aws_cdk as cdk
 
 
 @dataclass
@@ -14,4 +18,11 @@ class CDKResourceDef:
     permissions: List[str]  # noqa: E501 Permission methods the resource will apply to a supplied role.
     kargs: dict             # noqa: E501 The keyword arguments used by the CDK resource module.
     karg_name: bool = field(default=False)  # noqa: E501 Add a resource name karg if True
-    removal_policy: cdk.RemovalPolicy = field(default=cdk.RemovalPolicy.DESTROY)  # noqa: E501
+    removal_policy: "cdk.RemovalPolicy" = field(default=None)  # noqa: E501 None is cdk.RemovalPolicy.DESTROY
+
+    def __post_init__(self) -> None:
+        """Check kargs against the construct signature."""
+        kargs = list(self.kargs)
+        if self.karg_name:
+            kargs.append(self.name_ref)
+        registry.validate_kargs(self.module, self.type, kargs)
@@ -0,0 +1,229 @@
+"""Module to allocate VPC and subnet CIDRs offline.
+
+Envs with a CIDRSizing and no vpc_cidrs are packed into a supernet:
+one aligned VPC block each, then one block per availability zone for
+each sized subnet tier inside that VPC. Blocks are tracked as sorted,
+disjoint integer intervals so each allocation is a couple of bisects.
+
+Assignments live in cidr_allocations.json, a committed input: synth
+only applies them, so existing envs keep their CIDRs on a fresh
+checkout and when envs are added, removed or reordered. New or resized
+envs are allocated, against every env of the fleet, by the CLI and the
+updated file committed. Synth fails while an env has no assignment.
+
+EG: python -m lib.cidr_allocator allocate  # after adding a sized env
+    python -m lib.cidr_allocator check     # in CI
+"""
+import argparse
+import bisect
+import ipaddress
+import json
+import os
+import socket
+from typing import Dict, Iterable, List
+
+from lib.compiled_config import split_values
+
+DEFAULT_STATE_FILE = "cidr_allocations.json"
+
+# tiers provisioned as explicit per-AZ PrivateSubnets by NetworkStack
+SUBNET_TIERS = ["private_subnet", "transit_subnet"]
+
+
+class CIDRAllocator():
+    """First-fit allocator of aligned blocks out of a supernet."""
+
+    def __init__(self, supernet: str) -> None:
+        self.supernet = ipaddress.ip_network(supernet)
+        self._first = int(self.supernet.network_address)
+        self._last = int(self.supernet.broadcast_address)
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        # lowest address worth trying per prefix length, allocated
+        # space only grows so nothing below it can fit later
+        self._cursor: Dict[int, int] = {}
+
+    def reserve(self, cidr: str, strict: bool = False) -> None:
+        """Mark cidr as taken, parts outside the supernet are ignored.
+
+        With strict, ValueError if any of it is already taken.
+        """
+        net = ipaddress.ip_network(cidr.strip())
+        start = max(int(net.network_address), self._first)
+        end = min(int(net.broadcast_address), self._last)
+        if start > end:
+            return
+        if strict and self._taken(start, end):
+            raise ValueError(f"{cidr} overlaps a cidr already in use")
+        self._insert(start, end)
+
+    def allocate(self, prefix: int) -> str:
+        """Return the lowest free block of the given prefix length."""
+        if prefix < self.supernet.prefixlen:
+            raise ValueError(f"/{prefix} doesn't fit in {self.supernet}")
+        size = 1 << (self.supernet.max_prefixlen - prefix)
+        addr = self._align(self._cursor.get(prefix, self._first), size)
+        while addr + size - 1 <= self._last:
+            i = bisect.bisect_right(self._starts, addr + size - 1)
+            if i and self._ends[i - 1] >= addr:
+                addr = self._align(self._ends[i - 1] + 1, size)
+                continue
+            self._insert(addr, addr + size - 1)
+            self._cursor[prefix] = addr + size
+            return self._format(addr, prefix)
+        raise ValueError(f"{self.supernet} has no free /{prefix} left")
+
+    def _format(self, addr: int, prefix: int) -> str:
+        if self.supernet.version == 4:  # ipaddress is slow to construct
+            return f"{socket.inet_ntoa(addr.to_bytes(4, 'big'))}/{prefix}"
+        return str(ipaddress.IPv6Network((addr, prefix)))
+
+    def _align(self, addr: int, size: int) -> int:
+        offset = (addr - self._first) % size
+        return addr if offset == 0 else addr + size - offset
+
+    def _taken(self, start: int, end: int) -> bool:
+        i = bisect.bisect_right(self._starts, end)
+        return bool(i) and self._ends[i - 1] >= start
+
+    def _insert(self, start: int, end: int) -> None:
+        """Insert [start, end], merging overlapping or adjacent intervals."""
+        i = bisect.bisect_left(self._ends, start - 1)
+        j = i
+        while j < len(self._starts) and self._starts[j] <= end + 1:
+            start = min(start, self._starts[j])
+            end = max(end, self._ends[j])
+            j += 1
+        self._starts[i:j] = [start]
+        self._ends[i:j] = [end]
+
+
+def _allocate_env(env, vpc: str) -> Dict[str, str]:
+    """Return vpc_cidrs and per-AZ subnet cidrs for one env."""
+    sizing = env.cidr_sizing
+    subnets = CIDRAllocator(vpc)
+    if env.public_subnet is not None:
+        # the Vpc construct carves public subnets from the start of the vpc
+        for _ in split_values(env.availability_zones):
+            subnets.allocate(int(env.public_subnet))
+    assignment = {"vpc_cidrs": vpc}
+    tiers = [
+        (getattr(sizing, tier), tier) for tier in SUBNET_TIERS
+        if getattr(sizing, tier) is not None
+    ]
+    for prefix, tier in sorted(tiers, key=lambda t: t[0]):  # largest first
+        assignment[tier] = ",".join(
+            subnets.allocate(prefix) for _ in split_values(env.availability_zones)
+        )
+    return assignment
+
+
+def load_state(state_file: str = DEFAULT_STATE_FILE) -> Dict[str, Dict[str, str]]:
+    """Return the committed assignments, {} if there are none yet."""
+    try:
+        with open(state_file) as fp:
+            return json.load(fp)
+    except FileNotFoundError:
+        return {}
+
+
+def write_state(state: Dict[str, Dict[str, str]], state_file: str = DEFAULT_STATE_FILE) -> None:
+    tmp = f"{state_file}.tmp"
+    with open(tmp, "w") as fp:
+        json.dump(state, fp, indent=2, sort_keys=True)
+    os.replace(tmp, state_file)
+
+
+def allocate_cidrs(
+    envs: Iterable,
+    supernet: str,
+    state: Dict[str, Dict[str, str]],
+    allocate: bool = False
+) -> List[str]:
+    """Assign vpc and subnet cidrs in place to envs with a cidr_sizing.
+
+    Envs that already have vpc_cidrs are reserved and left untouched.
+    Assignments in state are applied as long as the env's sizing is
+    unchanged, ValueError if one overlaps another or an explicit
+    vpc_cidrs. With allocate, the other sized envs get new blocks,
+    added to state, so envs must be the whole fleet. Returns the names
+    of the sized envs left without cidrs.
+    """
+    envs = list(envs)
+    vpcs = CIDRAllocator(supernet)
+    for env in envs:
+        if env.vpc_cidrs is not None:
+            for cidr in split_values(env.vpc_cidrs):
+                vpcs.reserve(cidr)
+
+    pending = []
+    for env in envs:
+        if not env.cidr_sizing or env.vpc_cidrs is not None:
+            continue
+        previous = state.get(env.name)
+        if previous and previous["vpc_prefix"] == env.cidr_sizing.vpc_prefix:
+            try:
+                vpcs.reserve(previous["vpc_cidrs"], strict=True)
+            except ValueError as e:
+                raise ValueError(f"env {env.name} allocation: {e}") from None
+            _assign(env, previous["vpc_cidrs"], state)
+        else:
+            pending.append(env)
+    if not allocate:
+        return [env.name for env in pending]
+    # biggest blocks first keeps the supernet densely packed, only new
+    # or resized envs are pending so existing assignments never move
+    pending.sort(key=lambda e: e.cidr_sizing.vpc_prefix)
+    for env in pending:
+        vpc = vpcs.allocate(env.cidr_sizing.vpc_prefix)
+        _assign(env, vpc, state)
+    return []
+
+
+def unallocated_error(names: List[str], state_file: str = DEFAULT_STATE_FILE) -> str:
+    return (
+        f"envs {names} have no cidrs in {state_file}, "
+        "run python -m lib.cidr_allocator allocate and commit it"
+    )
+
+
+def _assign(env, vpc: str, state: dict) -> None:
+    """Apply an env's assignment and record it in state."""
+    try:
+        assignment = _allocate_env(env, vpc)
+    except ValueError as e:
+        raise ValueError(f"env {env.name}: {e}") from None
+    for key, value in assignment.items():
+        setattr(env, key, value)
+    env.contiguous = None  # subnets are explicit per-AZ cidrs
+    assignment["vpc_prefix"] = env.cidr_sizing.vpc_prefix
+    state[env.name] = assignment
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["allocate", "check"])
+    parser.add_argument("--state-file", default=DEFAULT_STATE_FILE)
+    args = parser.parse_args(argv)
+
+    # deploy_config applied the committed assignments, applied envs are
+    # reserved like explicit vpc_cidrs and the rest are pending
+    from deploy_config import fleet, cidr_supernet
+    state = load_state(args.state_file)
+    if args.command == "check":
+        pending = allocate_cidrs(fleet, cidr_supernet, state)
+        if pending:
+            raise SystemExit(unallocated_error(pending, args.state_file))
+        print(f"every sized env has cidrs in {args.state_file}")
+        return
+    before = dict(state)
+    allocate_cidrs(fleet, cidr_supernet, state, allocate=True)
+    added = sorted(k for k in state if before.get(k) != state[k])
+    write_state(state, args.state_file)
+    for name in added:
+        print(f"allocated {name} {state[name]['vpc_cidrs']}")
+    print(f"{len(added)} envs allocated in {args.state_file}, commit it")
+
+
+if __name__ == "__main__":
+    main()
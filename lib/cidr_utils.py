@@ -0,0 +1,22 @@
+"""Module to define CIDR helpers shared by the stacks."""
+
+import ipaddress
+from typing import Iterable, List
+
+
+def summarize_cidrs(cidrs: Iterable[str]) -> List[str]:
+    """Return the fewest prefixes covering exactly the given cidrs.
+
+    Duplicates and nested ranges are dropped and adjacent ranges merged,
+    EG: 10.0.0.0/24,10.0.1.0/24,10.0.1.128/25 -> 10.0.0.0/23
+    """
+    nets = {}
+    for c in cidrs:
+        if c and c.strip():
+            net = ipaddress.ip_network(c.strip())
+            nets.setdefault(net.version, []).append(net)
+    return [
+        str(n)
+        for version in sorted(nets)
+        for n in ipaddress.collapse_addresses(nets[version])
+    ]
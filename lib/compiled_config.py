@@ -0,0 +1,266 @@
+"""Module to compile deploy_config into typed, immutable envs.
+
+CDKTargetAWSEnv keeps the config as written, EG: pipelines="a,b",
+contiguous="True" and comma separated CIDRs. compile_config parses
+every env once into a CompiledEnv of ipaddress networks, bools and
+tuples, and indexes them by name, by pipeline and by pipeline and wave
+label, so consumers look up what they need instead of re-splitting
+strings per stage. compiled() compiles deploy_config on first use.
+
+CompiledConfig also groups a pipeline's envs into waves, by wave label
+or, with waves "auto", by dependency: declared with depends_on or
+inferred from what envs provision. Envs that own the transit gateway
+(org_arn_to_share) come first, envs attaching a vpc depend on them and
+envs adding transit gateway routes (inspection_cidr) depend on every
+attached vpc. Envs are grouped by topological level, so envs that don't
+depend on each other always deploy concurrently. Only dependencies
+between envs of the same pipeline are considered, pipelines are ordered
+by chaining.
+
+Compiled records are NamedTuples, like lib.fleet_validator's Interval:
+immutable and without a per-instance __dict__.
+"""
+import ipaddress
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple, Union
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+class SubnetSpec(NamedTuple):
+    """A subnet tier, a mask carved per AZ by the Vpc construct or explicit cidrs."""
+
+    mask: Optional[int]
+    cidrs: Tuple[Network, ...]
+
+
+class CompiledEnv(NamedTuple):
+    """A CDKTargetAWSEnv with its values parsed."""
+
+    name: str
+    source: object  # the CDKTargetAWSEnv, stages still take it as their target
+    account: str
+    region: str
+    skip: bool
+    pipelines: Tuple[str, ...]  # empty when unset, only the first pipeline deploys it
+    wave: Optional[str]
+    depends_on: Tuple[str, ...]
+    vpc_cidrs: Tuple[Network, ...]
+    overall_cidrs: Tuple[Network, ...]
+    onprem_cidrs: Tuple[Network, ...]
+    inspection_cidr: Optional[Network]
+    public_subnet: Optional[int]  # mask
+    private_subnet: Optional[SubnetSpec]
+    transit_subnet: Optional[SubnetSpec]
+    contiguous: bool
+    availability_zones: Tuple[str, ...]
+    tgw_owner: bool  # shares its transit gateway, org_arn_to_share is set
+
+    @property
+    def deployable(self) -> bool:
+        return not self.skip and self.account != ""
+
+    @property
+    def routes(self) -> bool:
+        """Routes the attachments of its region, see TgwRoutesStack."""
+        return self.inspection_cidr is not None or self.name == "tgw-routes"
+
+
+class Wave(NamedTuple):
+    """Envs deployed together, a name of None is a single env deployed as a stage."""
+
+    name: Optional[str]
+    envs: Tuple[CompiledEnv, ...]
+
+
+class CompiledConfig(NamedTuple):
+    """Compiled envs with the indexes consumers look them up by."""
+
+    envs: Tuple[CompiledEnv, ...]
+    pipelines: Tuple[str, ...]
+    by_name: Mapping[str, CompiledEnv]
+    by_pipeline: Mapping[str, Tuple[CompiledEnv, ...]]
+    by_wave: Mapping[Tuple[str, str], Tuple[CompiledEnv, ...]]
+
+    def env(self, target) -> CompiledEnv:
+        """Return the compiled env of a CDKTargetAWSEnv, compiling it if it isn't indexed."""
+        env = self.by_name.get(target.name)
+        if env is not None and env.source is target:
+            return env
+        return compile_env(target)
+
+    def pipeline_envs(self, pipeline: str, env_names: Iterable[str] = None) -> Tuple[CompiledEnv, ...]:
+        """Return the envs pipeline deploys, in config order, optionally only env_names."""
+        envs = self.by_pipeline.get(pipeline, ())
+        if env_names is None:
+            return envs
+        env_names = set(env_names)
+        return tuple(e for e in envs if e.name in env_names)
+
+    def labelled_waves(self, pipeline: str, env_names: Iterable[str] = None) -> List[Wave]:
+        """Return pipeline's envs in config order, envs with the same wave label deploy together."""
+        envs = self.pipeline_envs(pipeline, env_names)
+        members = {e.name for e in envs}
+        waves = []
+        for env in envs:
+            if env.wave is None:
+                waves.append(Wave(None, (env,)))
+            elif not any(w.name == env.wave for w in waves):
+                labelled = self.by_wave[(pipeline, env.wave)]
+                waves.append(Wave(env.wave, tuple(e for e in labelled if e.name in members)))
+        return waves
+
+    def dependency_waves(self, pipeline: str, env_names: Iterable[str] = None) -> List[Wave]:
+        """Return pipeline's envs as waves of envs that don't depend on each other."""
+        waves = []
+        used = []
+        for n, level in enumerate(deployment_waves(self.pipeline_envs(pipeline, env_names))):
+            if len(level) == 1 and level[0].wave is None:
+                waves.append(Wave(None, tuple(level)))
+                continue
+            name = wave_name(level, n, pipeline, used)
+            used.append(name)
+            waves.append(Wave(name, tuple(level)))
+        return waves
+
+
+def split_values(value: Optional[str]) -> Tuple[str, ...]:
+    """Split a comma separated config value, EG: pipelines or vpc_cidrs."""
+    return tuple(v.strip() for v in value.split(',') if v.strip()) if value else ()
+
+
+def _networks(value: Optional[str]) -> Tuple[Network, ...]:
+    return tuple(ipaddress.ip_network(c) for c in split_values(value))
+
+
+def _subnet(value: Optional[str]) -> Optional[SubnetSpec]:
+    if value is None:
+        return None
+    if "/" not in value:
+        return SubnetSpec(mask=int(value), cidrs=())
+    return SubnetSpec(mask=None, cidrs=_networks(value))
+
+
+def compile_env(env) -> CompiledEnv:
+    """Parse a CDKTargetAWSEnv, ValueError naming the env if a value is invalid."""
+    try:
+        return CompiledEnv(
+            name=env.name,
+            source=env,
+            account=env.aws_acct.account,
+            region=env.aws_acct.region,
+            skip=bool(env.skip),
+            pipelines=split_values(env.pipelines),
+            wave=env.wave,
+            depends_on=split_values(env.depends_on),
+            vpc_cidrs=_networks(env.vpc_cidrs),
+            overall_cidrs=_networks(env.overall_cidr),
+            onprem_cidrs=_networks(env.onprem_cidr),
+            inspection_cidr=(
+                ipaddress.ip_network(env.inspection_cidr.strip())
+                if env.inspection_cidr else None
+            ),
+            public_subnet=int(env.public_subnet) if env.public_subnet is not None else None,
+            private_subnet=_subnet(env.private_subnet),
+            transit_subnet=_subnet(env.transit_subnet),
+            contiguous=str(env.contiguous) == "True",
+            availability_zones=split_values(env.availability_zones),
+            tgw_owner=env.org_arn_to_share is not None,
+        )
+    except ValueError as e:
+        raise ValueError(f"env {env.name}: {e}") from e
+
+
+def dependencies(envs: Iterable[CompiledEnv]) -> Dict[str, List[str]]:
+    """Return the names each env depends on, among envs."""
+    envs = list(envs)
+    names = {e.name for e in envs}
+    owners = [e.name for e in envs if e.tgw_owner]
+    attached = [e.name for e in envs if e.vpc_cidrs]
+    deps = {}
+    for env in envs:
+        unknown = [d for d in env.depends_on if d not in names]
+        if unknown:
+            raise ValueError(f"env {env.name} depends_on unknown envs {unknown}")
+        inferred = []
+        if env.inspection_cidr is not None:
+            inferred += attached
+        elif env.vpc_cidrs and env.name not in owners:
+            inferred += owners
+        deps[env.name] = [
+            d for d in dict.fromkeys([*env.depends_on, *inferred]) if d != env.name
+        ]
+    return deps
+
+
+def deployment_waves(envs: Iterable[CompiledEnv]) -> List[List[CompiledEnv]]:
+    """Return envs grouped by topological level, in config order per level.
+
+    Raises ValueError naming the envs on a dependency cycle.
+    """
+    envs = list(envs)
+    deps = dependencies(envs)
+    remaining = {e.name: len(deps[e.name]) for e in envs}
+    dependents = {e.name: [] for e in envs}
+    for name, names in deps.items():
+        for d in names:
+            dependents[d].append(name)
+
+    waves = []
+    level = [e for e in envs if remaining[e.name] == 0]
+    while level:
+        waves.append(level)
+        ready = set()
+        for env in level:
+            del remaining[env.name]
+            for name in dependents[env.name]:
+                remaining[name] -= 1
+                if remaining[name] == 0:
+                    ready.add(name)
+        level = [e for e in envs if e.name in ready]
+    if remaining:
+        raise ValueError(f"dependency cycle between envs {sorted(remaining)}")
+    return waves
+
+
+def wave_name(level: List[CompiledEnv], index: int, pipeline: str, used: List[str]) -> str:
+    """Return the shared wave label of a level, else a generated name."""
+    labels = {e.wave for e in level}
+    if len(labels) == 1 and None not in labels and level[0].wave not in used:
+        return level[0].wave
+    return f"{pipeline}-wave-{index}"
+
+
+def compile_config(envs: Iterable, pipelines: List[str]) -> CompiledConfig:
+    """Compile envs and index them by name, pipeline and wave."""
+    compiled = tuple(compile_env(e) for e in envs)
+    by_pipeline = {}
+    by_wave = {}
+    for n, pipeline in enumerate(pipelines):
+        members = tuple(
+            e for e in compiled
+            if e.deployable and (pipeline in e.pipelines if e.pipelines else n == 0)
+        )
+        by_pipeline[pipeline] = members
+        for e in members:
+            if e.wave is not None:
+                by_wave.setdefault((pipeline, e.wave), []).append(e)
+    return CompiledConfig(
+        envs=compiled,
+        pipelines=tuple(pipelines),
+        by_name=MappingProxyType({e.name: e for e in compiled}),
+        by_pipeline=MappingProxyType(by_pipeline),
+        by_wave=MappingProxyType({k: tuple(v) for k, v in by_wave.items()}),
+    )
+
+
+@lru_cache(maxsize=None)
+def compiled() -> CompiledConfig:
+    """Return every env of deploy_config compiled, once per process.
+
+    See deploy_config.load_envs, envs of a partial load that aren't
+    loaded only have their fleet fields.
+    """
+    from deploy_config import fleet, _pipelines
+    return compile_config(fleet, _pipelines)
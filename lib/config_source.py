@@ -0,0 +1,306 @@
+"""Module to read envs from a directory of per-account config files.
+
+Each file under config/ holds the envs of one account, as JSON, TOML
+or YAML (YAML needs pyyaml), EG: config/012345678912.json
+    {"account": "012345678912", "region": "ap-southeast-2",
+     "envs": [{"name": "datalake-dev", "pipelines": ["tgw-attachments"],
+               "vpc_cidrs": "172.16.146.0/24", "tags": {"environment": "dev"},
+               "approvals": {"approver_email": "team@example.com"}}]}
+account and region default every env's aws_acct. List values of comma
+separated fields, EG: pipelines or vpc_cidrs, are joined.
+
+config/index.json maps pipelines, waves and env names to the files
+holding them, so a pipeline or a selective synth (-c pipeline=...,
+-c envs=..., see app.py) parses only the files it needs. Envs load in
+index file order, then file order. Teams edit their own account's
+file, the index is regenerated, not merged.
+
+The index also keeps a summary of every env, its FLEET_FIELDS, so
+fleet wide checks and plans (cidr allocation, fleet validation, the tgw
+mesh, tgw owners) see every env of a partial load, see
+ConfigSource.fleet. A file whose envs differ from the index fails the
+load, the index is stale.
+
+EG: python -m lib.config_source export  # deploy_config envs -> config/
+    python -m lib.config_source index   # after editing a file
+    python -m lib.config_source check   # in CI, fails on a stale index
+"""
+import argparse
+import json
+import os
+from dataclasses import asdict, fields
+from typing import Dict, Iterable, List
+
+from lib.cdk_project_classes import CDKTargetAWSEnv, CIDRSizing, StackBudget
+from lib.compiled_config import split_values
+from lib.pipeline_classes import AWSAccount, PipelineApproval, Tag
+
+DEFAULT_CONFIG_DIR = "config"
+INDEX_FILE = "index.json"
+INDEX_VERSION = 2
+SUFFIXES = (".json", ".toml", ".yaml", ".yml")
+
+_NESTED = {
+    "aws_acct": AWSAccount,
+    "approvals": PipelineApproval,
+    "cidr_sizing": CIDRSizing,
+    "stack_budget": StackBudget,
+}
+_ENV_FIELDS = {f.name for f in fields(CDKTargetAWSEnv)}
+"""Fields fleet wide consumers read, kept per env in the index."""
+FLEET_FIELDS = (
+    "name", "aws_acct", "skip", "pipelines", "wave", "depends_on",
+    "vpc_cidrs", "overall_cidr", "onprem_cidr", "inspection_cidr",
+    "public_subnet", "private_subnet", "transit_subnet",
+    "availability_zones", "cidr_sizing", "org_arn_to_share",
+)
+
+
+def _read(path: str) -> dict:
+    """Parse a config file by its suffix."""
+    if path.endswith(".json"):
+        with open(path) as fp:
+            return json.load(fp)
+    if path.endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:  # python < 3.11
+            import tomli as tomllib
+        with open(path, "rb") as fp:
+            return tomllib.load(fp)
+    try:
+        import yaml
+    except ImportError as e:
+        raise ValueError(f"{path}: yaml config needs pyyaml, pip install pyyaml") from e
+    with open(path) as fp:
+        return yaml.safe_load(fp)
+
+
+def env_from_dict(data: dict, account: str = None, region: str = None) -> CDKTargetAWSEnv:
+    """Build a CDKTargetAWSEnv from a parsed config mapping."""
+    unknown = sorted(set(data) - _ENV_FIELDS)
+    if unknown:
+        raise ValueError(f"env {data.get('name')} has unknown fields {unknown}")
+    acct = {k: v for k, v in [("account", account), ("region", region)] if v is not None}
+    acct.update(data.get("aws_acct", {}))
+    kwargs = {"aws_acct": AWSAccount(**acct)}
+    for key, value in data.items():
+        if key == "aws_acct":
+            continue
+        if key in _NESTED and isinstance(value, dict):
+            value = _NESTED[key](**value)
+        elif key == "tags":
+            items = value.items() if isinstance(value, dict) else (
+                (t["key"], t["value"]) for t in value
+            )
+            value = [Tag(k, v) for k, v in items]
+        elif key == "removal_policy" and isinstance(value, str):
+            import aws_cdk as cdk
+            value = getattr(cdk.RemovalPolicy, value.upper())
+        elif isinstance(value, list):
+            value = ",".join(str(v) for v in value)
+        elif isinstance(value, bool) and key == "contiguous":
+            value = str(value)
+        kwargs[key] = value
+    return CDKTargetAWSEnv(**kwargs)
+
+
+def env_to_dict(env: CDKTargetAWSEnv) -> dict:
+    """Return the fields of env that differ from their defaults."""
+    defaults = {
+        f.name: f.default for f in fields(CDKTargetAWSEnv)
+    }
+    data = {}
+    for f in fields(CDKTargetAWSEnv):
+        value = getattr(env, f.name)
+        if value == defaults[f.name]:
+            continue
+        if f.name == "tags":
+            value = {t.key: t.value for t in value}
+        elif f.name == "removal_policy":
+            value = value.name
+        elif f.name in _NESTED:
+            value = asdict(value)
+        data[f.name] = value
+    return data
+
+
+def fleet_summary(env: CDKTargetAWSEnv) -> dict:
+    """Return the FLEET_FIELDS of env that differ from their defaults."""
+    data = env_to_dict(env)
+    return {k: data[k] for k in FLEET_FIELDS if k in data}
+
+
+def read_file(path: str) -> List[CDKTargetAWSEnv]:
+    """Return the envs of a config file."""
+    data = _read(path)
+    if isinstance(data, list):
+        data = {"envs": data}
+    try:
+        return [
+            env_from_dict(e, data.get("account"), data.get("region"))
+            for e in data.get("envs", [])
+        ]
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"{path}: {e}") from e
+
+
+def _files(directory: str) -> List[str]:
+    return sorted(
+        name for name in os.listdir(directory)
+        if name.endswith(SUFFIXES) and name != INDEX_FILE
+    )
+
+
+def build_index(directory: str, pipelines: List[str]) -> dict:
+    """Parse every file and return the index of its pipelines, waves and envs.
+
+    Envs without pipelines belong to the first pipeline, see PipelineStack.
+    """
+    index = {
+        "version": INDEX_VERSION,
+        "files": _files(directory),
+        "pipelines": {p: [] for p in pipelines},
+        "waves": {},
+        "envs": {},
+        "fleet": {},
+    }
+    for name in index["files"]:
+        for env in read_file(os.path.join(directory, name)):
+            if env.name in index["envs"]:
+                raise ValueError(
+                    f"env {env.name} is in {index['envs'][env.name]} and {name}"
+                )
+            index["envs"][env.name] = name
+            index["fleet"][env.name] = fleet_summary(env)
+            for p in split_values(env.pipelines) or pipelines[:1]:
+                if p not in index["pipelines"]:
+                    raise ValueError(f"{name}: env {env.name} has unknown pipeline {p}")
+                if name not in index["pipelines"][p]:
+                    index["pipelines"][p].append(name)
+                if env.wave is not None:
+                    files = index["waves"].setdefault(p, {}).setdefault(env.wave, [])
+                    if name not in files:
+                        files.append(name)
+    return index
+
+
+class ConfigSource():
+    """Envs of a config directory, parsed file by file as they are needed."""
+
+    def __init__(self, directory: str = DEFAULT_CONFIG_DIR, pipelines: List[str] = None) -> None:
+        self.directory = directory
+        self.pipelines = pipelines or []
+        self._index = None
+        self._parsed: Dict[str, List[CDKTargetAWSEnv]] = {}
+
+    @property
+    def index(self) -> dict:
+        """The index file, built by parsing every file if there isn't a current one."""
+        if self._index is None:
+            path = os.path.join(self.directory, INDEX_FILE)
+            if os.path.exists(path):
+                with open(path) as fp:
+                    self._index = json.load(fp)
+            if self._index is None or self._index.get("version") != INDEX_VERSION:
+                print(f"WARNING no current {path}, parsing every config file, "
+                      "run python -m lib.config_source index")
+                self._index = build_index(self.directory, self.pipelines)
+        return self._index
+
+    def files_for(self, pipelines: Iterable[str] = None, env_names: Iterable[str] = None) -> List[str]:
+        """Return the files holding env_names, else the envs of pipelines, else all."""
+        index = self.index
+        wanted = set()
+        if env_names is not None:
+            for name in env_names:
+                if name not in index["envs"]:
+                    raise ValueError(f"env {name} is not in {self.directory}/{INDEX_FILE}")
+                wanted.add(index["envs"][name])
+        elif pipelines is not None:
+            for p in pipelines:
+                wanted.update(index["pipelines"].get(p, []))
+        else:
+            return list(index["files"])
+        return [f for f in index["files"] if f in wanted]
+
+    def load(self, pipelines: Iterable[str] = None, env_names: Iterable[str] = None) -> List[CDKTargetAWSEnv]:
+        """Return the envs of the files pipelines and env_names need."""
+        envs = []
+        for name in self.files_for(pipelines, env_names):
+            if name not in self._parsed:
+                self._parsed[name] = self._read_indexed(name)
+            envs += self._parsed[name]
+        return envs
+
+    def fleet(self, loaded: Iterable[CDKTargetAWSEnv] = ()) -> List[CDKTargetAWSEnv]:
+        """Return every env in index order, loaded envs as they are, the rest from the index.
+
+        Envs built from the index only have their FLEET_FIELDS, they are
+        read by fleet wide consumers, never deployed.
+        """
+        loaded = {e.name: e for e in loaded}
+        return [
+            loaded.get(name) or env_from_dict(dict(summary, approvals=None, tags=[]))
+            for name, summary in self.index["fleet"].items()
+        ]
+
+    def _read_indexed(self, name: str) -> List[CDKTargetAWSEnv]:
+        """Read a file, ValueError if its envs aren't the ones indexed."""
+        envs = read_file(os.path.join(self.directory, name))
+        indexed = [e for e, f in self.index["envs"].items() if f == name]
+        if [e.name for e in envs] != indexed or any(
+            fleet_summary(e) != self.index["fleet"][e.name] for e in envs
+        ):
+            raise ValueError(
+                f"{self.directory}/{name} changed since {INDEX_FILE} was built, "
+                "run python -m lib.config_source index"
+            )
+        return envs
+
+
+def export(envs: Iterable[CDKTargetAWSEnv], directory: str = DEFAULT_CONFIG_DIR) -> List[str]:
+    """Write envs into one JSON file per account, return the files written."""
+    accounts: Dict[str, List[CDKTargetAWSEnv]] = {}
+    for env in envs:
+        accounts.setdefault(env.aws_acct.account, []).append(env)
+    os.makedirs(directory, exist_ok=True)
+    written = []
+    for account, account_envs in accounts.items():
+        name = f"{account or 'unassigned'}.json"
+        with open(os.path.join(directory, name), "w") as fp:
+            json.dump({"account": account, "envs": [env_to_dict(e) for e in account_envs]}, fp, indent=2)
+        written.append(name)
+    return written
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["index", "check", "export"])
+    parser.add_argument("--config-dir", default=DEFAULT_CONFIG_DIR)
+    args = parser.parse_args(argv)
+
+    import deploy_config
+    path = os.path.join(args.config_dir, INDEX_FILE)
+    if args.command == "export":
+        deploy_config.load_envs()
+        written = export(deploy_config.envs, args.config_dir)
+        print(f"{len(written)} config files written to {args.config_dir}")
+    index = build_index(args.config_dir, deploy_config._pipelines)
+    if args.command == "check":
+        try:
+            with open(path) as fp:
+                current = json.load(fp)
+        except FileNotFoundError:
+            current = None
+        if current != index:
+            raise SystemExit(f"{path} is stale, run python -m lib.config_source index")
+        print(f"{path} is up to date")
+        return
+    with open(path, "w") as fp:
+        json.dump(index, fp, indent=2)
+    print(f"{len(index['envs'])} envs in {len(index['files'])} files indexed in {path}")
+
+
+if __name__ == "__main__":
+    main()
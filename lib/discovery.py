@@ -0,0 +1,373 @@
+"""Module to discover existing AWS resources during synth.
+
+Lookups are memoized per account/region for the lifetime of the process,
+so every stage of every pipeline shares one round trip, and are persisted
+to an on-disk cache with a TTL, in the spirit of cdk.context.json, so
+repeated synths don't repeat them either.
+
+A transit gateway id already in the app's context, written there by
+lib.prewarm, is used as is without any lookup. So are transit gateway
+peering attachments, which are never cached on disk, see lib.tgw_mesh.
+
+Lookups in another account assume its cdk bootstrap lookup role, the
+same role `cdk synth` uses for context lookups. A failed lookup, EG: a
+missing lookup role or AccessDenied, raises DiscoveryError for that
+lookup only, lib.prewarm then leaves its context key unset.
+
+Invalidate the on-disk cache with:
+    python -m lib.discovery invalidate [--account ACCOUNT] [--region REGION]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+from lib.instrumentation import instrumentation
+
+DEFAULT_CACHE_FILE = "discovery.context.json"
+DEFAULT_TTL = 3600  # seconds a cached lookup stays valid
+CONTEXT_FILE = "cdk.context.json"
+LOOKUP_ROLE = "arn:aws:iam::{account}:role/cdk-hnb659fds-lookup-role-{account}-{region}"
+_SSM_BATCH = 10  # max names per ssm get_parameters call
+_SSM_WORKERS = 8  # concurrent get_parameters calls per account
+
+# transit gateways in any other state are being torn down
+_TGW_LIVE_STATES = ["available", "pending", "modifying"]
+
+
+class DiscoveryError(Exception):
+    """A lookup failed, EG: the lookup role can't be assumed."""
+
+
+def _lookup_errors() -> tuple:
+    from botocore.exceptions import BotoCoreError, ClientError
+    return (BotoCoreError, ClientError)
+
+
+def _cache_key(kind: str, account: str, region: str) -> str:
+    return f"{kind}:account={account}:region={region}"
+
+
+def tgw_context_key(account: str, region: str) -> str:
+    """Context key of a transit gateway id, "" when there is none."""
+    return _cache_key("tgw", account, region)
+
+
+def tgw_peerings_context_key(account: str, region: str) -> str:
+    """Context key of the available peering attachments by peer region."""
+    return _cache_key("tgw-peerings", account, region)
+
+
+class DiscoveryCache():
+    """On-disk cache of lookup results with a TTL per entry."""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_FILE,
+        ttl: int = DEFAULT_TTL
+    ) -> None:
+        self.path = path
+        self.ttl = ttl
+        self._entries = None
+
+    def get(self, key: str) -> Tuple[bool, Optional[object]]:
+        """Return (hit, value) for a key that hasn't expired."""
+        entry = self._load().get(key)
+        if entry is None or time.time() - entry["timestamp"] > self.ttl:
+            return False, None
+        return True, entry["value"]
+
+    def put(self, key: str, value) -> None:
+        self._load()[key] = {"value": value, "timestamp": time.time()}
+        self._save()
+
+    def invalidate(self, account: str = None, region: str = None) -> int:
+        """Drop entries matching account and/or region, all if neither."""
+        entries = self._load()
+        dropped = [
+            k for k in entries
+            if (account is None or f":account={account}:" in k)
+            and (region is None or k.endswith(f":region={region}"))
+        ]
+        for k in dropped:
+            del entries[k]
+        self._save()
+        return len(dropped)
+
+    def _load(self) -> Dict[str, dict]:
+        if self._entries is None:
+            try:
+                with open(self.path) as fp:
+                    self._entries = json.load(fp)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as fp:
+            json.dump(self._entries, fp, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+class Discovery():
+    """Memoized lookups of existing resources keyed per account/region."""
+
+    def __init__(self, cache: DiscoveryCache = None) -> None:
+        self.cache = cache or DiscoveryCache()
+        self._memo = {}
+        self._failed = set()  # keys of lookups that failed in this synth
+        self._clients = {}
+        self._sessions = {}
+        self._caller_account = None
+        self._lock = threading.Lock()  # lookups may run in threads, see prewarm
+
+    def tgw_id(self, account: str, region: str, scope=None) -> Optional[str]:
+        """Return the id of the transit gateway visible in account/region.
+
+        Returns None when no transit gateway exists yet or the lookup
+        fails, e.g. on a first deploy or without credentials.
+        """
+        key = tgw_context_key(account, region)
+        if scope is not None:
+            value = scope.node.try_get_context(key)
+            if value is not None:
+                return value or None
+        if key in self._failed:
+            return None
+        try:
+            return self.lookup_tgw_id(account, region)
+        except DiscoveryError as e:
+            # failed lookups are memoized for this synth only
+            instrumentation.event("tgw lookup failed", account=account, region=region, error=str(e))
+            with self._lock:
+                self._failed.add(key)
+            return None
+
+    def lookup_tgw_id(self, account: str, region: str) -> Optional[str]:
+        """Return the id of the transit gateway of account/region, None if there is none.
+
+        DiscoveryError when the lookup fails.
+        """
+        key = tgw_context_key(account, region)
+        if key not in self._memo:
+            hit, value = self.cache.get(key)
+            instrumentation.count("lookup", "tgw cache hit" if hit else "tgw")
+            if not hit:
+                try:
+                    with instrumentation.span("lookup", kind="tgw", account=account, region=region):
+                        value = self._describe_tgw_id(account, region)
+                except _lookup_errors() as e:
+                    raise DiscoveryError(f"tgw lookup failed for {account}/{region}: {e}") from e
+                with self._lock:
+                    self.cache.put(key, value)
+            with self._lock:
+                self._memo[key] = value
+        return self._memo[key]
+
+    def tgw_peerings(self, account: str, region: str, scope=None) -> Dict[str, str]:
+        """Return the available peering attachment ids of account/region by peer region.
+
+        Not cached on disk, peerings become available between deploys.
+        DiscoveryError when the lookup fails, {} would drop the routes
+        of peerings that are available.
+        """
+        key = tgw_peerings_context_key(account, region)
+        if scope is not None:
+            value = scope.node.try_get_context(key)
+            if value is not None:
+                return value
+        if key not in self._memo:
+            instrumentation.count("lookup", "tgw peerings")
+            try:
+                with instrumentation.span("lookup", kind="tgw-peerings", account=account, region=region):
+                    value = self._describe_tgw_peerings(account, region)
+            except _lookup_errors() + (DiscoveryError,) as e:
+                instrumentation.event("tgw peering lookup failed", account=account, region=region, error=str(e))
+                raise DiscoveryError(f"tgw peering lookup failed for {account}/{region}: {e}") from e
+            with self._lock:
+                self._memo[key] = value
+        return self._memo[key]
+
+    def ssm_parameters(
+        self,
+        account: str,
+        region: str,
+        names: Iterable[str]
+    ) -> Dict[str, str]:
+        """Return the values of the named SSM parameters that exist.
+
+        Not cached on disk, parameters change with every deploy. Names
+        are fetched ten to a call, the most get_parameters allows, with
+        the calls made concurrently. DiscoveryError when any call fails.
+        """
+        names = list(dict.fromkeys(names))
+        client = self._client("ssm", region, account)
+        batches = [
+            names[i:i + _SSM_BATCH] for i in range(0, len(names), _SSM_BATCH)
+        ]
+        values = {}
+        instrumentation.count("lookup", "ssm get_parameters", len(batches))
+        try:
+            with instrumentation.span("lookup", kind="ssm", account=account, region=region), \
+                    ThreadPoolExecutor(max_workers=_SSM_WORKERS) as pool:
+                for response in pool.map(
+                    lambda batch: client.get_parameters(Names=batch), batches
+                ):
+                    for p in response["Parameters"]:
+                        values[p["Name"]] = p["Value"]
+        except _lookup_errors() as e:
+            raise DiscoveryError(f"ssm lookup failed for {account}/{region}: {e}") from e
+        return values
+
+    def exports(
+        self,
+        account: str,
+        region: str,
+        names: Iterable[str]
+    ) -> Dict[str, str]:
+        """Return the values of the named CloudFormation exports that exist.
+
+        DiscoveryError when the lookup fails.
+        """
+        names = set(names)
+        paginator = self._client("cloudformation", region, account).get_paginator(
+            "list_exports"
+        )
+        values = {}
+        instrumentation.count("lookup", "cloudformation list_exports")
+        try:
+            with instrumentation.span("lookup", kind="exports", account=account, region=region):
+                for page in paginator.paginate():
+                    for export in page["Exports"]:
+                        if export["Name"] in names:
+                            values[export["Name"]] = export["Value"]
+        except _lookup_errors() as e:
+            raise DiscoveryError(f"exports lookup failed for {account}/{region}: {e}") from e
+        return values
+
+    def _describe_tgw_id(self, account: str, region: str) -> Optional[str]:
+        paginator = self._client("ec2", region, account).get_paginator(
+            "describe_transit_gateways"
+        )
+        pages = paginator.paginate(
+            Filters=[{"Name": "state", "Values": _TGW_LIVE_STATES}]
+        )
+        for page in pages:
+            for tgw in page["TransitGateways"]:
+                return tgw["TransitGatewayId"]
+        return None
+
+    def _describe_tgw_peerings(self, account: str, region: str) -> Dict[str, str]:
+        paginator = self._client("ec2", region, account).get_paginator(
+            "describe_transit_gateway_peering_attachments"
+        )
+        pages = paginator.paginate(
+            Filters=[{"Name": "state", "Values": ["available"]}]
+        )
+        peerings = {}
+        for page in pages:
+            for p in page["TransitGatewayPeeringAttachments"]:
+                requester = p["RequesterTgwInfo"]["Region"]
+                accepter = p["AccepterTgwInfo"]["Region"]
+                peer = accepter if requester == region else requester
+                peerings[peer] = p["TransitGatewayAttachmentId"]
+        return peerings
+
+    def _client(self, service: str, region: str, account: str = None):
+        key = (service, region, account)
+        if key not in self._clients:
+            client = self._session(account, region).client(service)
+            with self._lock:
+                self._clients.setdefault(key, client)
+        return self._clients[key]
+
+    def _session(self, account: str, region: str):
+        """Return a session in account, via its lookup role if need be.
+
+        Each session is built in the thread that first needs it, a race
+        only costs a duplicate session. DiscoveryError when the caller
+        can't be identified or the lookup role can't be assumed.
+        """
+        key = (account, region)
+        if key not in self._sessions:
+            import boto3
+            session = boto3.session.Session(region_name=region)
+            try:
+                if self._caller_account is None:
+                    self._caller_account = session.client(
+                        "sts"
+                    ).get_caller_identity()["Account"]
+                if account is not None and account != self._caller_account:
+                    creds = session.client("sts").assume_role(
+                        RoleArn=LOOKUP_ROLE.format(account=account, region=region),
+                        RoleSessionName="cdk-env-pipeline-discovery"
+                    )["Credentials"]
+                else:
+                    creds = None
+            except _lookup_errors() as e:
+                raise DiscoveryError(
+                    f"can't look up resources in {account}/{region}: {e}"
+                ) from e
+            if creds is not None:
+                session = boto3.session.Session(
+                    aws_access_key_id=creds["AccessKeyId"],
+                    aws_secret_access_key=creds["SecretAccessKey"],
+                    aws_session_token=creds["SessionToken"],
+                    region_name=region
+                )
+            with self._lock:
+                self._sessions.setdefault(key, session)
+        return self._sessions[key]
+
+
+def update_context_file(
+    values: Dict[str, object],
+    path: str = CONTEXT_FILE,
+    remove: Iterable[str] = ()
+) -> None:
+    """Merge values into cdk.context.json, where synth reads context from.
+
+    Keys in remove are dropped, so synth looks them up itself.
+    """
+    try:
+        with open(path) as fp:
+            context = json.load(fp)
+    except FileNotFoundError:
+        context = {}
+    for key in remove:
+        context.pop(key, None)
+    context.update(values)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as fp:
+        json.dump(context, fp, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+"""Discovery shared by every stack constructed in this process."""
+discovery = Discovery()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cache-file", default=DEFAULT_CACHE_FILE)
+    sub = parser.add_subparsers(dest="command", required=True)
+    invalidate = sub.add_parser("invalidate", help="drop cached lookups")
+    invalidate.add_argument("--account")
+    invalidate.add_argument("--region")
+    sub.add_parser("show", help="print cached lookups")
+    args = parser.parse_args(argv)
+
+    cache = DiscoveryCache(args.cache_file)
+    if args.command == "invalidate":
+        dropped = cache.invalidate(account=args.account, region=args.region)
+        print(f"invalidated {dropped} cached lookup(s) in {args.cache_file}")
+    else:
+        print(json.dumps(cache._load(), indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
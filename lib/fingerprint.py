@@ -0,0 +1,110 @@
+"""Module to fingerprint env deploy stages for change-aware pipelines.
+
+A stage's fingerprint hashes its resolved CDKTargetAWSEnv, the source
+of the stack classes it contains and its synthesized templates. The
+fingerprint of every stage a pipeline deploys is recorded in an SSM
+parameter of the tooling account once the pipeline succeeds, and
+lib.prewarm reads them back into context before synth, so stages whose
+fingerprint is unchanged can be left out of the next run.
+"""
+import hashlib
+import inspect
+import json
+import os
+from dataclasses import asdict
+from typing import Dict, List
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_source_hashes: Dict[str, str] = {}
+
+
+def parameter_name(project_name: str, pipeline: str, env_name: str) -> str:
+    """Return the SSM parameter holding an env's last deployed fingerprint."""
+    return f"/{project_name}/fingerprints/{pipeline}/{env_name}"
+
+
+def context_key(pipeline: str) -> str:
+    """Context key of the recorded fingerprints per env of a pipeline."""
+    return f"stage-fingerprints:{pipeline}"
+
+
+def _source_hash(cls: type) -> str:
+    """Hash the source of cls and its bases that live in this repo."""
+    digest = hashlib.sha256()
+    for base in cls.__mro__:
+        try:
+            path = inspect.getsourcefile(base)
+        except TypeError:  # builtins
+            continue
+        if path is None or not os.path.abspath(path).startswith(_ROOT):
+            continue
+        if path not in _source_hashes:
+            with open(path, "rb") as fp:
+                _source_hashes[path] = hashlib.sha256(fp.read()).hexdigest()
+        digest.update(_source_hashes[path].encode())
+    return digest.hexdigest()
+
+
+def stack_source_hash(stage) -> str:
+    """Hash the source of the stack classes of a stage.
+
+    A CachedStage has no stacks, it has the hash stored with its assembly.
+    """
+    cached = getattr(stage, "stack_source_hash", None)
+    if cached is not None:
+        return cached
+    import aws_cdk as cdk
+    digest = hashlib.sha256()
+    for child in stage.node.children:
+        if isinstance(child, cdk.Stack):
+            digest.update(_source_hash(type(child)).encode())
+    return digest.hexdigest()
+
+
+def stage_fingerprint(stage) -> str:
+    """Return the fingerprint of a CDKStage, synthesizing it if need be."""
+    assembly = stage.synth()
+    digest = hashlib.sha256()
+    digest.update(
+        json.dumps(asdict(stage.target), sort_keys=True, default=str).encode()
+    )
+    digest.update(stack_source_hash(stage).encode())
+    for artifact in sorted(assembly.stacks, key=lambda a: a.stack_name):
+        digest.update(artifact.stack_name.encode())
+        digest.update(json.dumps(artifact.template, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def fetch(
+    project_name: str,
+    config,
+    account: str,
+    region: str,
+    discovery
+) -> Dict[str, Dict[str, str]]:
+    """Return the recorded fingerprints of every pipeline of a CompiledConfig, as context."""
+    pipelines = config.pipelines
+    names = {
+        parameter_name(project_name, p, e.name): (p, e.name)
+        for p in pipelines for e in config.pipeline_envs(p)
+    }
+    values = discovery.ssm_parameters(account, region, names)
+    context = {context_key(p): {} for p in pipelines}
+    for name, value in values.items():
+        pipeline, env_name = names[name]
+        context[context_key(pipeline)][env_name] = value
+    return context
+
+
+def record_commands(
+    project_name: str,
+    pipeline: str,
+    fingerprints: Dict[str, str]
+) -> List[str]:
+    """Return shell commands recording fingerprints once deployed."""
+    return [
+        f"aws ssm put-parameter --overwrite --type String "
+        f"--name {parameter_name(project_name, pipeline, env_name)} "
+        f"--value {fingerprint}"
+        for env_name, fingerprint in fingerprints.items()
+    ]
@@ -0,0 +1,216 @@
+"""Module to validate CIDRs and quotas across every CDKTargetAWSEnv.
+
+Run before any construct is created, so overlaps fail synth rather than
+a CloudFormation deploy deep into a multi-pipeline run. Envs are
+validated as compiled by lib.compiled_config, which already failed on
+values that don't parse. VPC, on-premises and subnet ranges are checked
+with a sorted-interval sweep, O(n log n) plus one step per overlap
+found, not pairwise.
+
+EG: python -m lib.fleet_validator
+"""
+import heapq
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, NamedTuple
+
+from lib import tgw_mesh
+from lib.compiled_config import CompiledEnv, Network
+
+"""AWS default quotas, EG: transit gateway attachments per transit gateway.
+
+Transit gateway quotas are checked for the busiest region's hub.
+"""
+DEFAULT_QUOTAS = {
+    "tgw_attachments": 5000,
+    "tgw_route_tables": 20,
+    "tgw_static_routes": 10000,
+    "vpc_route_table_routes": 50,
+    "tgw_peering_attachments": 50,
+}
+QUOTA_WARNING = 0.8  # warn when projected usage passes this fraction
+
+_TGW_ROUTE_TABLES = 2  # egress-rt and inspection-rt, see NetworkStack
+
+
+class Interval(NamedTuple):
+    """A CIDR as an inclusive integer range with what it belongs to."""
+
+    start: int
+    end: int
+    kind: str  # vpc, onprem or subnet
+    label: str
+
+
+@dataclass
+class ValidationReport:
+    """Errors fail synth, warnings are synth report events, see app.py."""
+
+    errors: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    quotas: Dict[str, dict] = field(default_factory=dict)
+
+    def format(self) -> str:
+        lines = [f"ERROR {e}" for e in self.errors]
+        lines += [f"WARNING {w}" for w in self.warnings]
+        for name, q in self.quotas.items():
+            lines.append(
+                f"quota {name}: {q['projected']}/{q['limit']} "
+                f"({q['projected'] / q['limit']:.0%})"
+            )
+        return "\n".join(lines)
+
+
+def _cidrs(networks: Iterable[Network]) -> str:
+    return ",".join(str(n) for n in networks)
+
+
+def _interval(net: Network, kind: str, label: str) -> Interval:
+    return Interval(
+        int(net.network_address), int(net.broadcast_address), kind, label
+    )
+
+
+def sweep_overlaps(intervals: Iterable[Interval]) -> List[tuple]:
+    """Return every overlapping pair of intervals.
+
+    Sorted by start, with a heap of active intervals keyed by end, so
+    each interval is pushed and popped once.
+    """
+    overlaps = []
+    active = []
+    for i in sorted(intervals):
+        while active and active[0][0] < i.start:
+            heapq.heappop(active)
+        overlaps.extend((a[1], i) for a in active)
+        heapq.heappush(active, (i.end, i))
+    return overlaps
+
+
+def _check_subnets(env: CompiledEnv, vpcs: List[Interval], report: ValidationReport) -> None:
+    azs = len(env.availability_zones)
+    vpc_size = sum(v.end - v.start + 1 for v in vpcs)
+    subnets = []
+    masked = 0
+    if env.public_subnet is not None:  # a mask, carved per AZ by the Vpc construct
+        masked += azs * (1 << (32 - env.public_subnet))
+    for tier in ["private_subnet", "transit_subnet"]:
+        spec = getattr(env, tier)
+        if spec is None:
+            continue
+        if spec.mask is not None:
+            masked += azs * (1 << (32 - spec.mask))
+        for cidr in spec.cidrs:
+            s = _interval(cidr, "subnet", f"{env.name} {tier} {cidr}")
+            if not any(v.start <= s.start and s.end <= v.end for v in vpcs):
+                report.errors.append(
+                    f"{s.label} is outside vpc {_cidrs(env.vpc_cidrs)}"
+                )
+            subnets.append(s)
+    if masked + sum(s.end - s.start + 1 for s in subnets) > vpc_size:
+        report.errors.append(
+            f"{env.name} subnets need more addresses than vpc {_cidrs(env.vpc_cidrs)}"
+        )
+    for a, b in sweep_overlaps(subnets):
+        report.errors.append(f"{a.label} overlaps {b.label}")
+
+
+def _check_quota(report, name, projected, quotas, region=None) -> None:
+    limit = quotas[name]
+    report.quotas[name] = {"projected": projected, "limit": limit}
+    if region is not None:
+        name = f"{name} of {region}"
+    if projected > limit:
+        report.errors.append(f"{name} {projected} exceeds quota {limit}")
+    elif projected > limit * QUOTA_WARNING:
+        report.warnings.append(
+            f"{name} {projected} is over {QUOTA_WARNING:.0%} of quota {limit}"
+        )
+
+
+def validate_fleet(envs: Iterable[CompiledEnv], quotas: Dict[str, int] = None) -> ValidationReport:
+    """Check CIDRs and projected TGW usage of every env against the rest."""
+    quotas = dict(DEFAULT_QUOTAS, **(quotas or {}))
+    report = ValidationReport()
+    envs = [e for e in envs if not e.skip]
+
+    intervals = []
+    vpcs_by_region = Counter()  # each region's vpcs attach to its own hub
+    onprem = {}
+    overall = set()
+    inspection = None
+    for env in envs:
+        vpcs = [_interval(c, "vpc", f"{env.name} vpc {c}") for c in env.vpc_cidrs]
+        for c in env.onprem_cidrs:
+            onprem.setdefault(c, _interval(c, "onprem", f"onprem {c}"))
+        overall.update(env.overall_cidrs)
+        if vpcs:
+            _check_subnets(env, vpcs, report)
+        intervals += vpcs
+        vpcs_by_region[env.region] += len(vpcs)
+        if env.public_subnet is not None:
+            inspection = env
+
+    vpc_cidrs = {c for env in envs for c in env.vpc_cidrs}
+    for env in envs:
+        if env.inspection_cidr is None:
+            continue
+        if env.vpc_cidrs:
+            # its routes would deploy with its own attachment, before the spokes'
+            report.errors.append(
+                f"{env.name} has an inspection_cidr and vpc_cidrs, "
+                "an env routing its region's attachments can't attach a vpc"
+            )
+        if env.inspection_cidr not in vpc_cidrs:
+            report.errors.append(
+                f"{env.name} inspection_cidr {env.inspection_cidr} "
+                "is not the cidr of any vpc"
+            )
+
+    for a, b in sweep_overlaps(intervals + list(onprem.values())):
+        if a.kind == "onprem" and b.kind == "onprem":
+            continue  # on-premises ranges may nest
+        report.errors.append(f"{a.label} overlaps {b.label}")
+
+    if overall:
+        supernets = [_interval(c, "overall", str(c)) for c in overall]
+        for v in intervals:
+            if not any(s.start <= v.start and v.end <= s.end for s in supernets):
+                report.warnings.append(
+                    f"{v.label} is outside overall_cidr {','.join(sorted(str(c) for c in overall))}, "
+                    "inspection vpc won't route to it"
+                )
+        for a, b in sweep_overlaps(supernets + list(onprem.values())):
+            if a.kind != b.kind:
+                report.errors.append(f"{a.label} overlaps {b.label}")
+
+    _check_quota(report, "tgw_route_tables", _TGW_ROUTE_TABLES, quotas)
+    if inspection is not None:
+        # local, default via nat, overall cidr and each on-premises range
+        routes = 2 + len(inspection.overall_cidrs) + len(onprem)
+        _check_quota(report, "vpc_route_table_routes", routes, quotas)
+
+    # every hub peers with the hub of every other region
+    mesh_errors = tgw_mesh.mesh_errors(envs)
+    report.errors += mesh_errors
+    peerings = 0
+    if not mesh_errors:
+        peerings = max(len(tgw_mesh.hubs(envs)) - 1, 0)
+        _check_quota(report, "tgw_peering_attachments", peerings, quotas)
+    region, vpcs = max(vpcs_by_region.items(), key=lambda r: r[1], default=(None, 0))
+    _check_quota(report, "tgw_attachments", vpcs + peerings, quotas, region)
+    # inspection-rt routes to every spoke vpc, egress-rt has the default route
+    _check_quota(report, "tgw_static_routes", vpcs, quotas, region)
+    return report
+
+
+def main() -> None:
+    from lib.compiled_config import compiled
+    report = validate_fleet(compiled().envs)
+    print(report.format() or "fleet is valid")
+    if report.errors:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
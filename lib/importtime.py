@@ -0,0 +1,121 @@
+"""Module to report what a cold start of the app costs in imports.
+
+Runs the given modules under `python -X importtime` in a fresh
+interpreter and summarises the result for this app: the slowest
+imports, and totals for the app itself, aws_cdk service modules,
+jsii, boto3/botocore and everything else.
+
+EG: python -m lib.importtime
+    python -m lib.importtime deploy_config --top 10 --json
+"""
+import argparse
+import json
+import subprocess
+import sys
+from typing import Dict, List, NamedTuple
+
+DEFAULT_MODULES = [
+    "deploy_config",
+    "cdk_env_pipeline.stacks.pipeline_stack",
+]
+
+_APP_PACKAGES = ("lib", "cdk_env_pipeline", "deploy_config", "app")
+
+
+class ImportTime(NamedTuple):
+    """One line of -X importtime output, times in microseconds."""
+
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def _group(module: str) -> str:
+    top = module.split(".")[0]
+    if top in _APP_PACKAGES:
+        return "app"
+    if top == "aws_cdk":
+        parts = module.split(".")
+        return f"aws_cdk.{parts[1]}" if len(parts) > 1 else "aws_cdk"
+    if top in ("jsii", "constructs", "cattrs", "cattr", "typeguard"):
+        return "jsii"
+    if top in ("boto3", "botocore", "s3transfer"):
+        return "boto3"
+    return "other"
+
+
+def measure(modules: List[str]) -> List[ImportTime]:
+    """Import modules in a fresh interpreter and parse -X importtime."""
+    code = "".join(f"import {m}\n" for m in modules)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    times = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times.append(ImportTime(
+            module=name.strip(),
+            self_us=int(self_us),
+            cumulative_us=int(cumulative_us),
+            depth=(len(name) - len(name.lstrip()) - 1) // 2
+        ))
+    return times
+
+
+def summarise(times: List[ImportTime], top: int = 20) -> dict:
+    """Return slowest imports and per group totals in milliseconds."""
+    groups: Dict[str, float] = {}
+    for t in times:
+        group = _group(t.module)
+        groups[group] = groups.get(group, 0) + t.self_us / 1000
+    slowest = sorted(times, key=lambda t: t.cumulative_us, reverse=True)
+    return {
+        "total_ms": round(sum(t.self_us for t in times) / 1000, 1),
+        "modules": len(times),
+        "groups_ms": {
+            k: round(v, 1)
+            for k, v in sorted(groups.items(), key=lambda i: -i[1])
+        },
+        "slowest": [
+            {
+                "module": t.module,
+                "self_ms": round(t.self_us / 1000, 1),
+                "cumulative_ms": round(t.cumulative_us / 1000, 1),
+            }
+            for t in slowest[:top]
+        ],
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    report = summarise(measure(args.modules), top=args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"cold start: {report['total_ms']} ms "
+          f"across {report['modules']} modules")
+    print("\nby group (self time):")
+    for group, ms in report["groups_ms"].items():
+        print(f"  {ms:>10.1f} ms  {group}")
+    print(f"\nslowest {args.top} (cumulative):")
+    for t in report["slowest"]:
+        print(f"  {t['cumulative_ms']:>10.1f} ms  {t['module']}")
+
+
+if __name__ == "__main__":
+    main()
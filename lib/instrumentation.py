@@ -0,0 +1,162 @@
+"""Module to instrument synth with timing spans, counts and events.
+
+Spans time a block of synth and are nested, EG: app.synth, a stage,
+a stack's _provision_resources, each resource and every lookup. Counts
+are kept per stack and per resource type. After synth a JSON report
+aggregating them per env, stack and resource type is written to
+cdk.out/synth-report.json.
+
+With -c profile=true synth also runs under cProfile and tracemalloc,
+written to cdk.out/synth.prof and cdk.out/synth-memory.txt. With
+-c verbose=true events are printed as well as recorded.
+
+EG: cdk synth -c profile=true && python -m lib.instrumentation cdk.out
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+REPORT_FILE = "synth-report.json"
+PROFILE_FILE = "synth.prof"
+MEMORY_FILE = "synth-memory.txt"
+MEMORY_TOP = 50  # allocation sites written to MEMORY_FILE
+
+
+class Instrumentation():
+    """Spans, counts and events recorded during one synth."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.spans: List[dict] = []
+        self.counts: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: defaultdict(int)
+        )
+        self.events: List[dict] = []
+        self.verbose = False
+        self._local = threading.local()  # open spans per thread, EG: prewarm lookups
+        self._profiler = None
+
+    def start(self, profile: bool = False, verbose: bool = False) -> None:
+        """Start profiling and memory tracing when asked to."""
+        self.verbose = verbose
+        if profile and self._profiler is None:
+            import cProfile
+            import tracemalloc
+            tracemalloc.start()
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attrs):
+        """Time the block, attrs EG: env, stack or type are inherited by child spans."""
+        stack = self._local.__dict__.setdefault("stack", [])
+        parent = stack[-1] if stack else None
+        if parent is not None:
+            attrs = dict(parent["attrs"], **attrs)
+        record = {
+            "name": name,
+            "attrs": attrs,
+            "parent": parent["name"] if parent else None,
+            "start_s": time.perf_counter() - self.started,
+        }
+        stack.append(record)
+        try:
+            yield record
+        finally:
+            stack.pop()
+            record["wall_s"] = time.perf_counter() - self.started - record["start_s"]
+            self.spans.append(record)
+
+    def count(self, kind: str, key: str, n: int = 1) -> None:
+        """Add n to a counter, EG: count("resource_type", "CfnRoute")."""
+        self.counts[kind][key] += n
+
+    def event(self, name: str, **attrs) -> None:
+        """Record a diagnostic, printed with -c verbose=true."""
+        self.events.append({"name": name, "attrs": attrs})
+        if self.verbose:
+            print(f"{name}:", ", ".join(f"{k}={v}" for k, v in attrs.items()))
+
+    def report(self) -> dict:
+        """Aggregate spans per name, env, stack and resource type."""
+        by = {key: defaultdict(lambda: {"count": 0, "wall_s": 0.0})
+              for key in ["span", "env", "stack", "type"]}
+        for s in self.spans:
+            groups = {"span": s["name"]}
+            for key in ["env", "stack", "type"]:
+                if key in s["attrs"]:
+                    groups[key] = f"{s['name']}:{s['attrs'][key]}"
+            for key, group in groups.items():
+                by[key][group]["count"] += 1
+                by[key][group]["wall_s"] += s["wall_s"]
+
+        def ranked(entries):
+            return dict(sorted(
+                ((k, {"count": v["count"], "wall_s": round(v["wall_s"], 4)})
+                 for k, v in entries.items()),
+                key=lambda item: -item[1]["wall_s"]
+            ))
+
+        return {
+            "total_s": round(time.perf_counter() - self.started, 4),
+            "spans": {key: ranked(entries) for key, entries in by.items()},
+            "counts": {k: dict(v) for k, v in self.counts.items()},
+            "events": self.events,
+        }
+
+    def write(self, outdir: str, extra: dict = None) -> str:
+        """Write the report, and profiles if enabled, into outdir.
+
+        extra is added to the report, EG: the reports of parallel workers.
+        """
+        os.makedirs(outdir, exist_ok=True)
+        if self._profiler is not None:
+            import tracemalloc
+            self._profiler.disable()
+            self._profiler.dump_stats(os.path.join(outdir, PROFILE_FILE))
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            with open(os.path.join(outdir, MEMORY_FILE), "w") as fp:
+                for stat in snapshot.statistics("lineno")[:MEMORY_TOP]:
+                    fp.write(f"{stat}\n")
+            self._profiler = None
+        path = os.path.join(outdir, REPORT_FILE)
+        with open(path, "w") as fp:
+            # attrs are diagnostics, values json can't encode are written as str
+            json.dump(dict(self.report(), **(extra or {})), fp, indent=2, default=str)
+        return path
+
+
+"""Instrumentation shared by everything constructed in this process."""
+instrumentation = Instrumentation()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("outdir", nargs="?", default="cdk.out")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    with open(os.path.join(args.outdir, REPORT_FILE)) as fp:
+        report = json.load(fp)
+    print(f"synth took {report['total_s']:.2f}s")
+    for key, entries in report["spans"].items():
+        print(f"\nslowest by {key}:")
+        for name, entry in list(entries.items())[:args.top]:
+            print(f"  {entry['wall_s']:>8.3f}s {entry['count']:>6} {name}")
+    if os.path.exists(os.path.join(args.outdir, PROFILE_FILE)):
+        import pstats
+        print()
+        pstats.Stats(
+            os.path.join(args.outdir, PROFILE_FILE), stream=sys.stdout
+        ).sort_stats("cumulative").print_stats(args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Module to publish a network stage's ids as one SSM document.
+
+With network_outputs "both" or "manifest" (see CDKEnvPipeline) each
+NetworkStack writes a JSON manifest of its vpcs, subnets, route tables
+and transit gateway route tables to one SSM parameter in its account,
+EG: demo-network-manifest-<env>. Consumers read it with a single lookup
+(lib.prewarm, or value_from_lookup) instead of importing one
+CloudFormation export per id.
+
+Migrating off exports:
+    1. "both" publishes the manifest next to the exports, consumers
+       read the manifest and stop importing the exports.
+    2. "manifest" drops the exports, which CloudFormation only allows
+       once nothing imports them.
+"""
+import json
+from typing import Dict, Iterable, List, Optional
+
+PARAMETER_PREFIX = "demo-network-manifest"
+DOCUMENT_VERSION = 1
+MODES = ("exports", "both", "manifest")
+LOOKUP_DUMMY_PREFIX = "dummy-value-for-"  # value_from_lookup before the cdk cli resolved it
+
+
+def parameter_name(env_name: str) -> str:
+    """Return the SSM parameter holding an env's network manifest."""
+    return f"{PARAMETER_PREFIX}-{env_name}"
+
+
+def publishes_exports(mode: str) -> bool:
+    return mode in ("exports", "both")
+
+
+def publishes_manifest(mode: str) -> bool:
+    return mode in ("both", "manifest")
+
+
+def is_lookup_dummy(value: Optional[str]) -> bool:
+    return isinstance(value, str) and value.startswith(LOOKUP_DUMMY_PREFIX)
+
+
+def parse(value: Optional[str]) -> Optional[dict]:
+    """Return a manifest document, None for a lookup dummy or an unknown version."""
+    try:
+        document = json.loads(value)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(document, dict) or document.get("version") != DOCUMENT_VERSION:
+        return None
+    return document
+
+
+def tgw_owner_envs(envs: Iterable, account: str, region: str) -> List[str]:
+    """Names of the envs owning a transit gateway in account/region."""
+    return [
+        e.name for e in envs
+        if not e.skip and e.org_arn_to_share is not None
+        and e.aws_acct.account == account and e.aws_acct.region == region
+    ]
+
+
+def route_tables(documents: Iterable[Optional[dict]]) -> Dict[str, str]:
+    """Return the transit gateway route table ids of the manifest publishing them.
+
+    An account/region has one transit gateway owner, ValueError if
+    several manifests publish route tables.
+    """
+    owners = [
+        d for d in documents
+        if d is not None and d.get("tgw_route_tables")
+    ]
+    if len(owners) > 1:
+        raise ValueError(
+            "transit gateway route tables are published by "
+            f"{sorted(d.get('env') for d in owners)}, expected one owner"
+        )
+    return dict(owners[0]["tgw_route_tables"]) if owners else {}
+
+
+def collect_route_tables(
+    envs: Iterable,
+    account: str,
+    region: str,
+    discovery
+) -> Dict[str, str]:
+    """Return the route table ids published by the tgw owners of account/region."""
+    names = [parameter_name(e) for e in tgw_owner_envs(envs, account, region)]
+    if not names:
+        return {}
+    values = discovery.ssm_parameters(account, region, names)
+    return route_tables(parse(v) for v in values.values())
@@ -0,0 +1,147 @@
+"""Module to synthesize pipelines in parallel worker processes.
+
+Each PipelineStack is independent, so each selected pipeline is
+synthesized by its own `python app.py -c pipeline=<name>` process (and
+jsii kernel) into its own directory. The cloud assemblies are then
+merged into one outdir with a single manifest.json and tree.json.
+
+Used by app.py when synth is run with -c parallel=true EG:
+    cdk synth -c parallel=true
+    cdk synth -c parallel=true -c synth_workers=2
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from lib import template_budget
+from lib.instrumentation import REPORT_FILE
+
+_MERGED_FILES = (
+    "manifest.json", "tree.json", "cdk.out", REPORT_FILE,
+    template_budget.REPORT_FILE
+)
+
+
+def _run_worker(app_py: str, pipeline: str, outdir: str) -> str:
+    """Synthesize one pipeline into outdir, return its output."""
+    context = json.loads(os.environ.get("CDK_CONTEXT_JSON") or "{}")
+    context["pipeline"] = pipeline
+    context.pop("parallel", None)
+    env = dict(
+        os.environ,
+        CDK_OUTDIR=outdir,
+        CDK_CONTEXT_JSON=json.dumps(context)
+    )
+    proc = subprocess.run(
+        [sys.executable, app_py],
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(
+            f"synth of pipeline {pipeline} failed:\n{proc.stderr}"
+        )
+    return proc.stdout
+
+
+def _merge_tree(target: dict, source: dict) -> None:
+    for name, child in source.get("children", {}).items():
+        if name in target.setdefault("children", {}):
+            _merge_tree(target["children"][name], child)
+        else:
+            target["children"][name] = child
+
+
+def merge_assemblies(sources: List[str], outdir: str) -> None:
+    """Merge cloud assembly directories into outdir."""
+    manifest = None
+    tree = None
+    missing = {}
+    budget_reports = []
+    os.makedirs(outdir, exist_ok=True)
+    for source in sources:
+        for name in os.listdir(source):
+            if name in _MERGED_FILES:
+                continue
+            path = os.path.join(source, name)
+            if os.path.isdir(path):
+                shutil.copytree(
+                    path, os.path.join(outdir, name), dirs_exist_ok=True
+                )
+            else:
+                shutil.copy2(path, os.path.join(outdir, name))
+
+        with open(os.path.join(source, "manifest.json")) as fp:
+            source_manifest = json.load(fp)
+        for m in source_manifest.pop("missing", []):
+            missing[m["key"]] = m
+        if manifest is None:
+            manifest = source_manifest
+        else:
+            manifest.setdefault("artifacts", {}).update(
+                source_manifest.get("artifacts", {})
+            )
+
+        tree_path = os.path.join(source, "tree.json")
+        if os.path.exists(tree_path):
+            with open(tree_path) as fp:
+                source_tree = json.load(fp)
+            if tree is None:
+                tree = source_tree
+            else:
+                _merge_tree(tree["tree"], source_tree["tree"])
+
+        # each worker checked its own templates, see app.py
+        if os.path.exists(os.path.join(source, template_budget.REPORT_FILE)):
+            budget_reports.append(template_budget.BudgetReport.read(source))
+
+    if missing:
+        manifest["missing"] = list(missing.values())
+    with open(os.path.join(outdir, "manifest.json"), "w") as fp:
+        json.dump(manifest, fp, indent=2)
+    if tree is not None:
+        with open(os.path.join(outdir, "tree.json"), "w") as fp:
+            json.dump(tree, fp, indent=2)
+    if budget_reports:
+        template_budget.merge_reports(budget_reports).write(outdir)
+    shutil.copy2(
+        os.path.join(sources[0], "cdk.out"), os.path.join(outdir, "cdk.out")
+    )
+
+
+def synth_parallel(
+    app_py: str,
+    pipelines: List[str],
+    outdir: str,
+    workers: int = None
+) -> Dict[str, dict]:
+    """Synthesize each pipeline in a worker process, merge into outdir.
+
+    Returns the synth report of each worker by pipeline.
+    """
+    workdir = tempfile.mkdtemp(prefix="cdk-parallel-")
+    sources = [os.path.join(workdir, p) for p in pipelines]
+    try:
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            outputs = pool.map(
+                _run_worker, [app_py] * len(pipelines), pipelines, sources
+            )
+            for pipeline, output in zip(pipelines, outputs):
+                print(f"pipeline {pipeline} synthesized")
+                print(output, end="")
+        merge_assemblies(sources, outdir)
+        reports = {}
+        for pipeline, source in zip(pipelines, sources):
+            path = os.path.join(source, REPORT_FILE)
+            if os.path.exists(path):
+                with open(path) as fp:
+                    reports[pipeline] = json.load(fp)
+        return reports
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,120 @@
+"""Module to define the order pipelines run in as a DAG.
+
+The DAG maps each pipeline to the pipelines it runs after, EG:
+    {"tgw-attachments": ["EnvPipeline"],
+     "tgw-routes": ["tgw-attachments", "tgw-attachments-eu"]}
+Pipelines without upstreams start on a source push. A pipeline with
+one upstream is started by an EventBridge rule when it succeeds, one
+with several by a gate that starts it once all of them have succeeded.
+"""
+import inspect
+from typing import Dict, List, Optional
+
+GATE_HISTORY = 20  # upstream executions the gate searches for the latest success
+
+
+def latest_succeeded(summaries: List[dict]) -> Optional[str]:
+    """Return the id of the newest succeeded execution, summaries newest first."""
+    for summary in summaries:
+        if summary["status"] == "Succeeded":
+            return summary["pipelineExecutionId"]
+    return None
+
+
+def fan_in_ready(succeeded: Dict[str, Optional[str]], consumed: Dict[str, str]) -> bool:
+    """Return whether every upstream succeeded since the downstream last started.
+
+    succeeded maps each upstream to its latest succeeded execution id,
+    consumed to the one the downstream was last started after.
+    """
+    return all(
+        execution is not None and consumed.get(upstream) != execution
+        for upstream, execution in succeeded.items()
+    )
+
+
+"""Fan-in gate, started on any upstream success.
+
+Starts the downstream pipeline once every upstream has a succeeded
+execution newer than the one it was last started after, so it runs
+once per round of upstreams however their runs interleave. The
+execution ids it started after are kept in the SSM parameter
+STATE_PARAMETER, a missing parameter counts every success as new.
+Runs with a reserved concurrency of 1 so simultaneous upstream
+successes are seen one after the other.
+"""
+FAN_IN_GATE = f'''
+import json
+import os
+from typing import Dict, List, Optional
+
+import boto3
+
+codepipeline = boto3.client("codepipeline")
+ssm = boto3.client("ssm")
+
+
+{inspect.getsource(latest_succeeded)}
+
+{inspect.getsource(fan_in_ready)}
+
+def _consumed():
+    try:
+        value = ssm.get_parameter(Name=os.environ["STATE_PARAMETER"])["Parameter"]["Value"]
+    except ssm.exceptions.ParameterNotFound:
+        return {{}}
+    return json.loads(value)
+
+
+def _save(state):
+    ssm.put_parameter(
+        Name=os.environ["STATE_PARAMETER"], Value=json.dumps(state),
+        Type="String", Overwrite=True
+    )
+
+
+def handler(event, context):
+    succeeded = {{
+        u: latest_succeeded(codepipeline.list_pipeline_executions(
+            pipelineName=u, maxResults={GATE_HISTORY}
+        )["pipelineExecutionSummaries"])
+        for u in os.environ["UPSTREAMS"].split(",")
+    }}
+    consumed = _consumed()
+    if not fan_in_ready(succeeded, consumed):
+        return {{"started": False}}
+    _save(succeeded)  # before starting, so a retried event can't start it twice
+    try:
+        codepipeline.start_pipeline_execution(name=os.environ["DOWNSTREAM"])
+    except Exception:
+        _save(consumed)  # the retry starts it
+        raise
+    return {{"started": True}}
+'''
+
+
+def validate_dag(dag: Dict[str, List[str]], pipelines: List[str]) -> List[str]:
+    """Return pipelines in topological order, ValueError if dag is invalid."""
+    unknown = sorted(
+        {p for p in dag if p not in pipelines}
+        | {u for ups in dag.values() for u in ups if u not in pipelines}
+    )
+    if unknown:
+        raise ValueError(f"pipeline_dag has unknown pipelines {unknown}")
+    remaining = {p: len(set(dag.get(p, []))) for p in pipelines}
+    order = [p for p in pipelines if remaining[p] == 0]
+    for p in order:  # order grows while it is walked
+        for downstream, ups in dag.items():
+            if p in ups:
+                remaining[downstream] -= 1
+                if remaining[downstream] == 0:
+                    order.append(downstream)
+    if len(order) != len(pipelines):
+        cycle = sorted(p for p in pipelines if p not in order)
+        raise ValueError(f"pipeline_dag has a cycle between {cycle}")
+    return order
+
+
+def upstreams(dag: Dict[str, List[str]], pipeline: str) -> List[str]:
+    """Return the pipelines pipeline runs after."""
+    return list(dict.fromkeys(dag.get(pipeline, [])))
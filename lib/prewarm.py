@@ -0,0 +1,188 @@
+"""Module to resolve every synth-time lookup ahead of synth.
+
+Walks the configured envs and resolves, concurrently, everything the
+app would otherwise look up while synthesizing:
+transit gateway ids, the attachment registry (SSM parameters), the
+transit gateway route table ids read by tgw-routes (from the network
+manifests or the exports, see lib.network_manifest), the peering
+attachments of transit gateway hubs in several regions and, for
+change-aware pipelines, the fingerprints of the last deployed stages.
+The results are written to cdk.context.json, so `cdk synth` is a
+single deterministic pass with no missing context to fill in on a
+second round.
+
+A lookup that fails, EG: AccessDenied or a missing lookup role in one
+account, only leaves its own context keys unset, and removed from
+cdk.context.json, so synth falls back to the in-app lookup for them.
+
+EG: python -m lib.prewarm && cdk synth
+
+With --check it exits CHANGED_EXIT_CODE when any value differs from
+what the context file already had, EG: to re-synth a shared assembly
+only when lookups changed after the upstream pipeline deployed.
+"""
+import argparse
+import json
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+
+from lib import attachment_registry, fingerprint, network_manifest, tgw_mesh
+from lib.compiled_config import compile_config, compile_env
+from lib.discovery import (
+    CONTEXT_FILE,
+    DiscoveryError,
+    tgw_context_key,
+    tgw_peerings_context_key,
+    update_context_file
+)
+
+"""Exports of NetworkStack imported by TgwRoutesStack."""
+ROUTE_TABLE_EXPORTS = ["egress-rt-id", "inspection-rt-id"]
+CHANGED_EXIT_CODE = 3
+
+
+def route_tables_context_key(account: str, region: str) -> str:
+    """Context key of the route table exports visible in account/region."""
+    return f"tgw-route-tables:account={account}:region={region}"
+
+
+def _route_tables(
+    envs: List,
+    account: str,
+    region: str,
+    discovery,
+    mode: str
+) -> Dict[str, str]:
+    """Return the route table ids of account/region, manifest first."""
+    values = {}
+    if network_manifest.publishes_manifest(mode):
+        values = network_manifest.collect_route_tables(envs, account, region, discovery)
+    if mode != "manifest" and set(values) != set(ROUTE_TABLE_EXPORTS):
+        values = dict(discovery.exports(account, region, ROUTE_TABLE_EXPORTS), **values)
+    return values
+
+
+def _result(future: Future, keys: List[str], failed: List[str]):
+    """Return a lookup's result, None after adding keys to failed if it failed."""
+    try:
+        return future.result()
+    except DiscoveryError as e:
+        print(f"WARNING {e}, {', '.join(keys)} left to synth")
+        failed.extend(keys)
+        return None
+
+
+def prewarm(
+    envs: Iterable,
+    discovery=None,
+    workers: int = None,
+    project=None,
+    pipelines: List[str] = None
+) -> Tuple[Dict[str, object], List[str]]:
+    """Return the context values for every lookup envs need, and the keys that failed.
+
+    With a change-aware project and its pipelines, the recorded stage
+    fingerprints are read too.
+    """
+    if discovery is None:
+        from lib.discovery import discovery
+    envs = [e for e in envs if not e.skip and e.aws_acct.account != ""]
+    mode = project.pipeline.network_outputs if project is not None else "exports"
+    network = list(dict.fromkeys(
+        (e.aws_acct.account, e.aws_acct.region)
+        for e in envs if e.vpc_cidrs is not None
+    ))
+    routes = list(dict.fromkeys(
+        (e.aws_acct.account, e.aws_acct.region)
+        for e in envs if e.inspection_cidr is not None
+    ))
+    hubs = tgw_mesh.hubs(compile_env(e) for e in envs)
+    peered = [(h.account, h.region) for h in hubs.values()] if len(hubs) > 1 else []
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        registry = pool.submit(
+            attachment_registry.collect, envs, discovery, workers
+        )
+        tgw_ids = {
+            tgw_context_key(*key): pool.submit(discovery.lookup_tgw_id, *key)
+            for key in network
+        }
+        exports = {
+            route_tables_context_key(*key): pool.submit(
+                _route_tables, envs, *key, discovery, mode
+            )
+            for key in routes
+        }
+        peerings = {
+            tgw_peerings_context_key(*key): pool.submit(discovery.tgw_peerings, *key)
+            for key in peered
+        }
+        fingerprints = None
+        if project is not None and project.pipeline.change_aware and pipelines:
+            tooling = project.pipeline.tooling_acct
+            fingerprints = pool.submit(
+                fingerprint.fetch, project.name, compile_config(envs, pipelines),
+                tooling.account, tooling.region, discovery
+            )
+        context = {}
+        failed = []
+        for k, f in tgw_ids.items():
+            value = _result(f, [k], failed)
+            if k not in failed: # "" records a transit gateway that doesn't exist yet
+                context[k] = value or ""
+        for k, f in exports.items():
+            values = _result(f, [k], failed)
+            if values is not None and set(values) == set(ROUTE_TABLE_EXPORTS):
+                context[k] = values
+        for k, f in peerings.items():
+            values = _result(f, [k], failed)
+            if values is not None:
+                context[k] = values
+        registry_keys = [attachment_registry.CONTEXT_KEY, attachment_registry.SYNCED_KEY]
+        document = _result(registry, registry_keys, failed)
+        if document is not None: # a registry missing an account's attachments would drop their routes
+            context[attachment_registry.CONTEXT_KEY] = document.to_document()
+            context[attachment_registry.SYNCED_KEY] = attachment_registry.synced_stamp()
+        if fingerprints is not None:
+            values = _result(fingerprints, [fingerprint.context_key(p) for p in pipelines], failed)
+            context.update(values or {})
+    return context, failed
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--context-file", default=CONTEXT_FILE)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--check", action="store_true",
+                        help=f"exit {CHANGED_EXIT_CODE} if any value changed")
+    args = parser.parse_args(argv)
+
+    from deploy_config import fleet, project, _pipelines
+    context, failed = prewarm(
+        fleet,
+        workers=args.workers,
+        project=project,
+        pipelines=_pipelines
+    )
+    try:
+        with open(args.context_file) as fp:
+            previous = json.load(fp)
+    except FileNotFoundError:
+        previous = {}
+    changed = sorted(
+        k for k, v in context.items()
+        if k != attachment_registry.SYNCED_KEY and previous.get(k) != v
+    )
+    # failed lookups can't tell whether the value changed
+    changed += sorted(k for k in failed if k != attachment_registry.SYNCED_KEY)
+    update_context_file(context, args.context_file, remove=failed)
+    print(f"{len(context)} context values written to {args.context_file}, "
+          f"{len(failed)} failed, {len(changed)} changed")
+    for key in changed:
+        print(f"changed {key}")
+    if args.check and changed:
+        raise SystemExit(CHANGED_EXIT_CODE)
+
+
+if __name__ == "__main__":
+    main()
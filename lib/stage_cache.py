@@ -0,0 +1,219 @@
+"""Module to cache synthesized env stages between synths.
+
+A stage's key hashes everything its templates are built from: the
+resolved CDKTargetAWSEnv, project tags, the app context of every
+account and region it looks up, feature flags, fleet wide inputs such
+as its peerings, the source of lib and cdk_env_pipeline and the
+aws-cdk-lib version. On a hit the stage's cached cloud assembly is
+reused by a CachedStage and none of its stacks are constructed, on a
+miss the stage is built as usual and its assembly stored after synth.
+
+Enabled with -c synth_cache=true, cached stages are kept in .cdk-cache.
+Entries unused for MAX_AGE seconds, and the least recently used past
+MAX_ENTRIES, are evicted after each store.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import asdict
+from typing import Iterable, List, Optional, Tuple
+
+DEFAULT_CACHE_DIR = ".cdk-cache"
+CONTEXT_FLAG = "synth_cache"
+META_FILE = "stage-cache.json"
+MAX_ENTRIES = 200
+MAX_AGE = 14 * 24 * 3600
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SOURCE_DIRS = ["lib", "cdk_env_pipeline"]
+_FLAG_PREFIXES = ("@aws-cdk", "aws-cdk:", "aws:")
+
+
+class StageCache():
+    """Content addressed store of stage cloud assemblies."""
+
+    def __init__(
+            self,
+            cache_dir: str = DEFAULT_CACHE_DIR,
+            max_entries: int = MAX_ENTRIES,
+            max_age: int = MAX_AGE,
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._code_hash = None
+        self._pending: List[Tuple[object, str, str]] = []
+        self._used = set()  # keys looked up or stored by this process, never evicted
+
+    def enabled(self, scope) -> bool:
+        return str(scope.node.try_get_context(CONTEXT_FLAG)).lower() == "true"
+
+    def key(
+            self,
+            scope,
+            target,
+            tags: list,
+            tgw_id: Optional[str],
+            registry: bool = False,
+            places: Iterable[Tuple[str, str]] = (),
+            inputs: dict = None,
+    ) -> str:
+        """Return the key of a stage's inputs.
+
+        Context is read from scope, so values set in cdk.json, with -c or
+        by the app are all keyed, and so is scope's path: stack artifact
+        ids embed it, a stage cached under one pipeline can't be reused
+        by another. registry is True when the stage reads the
+        attachment registry, places are the (account, region) pairs it looks
+        up besides its own and inputs the fleet wide values it is built from.
+        """
+        places = [(target.aws_acct.account, target.aws_acct.region), *places]
+        scoped = [(f"account={a}", f"region={r}") for a, r in places]
+        all_context = scope.node.get_all_context()
+        context = {
+            k: v for k, v in all_context.items()
+            if k.startswith(_FLAG_PREFIXES)
+            or any(account in k and region in k for account, region in scoped)
+        }
+        if registry:
+            from lib.attachment_registry import CONTEXT_KEY
+            context[CONTEXT_KEY] = all_context.get(CONTEXT_KEY)
+        inputs = {
+            "code": self.code_hash(),
+            "path": scope.node.path,
+            "target": asdict(target),
+            "tags": tags,
+            "tgw_id": tgw_id,
+            "context": context,
+            "inputs": inputs or {},
+        }
+        return hashlib.sha256(
+            json.dumps(inputs, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    def code_hash(self) -> str:
+        """Hash the app's library source and the aws-cdk-lib version."""
+        if self._code_hash is None:
+            from importlib.metadata import version
+            digest = hashlib.sha256(version("aws-cdk-lib").encode())
+            for source_dir in _SOURCE_DIRS:
+                for root, dirs, files in os.walk(os.path.join(_ROOT, source_dir)):
+                    dirs.sort()
+                    for name in sorted(files):
+                        if name.endswith(".py"):
+                            with open(os.path.join(root, name), "rb") as fp:
+                                digest.update(name.encode())
+                                digest.update(fp.read())
+            self._code_hash = digest.hexdigest()
+        return self._code_hash
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Return the directory of a cached stage assembly, None on a miss."""
+        path = os.path.join(self.cache_dir, key)
+        meta = os.path.join(path, META_FILE)
+        if not os.path.exists(meta):
+            return None
+        self._used.add(key)
+        os.utime(meta)  # eviction is least recently used
+        return path
+
+    def add(self, stage, key: str, stack_source_hash: str) -> None:
+        """Store stage under key once the app has been synthesized."""
+        self._used.add(key)
+        self._pending.append((stage, key, stack_source_hash))
+
+    def store(self) -> int:
+        """Copy the assemblies of stages added since the last store, then evict."""
+        stored = 0
+        for stage, key, stack_source_hash in self._pending:
+            if self.lookup(key) is not None or not os.path.isdir(stage.outdir):
+                continue
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = tempfile.mkdtemp(dir=self.cache_dir)
+            shutil.copytree(stage.outdir, tmp, dirs_exist_ok=True)
+            external = self._copy_external_assets(stage.outdir, tmp)
+            with open(os.path.join(tmp, META_FILE), "w") as fp:
+                json.dump({
+                    "stack_source_hash": stack_source_hash,
+                    "external": external,
+                }, fp)
+            try:
+                os.rename(tmp, os.path.join(self.cache_dir, key))
+                stored += 1
+            except OSError:  # stored meanwhile by another worker
+                shutil.rmtree(tmp, ignore_errors=True)
+        self._pending = []
+        self.evict()
+        return stored
+
+    def evict(self) -> List[str]:
+        """Remove entries older than max_age and the oldest past max_entries.
+
+        Entries this process looked up or stored are kept.
+        """
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            meta = os.path.join(self.cache_dir, key, META_FILE)
+            if key in self._used or not os.path.exists(meta):
+                continue  # in use, or a store in progress
+            entries.append((os.path.getmtime(meta), key))
+        entries.sort(reverse=True)
+        keep = max(self.max_entries - len(self._used), 0)
+        cutoff = time.time() - self.max_age
+        evicted = [
+            key for n, (mtime, key) in enumerate(entries)
+            if n >= keep or mtime < cutoff
+        ]
+        for key in evicted:
+            shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+        return evicted
+
+    def restore(self, cached: str, outdir: str) -> dict:
+        """Copy a cached stage assembly into outdir, return its meta."""
+        with open(os.path.join(cached, META_FILE)) as fp:
+            meta = json.load(fp)
+        shutil.copytree(
+            cached, outdir, dirs_exist_ok=True,
+            ignore=shutil.ignore_patterns(META_FILE, "external")
+        )
+        for rel, name in meta["external"].items():
+            target = os.path.normpath(os.path.join(outdir, rel))
+            source = os.path.join(cached, "external", name)
+            if os.path.isdir(source):
+                shutil.copytree(source, target, dirs_exist_ok=True)
+            elif not os.path.exists(target):
+                shutil.copy2(source, target)
+        return meta
+
+    def _copy_external_assets(self, outdir: str, cached: str) -> dict:
+        """Copy file assets staged outside the stage assembly, EG: asset.<hash>."""
+        external = {}
+        for name in os.listdir(outdir):
+            if not name.endswith(".assets.json"):
+                continue
+            with open(os.path.join(outdir, name)) as fp:
+                files = json.load(fp).get("files", {})
+            for asset_hash, asset in files.items():
+                rel = asset["source"].get("path")
+                if rel is None or not rel.startswith(".."):
+                    continue
+                source = os.path.normpath(os.path.join(outdir, rel))
+                target = os.path.join(cached, "external", asset_hash)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                if os.path.isdir(source):
+                    shutil.copytree(source, target, dirs_exist_ok=True)
+                elif os.path.exists(source):
+                    shutil.copy2(source, target)
+                else:
+                    continue
+                external[rel] = asset_hash
+        return external
+
+
+"""Stage cache shared by every pipeline constructed in this process."""
+stage_cache = StageCache()
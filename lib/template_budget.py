@@ -0,0 +1,226 @@
+"""Module to check synthesized templates against CloudFormation limits.
+
+Run after synth, so a stack past a limit fails synth rather than its
+deploy. Every *.template.json of the cloud assembly, and of the nested
+stage assemblies, is measured for resources, outputs, exports,
+parameters and bytes against the StackBudget of the env it belongs to.
+Errors are stacks over budget, warnings stacks past BUDGET_WARNING of
+it. The biggest contributors per stack are listed by resource type and
+by name prefix, EG: tgw{n}-{d}CfnRoute routes or *output{n} exports.
+
+The report is written to cdk.out/template-budget.json, with parallel
+synth the reports of the workers are merged into it.
+
+EG: python -m lib.template_budget cdk.out
+"""
+import argparse
+import json
+import os
+import re
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List
+
+from lib.cdk_project_classes import StackBudget
+
+"""CloudFormation limits per stack."""
+LIMITS = {
+    "resources": 500,
+    "outputs": 200,
+    "parameters": 200,
+    "template_bytes": 1000000,  # uploaded to the bootstrap bucket by cdk
+}
+BUDGET_WARNING = 0.9  # warn when usage passes this fraction of the budget
+REPORT_FILE = "template-budget.json"
+TOP = 5  # contributors listed per stack
+
+_CIDR = re.compile(r"\d{1,3}(\.\d{1,3}){3}(--|/)\d{1,2}")
+_NUMBER = re.compile(r"\d+")
+_LOGICAL_ID_HASH = re.compile(r"[0-9A-F]{8}$")
+
+
+def name_prefix(name: str) -> str:
+    """Return name with CIDRs and numbers replaced, EG: tgw{n}-{d}CfnRoute."""
+    return _NUMBER.sub("{n}", _CIDR.sub("{d}", name))
+
+
+def _resource_name(logical_id: str, resource: dict) -> str:
+    """Return the construct id of a resource, its logical id without a path."""
+    path = resource.get("Metadata", {}).get("aws:cdk:path")
+    if path is None:
+        return _LOGICAL_ID_HASH.sub("", logical_id)
+    parts = path.split("/")
+    if parts[-1] == "Resource" and len(parts) > 1:  # L1 of an L2 construct
+        return parts[-2]
+    return parts[-1]
+
+
+@dataclass
+class StackUsage:
+    """What one synthesized template uses."""
+
+    stack: str
+    resources: int
+    outputs: int
+    exports: int
+    parameters: int
+    template_bytes: int
+    by_type: Dict[str, int] = field(default_factory=dict)
+    by_prefix: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class BudgetReport:
+    """Errors fail synth, warnings are synth report events, see app.py."""
+
+    errors: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    stacks: List[StackUsage] = field(default_factory=list)
+
+    def format(self, top: int = TOP) -> str:
+        lines = [f"ERROR {e}" for e in self.errors]
+        lines += [f"WARNING {w}" for w in self.warnings]
+        flagged = {
+            line.split()[0] for line in self.errors + self.warnings
+        }
+        for usage in self.stacks:
+            if usage.stack not in flagged:
+                continue
+            lines.append(f"{usage.stack} biggest contributors:")
+            for name, count in list(usage.by_type.items())[:top]:
+                lines.append(f"  {count:>5} type {name}")
+            for name, count in list(usage.by_prefix.items())[:top]:
+                lines.append(f"  {count:>5} name {name}")
+        return "\n".join(lines)
+
+    def write(self, outdir: str) -> str:
+        path = os.path.join(outdir, REPORT_FILE)
+        with open(path, "w") as fp:
+            json.dump(asdict(self), fp, indent=2)
+        return path
+
+    @classmethod
+    def read(cls, outdir: str) -> "BudgetReport":
+        with open(os.path.join(outdir, REPORT_FILE)) as fp:
+            report = json.load(fp)
+        return cls(
+            errors=report["errors"],
+            warnings=report["warnings"],
+            stacks=[StackUsage(**usage) for usage in report["stacks"]],
+        )
+
+
+def merge_reports(reports: List[BudgetReport]) -> BudgetReport:
+    """Return one report of the reports of assemblies merged into one outdir."""
+    merged = BudgetReport()
+    for report in reports:
+        merged.errors += report.errors
+        merged.warnings += report.warnings
+        merged.stacks += report.stacks
+    return merged
+
+
+def measure(path: str, stack: str) -> StackUsage:
+    """Return the usage of the template at path."""
+    with open(path, "rb") as fp:
+        body = fp.read()
+    template = json.loads(body)
+    resources = template.get("Resources", {})
+    outputs = template.get("Outputs", {})
+    by_type = Counter(r.get("Type") for r in resources.values())
+    by_prefix = Counter(
+        name_prefix(_resource_name(k, r)) for k, r in resources.items()
+    )
+    by_prefix.update(name_prefix(k) for k in outputs)
+    return StackUsage(
+        stack=stack,
+        resources=len(resources),
+        outputs=len(outputs),
+        exports=sum(1 for o in outputs.values() if "Export" in o),
+        parameters=len(template.get("Parameters", {})),
+        template_bytes=len(body),
+        by_type=dict(by_type.most_common()),
+        by_prefix=dict(by_prefix.most_common()),
+    )
+
+
+def _check(report: BudgetReport, usage: StackUsage, budget: StackBudget) -> None:
+    for name in LIMITS:
+        used = getattr(usage, name)
+        allowed = min(getattr(budget, name), LIMITS[name])
+        if used > allowed:
+            report.errors.append(
+                f"{usage.stack} {name} {used} exceeds budget {allowed} "
+                f"(limit {LIMITS[name]})"
+            )
+        elif used > allowed * BUDGET_WARNING:
+            report.warnings.append(
+                f"{usage.stack} {name} {used} is over "
+                f"{BUDGET_WARNING:.0%} of budget {allowed}"
+            )
+
+
+def check_assembly(
+    outdir: str,
+    budgets: Dict[str, StackBudget] = None,
+    default: StackBudget = None
+) -> BudgetReport:
+    """Check every template under outdir.
+
+    budgets maps the outdir of a nested stage assembly to the budget of
+    its env, templates elsewhere are checked against default.
+    """
+    budgets = {
+        os.path.abspath(d): b for d, b in (budgets or {}).items()
+    }
+    default = default or StackBudget()
+    report = BudgetReport()
+    root = os.path.abspath(outdir)
+    for directory, dirs, files in os.walk(root):
+        dirs.sort()
+        budget = budgets.get(directory, default)
+        for name in sorted(files):
+            if not name.endswith(".template.json"):
+                continue
+            stack = os.path.relpath(
+                os.path.join(directory, name[:-len(".template.json")]), root
+            )
+            usage = measure(os.path.join(directory, name), stack)
+            report.stacks.append(usage)
+            _check(report, usage, budget)
+    return report
+
+
+def stage_budgets(app) -> Dict[str, StackBudget]:
+    """Return the StackBudget of every env stage of a synthesized app."""
+    from lib.cdk_classes import CDKStage
+    return {
+        c.outdir: c.target.stack_budget or StackBudget()
+        for c in app.node.find_all() if isinstance(c, CDKStage)
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("outdir", nargs="?", default="cdk.out")
+    parser.add_argument("--top", type=int, default=TOP)
+    for name, value in asdict(StackBudget()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=value)
+    args = parser.parse_args(argv)
+
+    report = check_assembly(args.outdir, default=StackBudget(**{
+        name: getattr(args, name) for name in asdict(StackBudget())
+    }))
+    for usage in sorted(report.stacks, key=lambda u: -u.resources)[:args.top]:
+        print(
+            f"{usage.stack}: {usage.resources} resources, "
+            f"{usage.outputs} outputs ({usage.exports} exports), "
+            f"{usage.parameters} parameters, {usage.template_bytes} bytes"
+        )
+    print(report.format(args.top) or "every stack is within budget")
+    if report.errors:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Module to plan a transit gateway peering mesh across regions.
+
+Every region with envs has one hub: the env that owns its transit
+gateway (org_arn_to_share and vpc_cidrs). Spokes attach to the hub of
+their own region, so traffic between their vpcs stays on the local
+transit gateway, and every pair of hubs is peered. The hub whose region
+sorts first requests the peering and accepts it in the peer region, so
+hubs of a mesh share one account.
+
+Once a peering is available (looked up by lib.discovery, or from the
+context lib.prewarm wrote) both hubs associate it with their
+inspection-rt and add static routes to the peer region's vpc cidrs,
+summarized to the fewest prefixes, in egress-rt and inspection-rt. A
+peering lookup that fails fails synth, a hub stack without the routes
+of an available peering would remove them.
+"""
+from typing import Dict, Iterable, List, NamedTuple
+
+from lib.cidr_utils import summarize_cidrs
+
+
+class Peering(NamedTuple):
+    """A peering between the hubs of two regions."""
+
+    account: str
+    requester: str  # hub env names
+    accepter: str
+    requester_region: str
+    accepter_region: str
+
+    def peer_region(self, region: str) -> str:
+        return self.accepter_region if region == self.requester_region else self.requester_region
+
+
+def hubs(envs: Iterable) -> Dict[str, object]:
+    """Return the hub of every region, ValueError if a region has two.
+
+    envs are CompiledEnvs, see lib.compiled_config.
+    """
+    found = {}
+    for e in envs:
+        if not e.deployable or not e.tgw_owner or not e.vpc_cidrs:
+            continue
+        if e.region in found:
+            raise ValueError(
+                f"region {e.region} has two transit gateway hubs, "
+                f"{found[e.region].name} and {e.name}"
+            )
+        found[e.region] = e
+    return found
+
+
+def mesh_errors(envs: Iterable) -> List[str]:
+    """Return why envs can't form a mesh."""
+    try:
+        found = hubs(envs)
+    except ValueError as e:
+        return [str(e)]
+    accounts = {h.account for h in found.values()}
+    if len(accounts) > 1:
+        return [
+            "transit gateway hubs peer across regions in one account, "
+            f"not {sorted(accounts)}"
+        ]
+    return []
+
+
+def peerings(envs: Iterable) -> List[Peering]:
+    """Return the peering of every pair of hubs."""
+    found = hubs(envs)
+    regions = sorted(found)
+    return [
+        Peering(
+            account=found[a].account,
+            requester=found[a].name,
+            accepter=found[b].name,
+            requester_region=a,
+            accepter_region=b,
+        )
+        for n, a in enumerate(regions) for b in regions[n + 1:]
+    ]
+
+
+def hub_peerings(envs: Iterable, env_name: str) -> List[Peering]:
+    """Return the peerings a hub env is part of."""
+    return [
+        p for p in peerings(envs)
+        if env_name in (p.requester, p.accepter)
+    ]
+
+
+def region_cidrs(envs: Iterable) -> Dict[str, List[str]]:
+    """Return the summarized vpc cidrs of every region."""
+    cidrs = {}
+    for e in envs:
+        if e.deployable:
+            cidrs.setdefault(e.region, []).extend(str(c) for c in e.vpc_cidrs)
+    return {region: summarize_cidrs(c) for region, c in cidrs.items()}
@@ -27,7 +27,7 @@ setuptools.setup(
 
     install_requires=[
         "aws-cdk-lib>=2.0.0",
-        "constructs>=10.0.0",
+        "constructs>=10.3.0",
         "cdk-nag",
         "boto3"
     ],
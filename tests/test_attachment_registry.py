@@ -0,0 +1,28 @@
+from types import SimpleNamespace
+
+from lib.attachment_registry import LEGACY_PARAMETER, TgwAttachment, attachment_of
+
+ENV = SimpleNamespace(name="spoke", vpc_cidrs="10.1.0.0/24, 10.2.0.0/24")
+
+
+def test_record_of_the_env():
+    values = {
+        "demo-tgw-attach-spoke": '{"attachment_id": "tgw-attach-1", "cidr": "10.1.0.0/24"}',
+        LEGACY_PARAMETER: "tgw-attach-0,10.2.0.0/24",
+    }
+    assert attachment_of(ENV, values, "1", "r") == TgwAttachment(
+        "1", "r", "spoke", "tgw-attach-1", "10.1.0.0/24"
+    )
+
+
+def test_legacy_value_matched_by_cidr():
+    values = {LEGACY_PARAMETER: "tgw-attach-0,10.2.0.0/24"}
+    assert attachment_of(ENV, values, "1", "r") == TgwAttachment(
+        "1", "r", "spoke", "tgw-attach-0", "10.2.0.0/24"
+    )
+    values = {LEGACY_PARAMETER: "tgw-attach-0,10.9.0.0/24"}  # another env's vpc
+    assert attachment_of(ENV, values, "1", "r") is None
+
+
+def test_no_parameters():
+    assert attachment_of(ENV, {}, "1", "r") is None
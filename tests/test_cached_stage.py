@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+cdk = pytest.importorskip("aws_cdk")
+
+from aws_cdk import pipelines  # noqa: E402
+
+from lib.cdk_classes import CDKStage  # noqa: E402
+from lib.cdk_project_classes import CDKTargetAWSEnv  # noqa: E402
+from lib.pipeline_classes import AWSAccount  # noqa: E402
+from lib.stage_cache import StageCache  # noqa: E402
+from cdk_env_pipeline.stages.cached_stage import CachedStage  # noqa: E402
+
+ENV = cdk.Environment(account="012345678912", region="ap-southeast-2")
+TARGET = CDKTargetAWSEnv(
+    name="a",
+    aws_acct=AWSAccount(account=ENV.account, region=ENV.region),
+    approvals=None,
+    tags=[],
+)
+STAGE_ID = "demo-a-stage"
+
+
+@pytest.fixture
+def cached(tmp_path):
+    """Synthesize a stage and store it, return its cache directory."""
+    app = cdk.App(outdir=str(tmp_path / "built"))
+    stage = CDKStage(app, STAGE_ID, TARGET, env=ENV)
+    cdk.CfnWaitConditionHandle(cdk.Stack(stage, "stack"), "handle")
+    app.synth()
+    cache = StageCache(str(tmp_path / "cache"))
+    cache.add(stage, "key", "source-hash")
+    assert cache.store() == 1
+    return cache.lookup("key")
+
+
+def _templates(outdir):
+    return [
+        name for _, _, files in os.walk(outdir)
+        for name in files if name.endswith(".template.json")
+    ]
+
+
+def test_app_synth_calls_the_override(tmp_path, cached):
+    app = cdk.App(outdir=str(tmp_path / "out"))
+    stage = CachedStage(app, STAGE_ID, TARGET, cached=cached, env=ENV)
+    app.synth()
+    assert stage.stack_source_hash == "source-hash"
+    assert _templates(stage.outdir)
+
+
+def test_pipeline_add_stage_calls_the_override(tmp_path, cached):
+    app = cdk.App(outdir=str(tmp_path / "out"))
+    stack = cdk.Stack(app, "pipeline", env=ENV)
+    pipeline = pipelines.CodePipeline(stack, "pipeline",
+        synth=pipelines.ShellStep("synth",
+            input=pipelines.CodePipelineSource.git_hub("owner/repo", "main"),
+            commands=["cdk synth"]
+        )
+    )
+    stage = CachedStage(stack, STAGE_ID, TARGET, cached=cached, env=ENV)
+    pipeline.add_stage(stage)
+    app.synth()
+    assert stage.stack_source_hash == "source-hash"
+    assert _templates(stage.outdir)
@@ -0,0 +1,89 @@
+import pytest
+
+from lib.cdk_project_classes import CDKTargetAWSEnv, CIDRSizing
+from lib.cidr_allocator import CIDRAllocator, allocate_cidrs, load_state, write_state
+from lib.pipeline_classes import AWSAccount
+
+SUPERNET = "10.0.0.0/16"
+
+
+def _env(name, vpc_prefix=None, vpc_cidrs=None):
+    return CDKTargetAWSEnv(
+        name=name,
+        aws_acct=AWSAccount(account="012345678912"),
+        approvals=None,
+        tags=[],
+        vpc_cidrs=vpc_cidrs,
+        cidr_sizing=CIDRSizing(vpc_prefix, 26, 28) if vpc_prefix else None,
+    )
+
+
+def test_allocate_skips_reserved_blocks():
+    allocator = CIDRAllocator(SUPERNET)
+    allocator.reserve("10.0.0.0/24")
+    assert allocator.allocate(24) == "10.0.1.0/24"
+    assert allocator.allocate(23) == "10.0.2.0/23"
+    assert allocator.allocate(24) == "10.0.4.0/24"
+
+
+def test_allocate_raises_when_full():
+    allocator = CIDRAllocator("10.0.0.0/23")
+    allocator.allocate(24)
+    allocator.allocate(24)
+    with pytest.raises(ValueError):
+        allocator.allocate(24)
+
+
+def test_strict_reserve_raises_on_overlap():
+    allocator = CIDRAllocator(SUPERNET)
+    allocator.reserve("10.0.0.0/23")
+    with pytest.raises(ValueError):
+        allocator.reserve("10.0.1.0/24", strict=True)
+    allocator.reserve("10.0.2.0/24", strict=True)
+
+
+def test_without_allocate_sized_envs_are_pending():
+    envs = [_env("a", 24), _env("b", vpc_cidrs="10.0.0.0/24")]
+    assert allocate_cidrs(envs, SUPERNET, {}) == ["a"]
+    assert envs[0].vpc_cidrs is None
+
+
+def test_allocate_assigns_vpc_and_per_az_subnets():
+    state = {}
+    env = _env("a", 24)
+    allocate_cidrs([_env("b", vpc_cidrs="10.0.0.0/24"), env], SUPERNET, state, allocate=True)
+    assert env.vpc_cidrs == "10.0.1.0/24"
+    assert env.private_subnet == "10.0.1.0/26,10.0.1.64/26,10.0.1.128/26"
+    assert env.transit_subnet == "10.0.1.192/28,10.0.1.208/28,10.0.1.224/28"
+    assert state["a"]["vpc_prefix"] == 24
+
+
+def test_committed_assignments_stay_put_when_bigger_envs_are_added(tmp_path):
+    path = str(tmp_path / "cidr_allocations.json")
+    state = {}
+    allocate_cidrs([_env("small", 24)], SUPERNET, state, allocate=True)
+    write_state(state, path)
+
+    envs = [_env("small", 24), _env("big", 20)]
+    state = load_state(path)
+    allocate_cidrs(envs, SUPERNET, state, allocate=True)
+    assert envs[0].vpc_cidrs == "10.0.0.0/24"
+    assert envs[1].vpc_cidrs == "10.0.16.0/20"
+
+
+def test_resized_env_is_pending_until_allocated():
+    state = {}
+    allocate_cidrs([_env("a", 24)], SUPERNET, state, allocate=True)
+    assert allocate_cidrs([_env("a", 23)], SUPERNET, state) == ["a"]
+
+
+def test_assignment_overlapping_explicit_cidrs_raises():
+    state = {}
+    allocate_cidrs([_env("a", 24)], SUPERNET, state, allocate=True)
+    envs = [_env("b", vpc_cidrs="10.0.0.0/23"), _env("a", 24)]
+    with pytest.raises(ValueError, match="env a"):
+        allocate_cidrs(envs, SUPERNET, state)
+
+
+def test_load_state_without_file(tmp_path):
+    assert load_state(str(tmp_path / "missing.json")) == {}
@@ -0,0 +1,22 @@
+from lib.cidr_utils import summarize_cidrs
+
+
+def test_adjacent_and_nested_ranges_merge():
+    assert summarize_cidrs(
+        ["10.0.0.0/24", "10.0.1.0/24", "10.0.1.128/25", "10.0.0.0/24"]
+    ) == ["10.0.0.0/23"]
+
+
+def test_non_adjacent_ranges_stay_apart():
+    assert summarize_cidrs(
+        ["10.0.2.0/24", " 10.0.0.0/24", "", "192.168.0.0/16"]
+    ) == ["10.0.0.0/24", "10.0.2.0/24", "192.168.0.0/16"]
+
+
+def test_unaligned_neighbours_do_not_merge():
+    # adjacent, but 10.0.1.0/23 isn't a prefix
+    assert summarize_cidrs(["10.0.1.0/24", "10.0.2.0/24"]) == ["10.0.1.0/24", "10.0.2.0/24"]
+
+
+def test_versions_are_kept_apart():
+    assert summarize_cidrs(["fd00::/8", "10.0.0.0/8"]) == ["10.0.0.0/8", "fd00::/8"]
@@ -0,0 +1,79 @@
+import pytest
+
+from lib.cdk_project_classes import CDKTargetAWSEnv
+from lib.compiled_config import compile_config, split_values
+from lib.pipeline_classes import AWSAccount
+
+PIPELINES = ["EnvPipeline", "tgw-attachments"]
+
+
+def _env(name, **kwargs):
+    return CDKTargetAWSEnv(
+        name=name,
+        aws_acct=AWSAccount(account="012345678912"),
+        approvals=None,
+        tags=[],
+        **kwargs
+    )
+
+
+def _names(waves):
+    return [(w.name, [e.name for e in w.envs]) for w in waves]
+
+
+def test_split_values():
+    assert split_values(" a, b,,c ") == ("a", "b", "c")
+    assert split_values(None) == ()
+
+
+def test_dependency_waves_follow_what_envs_provision():
+    config = compile_config([
+        _env("routes", inspection_cidr="10.0.1.0/24"),
+        _env("spoke", vpc_cidrs="10.0.1.0/24"),
+        _env("hub", vpc_cidrs="10.0.0.0/24", org_arn_to_share="arn"),
+        _env("other"),
+    ], PIPELINES)
+    assert _names(config.dependency_waves("EnvPipeline")) == [
+        ("EnvPipeline-wave-0", ["hub", "other"]),
+        (None, ["spoke"]),
+        (None, ["routes"]),
+    ]
+
+
+def test_dependency_waves_use_a_shared_label():
+    config = compile_config([
+        _env("a", wave="apps"),
+        _env("b", wave="apps"),
+        _env("c", depends_on="a,b"),
+    ], PIPELINES)
+    assert _names(config.dependency_waves("EnvPipeline")) == [
+        ("apps", ["a", "b"]),
+        (None, ["c"]),
+    ]
+
+
+def test_dependency_waves_reject_cycles():
+    config = compile_config([
+        _env("a", depends_on="b"),
+        _env("b", depends_on="a"),
+    ], PIPELINES)
+    with pytest.raises(ValueError, match="cycle"):
+        config.dependency_waves("EnvPipeline")
+
+
+def test_labelled_waves_group_by_label():
+    config = compile_config([
+        _env("a", wave="first"),
+        _env("b"),
+        _env("c", wave="first"),
+        _env("d", wave="second", pipelines="tgw-attachments"),
+    ], PIPELINES)
+    assert _names(config.labelled_waves("EnvPipeline")) == [
+        ("first", ["a", "c"]),
+        (None, ["b"]),
+    ]
+    assert _names(config.labelled_waves("EnvPipeline", ["b", "c"])) == [
+        (None, ["b"]),
+        ("first", ["c"]),
+    ]
+    assert _names(config.labelled_waves("tgw-attachments")) == [("second", ["d"])]
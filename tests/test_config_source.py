@@ -0,0 +1,99 @@
+import json
+import os
+
+import pytest
+
+from lib.cdk_project_classes import CDKTargetAWSEnv, CIDRSizing
+from lib.config_source import (
+    INDEX_FILE,
+    ConfigSource,
+    build_index,
+    env_from_dict,
+    env_to_dict,
+    export,
+)
+from lib.pipeline_classes import AWSAccount, PipelineApproval, Tag
+
+PIPELINES = ["EnvPipeline", "tgw-attachments", "tgw-routes"]
+
+
+def _env(name, account, **kwargs):
+    return CDKTargetAWSEnv(
+        name=name,
+        aws_acct=AWSAccount(account=account, region="ap-southeast-2"),
+        approvals=PipelineApproval(approver_email="team@example.com"),
+        tags=[Tag("environment", name)],
+        **kwargs
+    )
+
+
+ENVS = [
+    _env("network", "111111111111", vpc_cidrs="10.0.0.0/24", org_arn_to_share="arn"),
+    _env("dev", "222222222222", pipelines="tgw-attachments", wave="apps",
+         cidr_sizing=CIDRSizing(24, 26, 28)),
+    _env("prod", "222222222222", pipelines="tgw-attachments", vpc_cidrs="10.0.1.0/24"),
+    _env("routes", "111111111111", pipelines="tgw-routes", inspection_cidr="10.0.0.0/24"),
+]
+
+
+@pytest.fixture
+def config_dir(tmp_path):
+    directory = str(tmp_path / "config")
+    export(ENVS, directory)
+    with open(os.path.join(directory, INDEX_FILE), "w") as fp:
+        json.dump(build_index(directory, PIPELINES), fp)
+    return directory
+
+
+def test_env_dict_round_trip():
+    for env in ENVS:
+        assert env_from_dict(env_to_dict(env)) == env
+
+
+def test_env_from_dict_defaults_and_lists():
+    env = env_from_dict(
+        {"name": "a", "approvals": None, "pipelines": ["x", "y"], "tags": {"k": "v"}},
+        account="012345678912", region="ap-southeast-2"
+    )
+    assert env.aws_acct == AWSAccount(account="012345678912", region="ap-southeast-2")
+    assert env.pipelines == "x,y"
+    assert env.tags == [Tag("k", "v")]
+
+
+def test_env_from_dict_rejects_unknown_fields():
+    with pytest.raises(ValueError, match="unknown fields"):
+        env_from_dict({"name": "a", "vpc_cidr": "10.0.0.0/24"})
+
+
+def test_files_for(config_dir):
+    source = ConfigSource(config_dir, PIPELINES)
+    assert source.files_for() == ["111111111111.json", "222222222222.json"]
+    assert source.files_for(pipelines=["tgw-attachments"]) == ["222222222222.json"]
+    assert source.files_for(pipelines=["EnvPipeline", "tgw-routes"]) == ["111111111111.json"]
+    assert source.files_for(pipelines=["tgw-attachments"], env_names=["routes"]) == ["111111111111.json"]
+    with pytest.raises(ValueError, match="missing"):
+        source.files_for(env_names=["missing"])
+
+
+def test_partial_load_sees_the_fleet(config_dir):
+    source = ConfigSource(config_dir, PIPELINES)
+    envs = source.load(pipelines=["tgw-attachments"])
+    assert [e.name for e in envs] == ["dev", "prod"]
+    fleet = source.fleet(envs)
+    assert [e.name for e in fleet] == ["network", "routes", "dev", "prod"]
+    assert fleet[2] is envs[0]
+    network = fleet[0]
+    assert network.vpc_cidrs == "10.0.0.0/24" and network.org_arn_to_share == "arn"
+    assert network.aws_acct.account == "111111111111"
+    assert network.approvals is None  # only its fleet fields
+
+
+def test_load_rejects_a_stale_index(config_dir):
+    path = os.path.join(config_dir, "222222222222.json")
+    with open(path) as fp:
+        data = json.load(fp)
+    data["envs"][1]["vpc_cidrs"] = "10.0.2.0/24"
+    with open(path, "w") as fp:
+        json.dump(data, fp)
+    with pytest.raises(ValueError, match="changed since"):
+        ConfigSource(config_dir, PIPELINES).load(pipelines=["tgw-attachments"])
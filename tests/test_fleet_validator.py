@@ -0,0 +1,105 @@
+from lib.cdk_project_classes import CDKTargetAWSEnv
+from lib.compiled_config import compile_env
+from lib.fleet_validator import Interval, sweep_overlaps, validate_fleet
+from lib.pipeline_classes import AWSAccount
+
+
+def _env(name, region="ap-southeast-2", **kwargs):
+    return compile_env(CDKTargetAWSEnv(
+        name=name,
+        aws_acct=AWSAccount(account="012345678912", region=region),
+        approvals=None,
+        tags=[],
+        **kwargs
+    ))
+
+
+def test_sweep_overlaps_pairs_only_overlapping_intervals():
+    a = Interval(0, 9, "vpc", "a")
+    b = Interval(5, 14, "vpc", "b")
+    c = Interval(15, 20, "vpc", "c")
+    assert sweep_overlaps([c, b, a]) == [(a, b)]
+
+
+def test_overlapping_vpcs():
+    report = validate_fleet([
+        _env("a", vpc_cidrs="10.0.0.0/23"),
+        _env("b", vpc_cidrs="10.0.1.0/24"),
+        _env("skipped", vpc_cidrs="10.0.0.0/24", skip=True),
+    ])
+    assert report.errors == ["a vpc 10.0.0.0/23 overlaps b vpc 10.0.1.0/24"]
+
+
+def test_onprem_ranges_may_nest_but_not_overlap_vpcs():
+    report = validate_fleet([
+        _env("a", vpc_cidrs="10.0.0.0/24", onprem_cidr="192.168.0.0/16,192.168.1.0/24"),
+        _env("b", vpc_cidrs="192.168.2.0/24"),
+    ])
+    assert report.errors == [
+        "onprem 192.168.0.0/16 overlaps b vpc 192.168.2.0/24"
+    ]
+
+
+def test_subnets_outside_or_overflowing_their_vpc():
+    report = validate_fleet([
+        _env("a", vpc_cidrs="10.0.0.0/24", contiguous="False",
+             private_subnet="10.0.0.0/26,10.0.1.0/26"),
+        _env("b", vpc_cidrs="10.1.0.0/24", private_subnet="25", transit_subnet="26"),
+    ])
+    assert report.errors == [
+        "a private_subnet 10.0.1.0/26 is outside vpc 10.0.0.0/24",
+        "b subnets need more addresses than vpc 10.1.0.0/24",
+    ]
+
+
+def test_vpcs_outside_overall_cidr_warn():
+    report = validate_fleet([
+        _env("a", vpc_cidrs="10.0.0.0/24", overall_cidr="10.0.0.0/16"),
+        _env("b", vpc_cidrs="10.1.0.0/24"),
+    ])
+    assert report.errors == []
+    assert report.warnings == [
+        "b vpc 10.1.0.0/24 is outside overall_cidr 10.0.0.0/16, "
+        "inspection vpc won't route to it"
+    ]
+
+
+def test_inspection_cidr_is_the_cidr_of_a_vpc_of_another_env():
+    report = validate_fleet([
+        _env("inspection", vpc_cidrs="10.0.0.0/24", public_subnet="28"),
+        _env("tgw-routes", inspection_cidr="10.0.0.0/24"),
+    ])
+    assert report.errors == []
+    report = validate_fleet([
+        _env("inspection", vpc_cidrs="10.0.0.0/24", inspection_cidr="10.0.1.0/24"),
+    ])
+    assert report.errors == [
+        "inspection has an inspection_cidr and vpc_cidrs, "
+        "an env routing its region's attachments can't attach a vpc",
+        "inspection inspection_cidr 10.0.1.0/24 is not the cidr of any vpc",
+    ]
+
+
+def test_tgw_quotas_are_per_region():
+    envs = [
+        _env("a", vpc_cidrs="10.0.0.0/24,10.0.1.0/24"),
+        _env("b", region="eu-west-1", vpc_cidrs="10.1.0.0/24"),
+    ]
+    report = validate_fleet(envs, quotas={"tgw_attachments": 2})
+    assert report.errors == []
+    assert report.quotas["tgw_attachments"] == {"projected": 2, "limit": 2}
+    assert report.warnings == [
+        "tgw_attachments of ap-southeast-2 2 is over 80% of quota 2"
+    ]
+    report = validate_fleet(envs, quotas={"tgw_attachments": 1})
+    assert report.errors == ["tgw_attachments of ap-southeast-2 2 exceeds quota 1"]
+
+
+def test_peering_attachments_count_against_each_hub():
+    envs = [
+        _env("hub-ap", vpc_cidrs="10.0.0.0/24", org_arn_to_share="arn"),
+        _env("hub-eu", region="eu-west-1", vpc_cidrs="10.1.0.0/24", org_arn_to_share="arn"),
+    ]
+    report = validate_fleet(envs)
+    assert report.quotas["tgw_peering_attachments"]["projected"] == 1
+    assert report.quotas["tgw_attachments"]["projected"] == 2  # its vpc and the peering
@@ -0,0 +1,27 @@
+import pytest
+
+from lib.network_manifest import DOCUMENT_VERSION, is_lookup_dummy, parse, route_tables
+
+TABLES = {"egress-rt-id": "tgw-rtb-1", "inspection-rt-id": "tgw-rtb-2"}
+
+
+def _document(env, tables):
+    return {"version": DOCUMENT_VERSION, "env": env, "vpcs": [], "tgw_route_tables": tables}
+
+
+def test_route_tables_of_the_owner():
+    documents = [None, _document("spoke", {}), _document("network", TABLES)]
+    assert route_tables(documents) == TABLES
+
+
+def test_route_tables_rejects_two_owners():
+    documents = [_document("a", TABLES), _document("b", TABLES)]
+    with pytest.raises(ValueError, match="one owner"):
+        route_tables(documents)
+
+
+def test_lookup_dummy_parses_to_none():
+    value = "dummy-value-for-demo-network-manifest-network"
+    assert is_lookup_dummy(value)
+    assert parse(value) is None
+    assert not is_lookup_dummy('{"version": 1}')
@@ -0,0 +1,108 @@
+import ipaddress
+
+import pytest
+
+cdk = pytest.importorskip("aws_cdk")
+
+from aws_cdk.assertions import Template  # noqa: E402
+
+from lib.cdk_classes import CDKStage  # noqa: E402
+from lib.cdk_project_classes import CDKTargetAWSEnv, StackBudget  # noqa: E402
+from lib.compiled_config import SubnetSpec  # noqa: E402
+from lib.pipeline_classes import AWSAccount  # noqa: E402
+from lib.template_budget import check_assembly, stage_budgets  # noqa: E402
+from cdk_env_pipeline.stacks.network_stack import NetworkStack  # noqa: E402
+
+ENV = cdk.Environment(account="012345678912", region="ap-southeast-2")
+TARGET = CDKTargetAWSEnv(
+    name="a",
+    aws_acct=AWSAccount(account=ENV.account, region=ENV.region),
+    approvals=None,
+    tags=[],
+)
+
+
+def _network_stack(tmp_path, target=TARGET, **kwargs):
+    app = cdk.App(outdir=str(tmp_path))
+    stage = CDKStage(app, "demo-a-stage", target, env=ENV)
+    args = dict(
+        overall_cidr=(ipaddress.ip_network("10.0.0.0/8"),),
+        onprem_cidr=(),
+        vpc_cidrs=(ipaddress.ip_network("10.1.0.0/24"),),
+        transit_subnet=SubnetSpec(28, ()),
+        private_subnet=SubnetSpec(26, ()),
+        public_subnet=None,
+        contiguous=True,
+        org_arn_to_share=None,
+        tgw_id="tgw-0123456789abcdef0",
+    )
+    args.update(kwargs)
+    return NetworkStack(stage, "networking", **args)
+
+
+def test_subnets_follow_the_configured_azs(tmp_path):
+    template = Template.from_stack(
+        _network_stack(tmp_path, availability_zones=("a", "b"))
+    )
+    subnets = template.find_resources("AWS::EC2::Subnet")
+    assert len(subnets) == 4  # private and transit per AZ
+    assert len({s["Properties"]["AvailabilityZone"] for s in subnets.values()}) == 2
+    attach, = template.find_resources("AWS::EC2::TransitGatewayAttachment").values()
+    transit = [ref["Ref"] for ref in attach["Properties"]["SubnetIds"]]
+    assert len(transit) == 2
+    assert all("transitsubnet" in ref for ref in transit)
+
+
+def test_routes_past_the_budget_spill_into_a_shard(tmp_path):
+    budget = StackBudget(resources=50)
+    target = CDKTargetAWSEnv(
+        name="a",
+        aws_acct=TARGET.aws_acct,
+        approvals=None,
+        tags=[],
+        stack_budget=budget,
+    )
+    stack = _network_stack(
+        tmp_path,
+        target=target,
+        overall_cidr=tuple(
+            ipaddress.ip_network(f"10.{i}.0.0/16") for i in range(8)
+        ),
+        onprem_cidr=(ipaddress.ip_network("192.168.0.0/16"),),
+        vpc_cidrs=(ipaddress.ip_network("10.1.0.0/23"),),
+        public_subnet=28,  # inspection vpc, routes every destination
+        network_outputs="manifest",  # provisioned after the routes
+    )
+    assert len(stack.shards) == 1
+    app = stack.stage.node.root
+    app.synth()
+    report = check_assembly(app.outdir, stage_budgets(app))
+    assert report.errors == []
+    resources = {usage.stack.split("/")[-1]: usage.resources for usage in report.stacks}
+    # counted from the construct tree, so they match the templates
+    assert resources == {
+        s.artifact_id: s.resource_count for s in [stack] + stack.shards
+    }
+    assert all(0 < n <= budget.resources for n in resources.values())
+
+
+def test_tgw_prefix_list_replaces_a_route_per_destination(tmp_path):
+    template = Template.from_stack(_network_stack(
+        tmp_path,
+        overall_cidr=(
+            ipaddress.ip_network("10.0.0.0/9"), ipaddress.ip_network("10.128.0.0/9")
+        ),
+        onprem_cidr=(ipaddress.ip_network("192.168.0.0/16"),),
+        vpc_cidrs=(ipaddress.ip_network("10.1.0.0/23"),),
+        public_subnet=28,  # inspection vpc, routes to the overall and onprem cidrs
+        tgw_prefix_list=True,
+    ))
+    prefix_list, = template.find_resources("AWS::EC2::PrefixList").values()
+    entries = prefix_list["Properties"]["Entries"]
+    assert [e["Cidr"] for e in entries] == ["10.0.0.0/8", "192.168.0.0/16"]
+    assert prefix_list["Properties"]["MaxEntries"] == 2
+    routes = template.find_resources("AWS::EC2::Route", {
+        "Properties": {"TransitGatewayId": "tgw-0123456789abcdef0"}
+    })
+    assert len(routes) == 9  # one per private, transit and public route table
+    assert all("DestinationPrefixListId" in r["Properties"] for r in routes.values())
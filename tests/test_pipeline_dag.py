@@ -0,0 +1,113 @@
+import sys
+import types
+
+import pytest
+
+from lib.pipeline_dag import (
+    FAN_IN_GATE,
+    fan_in_ready,
+    latest_succeeded,
+    upstreams,
+    validate_dag,
+)
+
+PIPELINES = ["EnvPipeline", "tgw-attachments", "tgw-attachments-eu", "tgw-routes"]
+
+
+def test_validate_dag_orders_pipelines():
+    dag = {
+        "tgw-routes": ["tgw-attachments", "tgw-attachments-eu"],
+        "tgw-attachments": ["EnvPipeline"],
+        "tgw-attachments-eu": ["EnvPipeline"],
+    }
+    order = validate_dag(dag, PIPELINES)
+    assert order.index("EnvPipeline") < order.index("tgw-attachments")
+    assert order[-1] == "tgw-routes"
+
+
+def test_validate_dag_rejects_unknown_pipelines():
+    with pytest.raises(ValueError, match="unknown"):
+        validate_dag({"tgw-routes": ["missing"]}, PIPELINES)
+
+
+def test_validate_dag_rejects_cycles():
+    dag = {"tgw-attachments": ["tgw-routes"], "tgw-routes": ["tgw-attachments"]}
+    with pytest.raises(ValueError, match="cycle"):
+        validate_dag(dag, PIPELINES)
+
+
+def test_upstreams_are_deduplicated():
+    assert upstreams({"tgw-routes": ["a", "b", "a"]}, "tgw-routes") == ["a", "b"]
+
+
+def test_latest_succeeded_skips_running_and_failed():
+    summaries = [
+        {"pipelineExecutionId": "3", "status": "InProgress"},
+        {"pipelineExecutionId": "2", "status": "Failed"},
+        {"pipelineExecutionId": "1", "status": "Succeeded"},
+    ]
+    assert latest_succeeded(summaries) == "1"
+    assert latest_succeeded(summaries[:2]) is None
+
+
+def test_fan_in_waits_for_every_upstream_to_succeed_again():
+    consumed = {"a": "a1", "b": "b1"}
+    # a finished a new run before b's new run started, b1 was already used
+    assert not fan_in_ready({"a": "a2", "b": "b1"}, consumed)
+    assert fan_in_ready({"a": "a2", "b": "b2"}, consumed)
+
+
+def test_fan_in_needs_a_success_of_every_upstream():
+    assert not fan_in_ready({"a": "a1", "b": None}, {})
+    assert fan_in_ready({"a": "a1", "b": "b1"}, {})
+
+
+class _Gate:
+    """Runs FAN_IN_GATE against fake codepipeline and ssm clients."""
+
+    def __init__(self, monkeypatch, executions):
+        self.executions = executions
+        self.parameters = {}
+        self.started = []
+        gate = self
+
+        class NotFound(Exception):
+            pass
+
+        class Client:
+            exceptions = types.SimpleNamespace(ParameterNotFound=NotFound)
+
+            def list_pipeline_executions(self, pipelineName, maxResults):
+                return {"pipelineExecutionSummaries": gate.executions[pipelineName]}
+
+            def start_pipeline_execution(self, name):
+                gate.started.append(name)
+
+            def get_parameter(self, Name):
+                if Name not in gate.parameters:
+                    raise NotFound(Name)
+                return {"Parameter": {"Value": gate.parameters[Name]}}
+
+            def put_parameter(self, Name, Value, Type, Overwrite):
+                gate.parameters[Name] = Value
+
+        monkeypatch.setitem(sys.modules, "boto3", types.SimpleNamespace(client=lambda name: Client()))
+        monkeypatch.setenv("UPSTREAMS", "a,b")
+        monkeypatch.setenv("DOWNSTREAM", "down")
+        monkeypatch.setenv("STATE_PARAMETER", "/demo/fan-in/down")
+        self.module = {}
+        exec(FAN_IN_GATE, self.module)
+
+    def succeed(self, pipeline, execution):
+        self.executions[pipeline].insert(0, {"pipelineExecutionId": execution, "status": "Succeeded"})
+        return self.module["handler"]({}, None)["started"]
+
+
+def test_gate_starts_downstream_once_per_round(monkeypatch):
+    gate = _Gate(monkeypatch, {"a": [], "b": []})
+    assert not gate.succeed("a", "a1")
+    assert gate.succeed("b", "b1")
+    # a's next round finishes before b's next run has started
+    assert not gate.succeed("a", "a2")
+    assert gate.succeed("b", "b2")
+    assert gate.started == ["down", "down"]
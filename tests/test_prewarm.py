@@ -0,0 +1,60 @@
+import pytest
+
+from lib.cdk_project_classes import CDKTargetAWSEnv
+from lib.discovery import DiscoveryError, tgw_peerings_context_key
+from lib.pipeline_classes import AWSAccount
+from lib.prewarm import prewarm
+
+ACCOUNT = "012345678912"
+
+
+def _hub(name, region, cidr):
+    return CDKTargetAWSEnv(
+        name=name,
+        aws_acct=AWSAccount(account=ACCOUNT, region=region),
+        approvals=None,
+        tags=[],
+        vpc_cidrs=cidr,
+        org_arn_to_share="arn",
+    )
+
+
+class FakeDiscovery:
+    """Peerings of eu-west-1 can't be looked up."""
+
+    def lookup_tgw_id(self, account, region):
+        return f"tgw-{region}"
+
+    def ssm_parameters(self, account, region, names):
+        return {}
+
+    def exports(self, account, region, names):
+        return {}
+
+    def tgw_peerings(self, account, region):
+        if region == "eu-west-1":
+            raise DiscoveryError("AccessDenied")
+        return {"eu-west-1": "tgw-attach-1"}
+
+
+def test_failed_peering_lookup_leaves_its_key_unset():
+    envs = [_hub("hub-au", "ap-southeast-2", "10.0.0.0/24"), _hub("hub-eu", "eu-west-1", "10.1.0.0/24")]
+    context, failed = prewarm(envs, discovery=FakeDiscovery(), workers=2)
+    ok = tgw_peerings_context_key(ACCOUNT, "ap-southeast-2")
+    broken = tgw_peerings_context_key(ACCOUNT, "eu-west-1")
+    assert context[ok] == {"eu-west-1": "tgw-attach-1"}
+    assert broken not in context
+    assert failed == [broken]
+
+
+def test_discovery_raises_on_a_failed_peering_lookup(tmp_path):
+    exceptions = pytest.importorskip("botocore.exceptions")
+    from lib.discovery import Discovery, DiscoveryCache
+
+    class Failing(Discovery):
+        def _describe_tgw_peerings(self, account, region):
+            raise exceptions.ClientError({"Error": {"Code": "AccessDenied"}}, "DescribeTransitGatewayPeeringAttachments")
+
+    discovery = Failing(DiscoveryCache(str(tmp_path / "cache.json")))
+    with pytest.raises(DiscoveryError, match="AccessDenied"):
+        discovery.tgw_peerings(ACCOUNT, "eu-west-1")
@@ -0,0 +1,72 @@
+import os
+import time
+from types import SimpleNamespace
+
+from lib.cdk_project_classes import CDKTargetAWSEnv
+from lib.pipeline_classes import AWSAccount
+from lib.stage_cache import META_FILE, StageCache
+
+TARGET = CDKTargetAWSEnv(
+    name="a",
+    aws_acct=AWSAccount(account="012345678912", region="ap-southeast-2"),
+    approvals=None,
+    tags=[],
+)
+
+
+def _scope(context, path="app/pipeline"):
+    return SimpleNamespace(node=SimpleNamespace(path=path, get_all_context=lambda: dict(context)))
+
+
+def _entry(cache, key, age=0):
+    os.makedirs(os.path.join(cache.cache_dir, key))
+    meta = os.path.join(cache.cache_dir, key, META_FILE)
+    with open(meta, "w") as fp:
+        fp.write("{}")
+    stamp = time.time() - age
+    os.utime(meta, (stamp, stamp))
+
+
+def test_key_reads_the_scope_context(tmp_path):
+    cache = StageCache(str(tmp_path))
+    cache._code_hash = "code"
+    own = "tgw:account=012345678912:region=ap-southeast-2"
+    peer = "tgw:account=012345678912:region=eu-west-1"
+    base = cache.key(_scope({own: "tgw-1"}), TARGET, tags=[], tgw_id=None)
+    assert base != cache.key(_scope({own: "tgw-2"}), TARGET, tags=[], tgw_id=None)
+    assert base == cache.key(_scope({own: "tgw-1", peer: "tgw-3"}), TARGET, tags=[], tgw_id=None)
+    peered = cache.key(
+        _scope({own: "tgw-1", peer: "tgw-3"}), TARGET, tags=[], tgw_id=None,
+        places=[("012345678912", "eu-west-1")]
+    )
+    assert peered != cache.key(
+        _scope({own: "tgw-1", peer: "tgw-4"}), TARGET, tags=[], tgw_id=None,
+        places=[("012345678912", "eu-west-1")]
+    )
+    assert base != cache.key(_scope({own: "tgw-1"}), TARGET, tags=[], tgw_id=None, inputs={"x": 1})
+
+
+def test_key_differs_per_pipeline(tmp_path):
+    cache = StageCache(str(tmp_path))
+    cache._code_hash = "code"
+    assert cache.key(_scope({}, "app/a"), TARGET, tags=[], tgw_id=None) != \
+        cache.key(_scope({}, "app/b"), TARGET, tags=[], tgw_id=None)
+
+
+def test_evict_removes_old_and_least_recently_used(tmp_path):
+    cache = StageCache(str(tmp_path), max_entries=2, max_age=100)
+    _entry(cache, "expired", age=200)
+    _entry(cache, "oldest", age=30)
+    _entry(cache, "older", age=20)
+    _entry(cache, "newest", age=10)
+    assert sorted(cache.evict()) == ["expired", "oldest"]
+    assert sorted(os.listdir(str(tmp_path))) == ["newest", "older"]
+
+
+def test_evict_keeps_entries_in_use(tmp_path):
+    cache = StageCache(str(tmp_path), max_entries=1, max_age=100)
+    _entry(cache, "used", age=200)
+    _entry(cache, "other", age=10)
+    assert cache.lookup("used") is not None
+    assert cache.evict() == ["other"]
+    assert os.listdir(str(tmp_path)) == ["used"]
@@ -0,0 +1,97 @@
+import json
+import os
+
+from lib.cdk_project_classes import StackBudget
+from lib.parallel_synth import merge_assemblies
+from lib.template_budget import (
+    BudgetReport,
+    check_assembly,
+    measure,
+    merge_reports,
+    name_prefix,
+)
+
+
+def _route(path):
+    return {"Type": "AWS::EC2::Route", "Metadata": {"aws:cdk:path": path}}
+
+
+def _template(directory, stack, resources=0, outputs=0):
+    os.makedirs(directory, exist_ok=True)
+    template = {
+        "Resources": {
+            f"tgw{n}10000016RouteA1B2C3D4": _route(f"stage/{stack}/tgw{n}-10.0.0.0--16")
+            for n in range(resources)
+        },
+        "Outputs": {
+            f"output{n}": {"Value": "v", "Export": {"Name": f"e{n}"}}
+            for n in range(outputs)
+        },
+    }
+    path = os.path.join(directory, f"{stack}.template.json")
+    with open(path, "w") as fp:
+        json.dump(template, fp)
+    return path
+
+
+def test_name_prefix_replaces_cidrs_and_numbers():
+    assert name_prefix("tgw12-10.0.0.0/16CfnRoute") == "tgw{n}-{d}CfnRoute"
+    assert name_prefix("private_rt_id_output_2") == "private_rt_id_output_{n}"
+
+
+def test_measure_counts_and_groups_by_prefix(tmp_path):
+    path = _template(str(tmp_path), "networking", resources=3, outputs=2)
+    usage = measure(path, "networking")
+    assert (usage.resources, usage.outputs, usage.exports) == (3, 2, 2)
+    assert usage.by_type == {"AWS::EC2::Route": 3}
+    assert usage.by_prefix == {"tgw{n}-{d}": 3, "output{n}": 2}
+    assert usage.template_bytes == os.path.getsize(path)
+
+
+def test_check_assembly_uses_the_budget_of_each_stage(tmp_path):
+    stage = str(tmp_path / "assembly-stage")
+    _template(str(tmp_path), "pipeline", resources=10)
+    _template(stage, "networking", resources=10)
+    report = check_assembly(str(tmp_path), {stage: StackBudget(resources=5)})
+    assert report.errors == [
+        "assembly-stage/networking resources 10 exceeds budget 5 (limit 500)"
+    ]
+    assert report.warnings == []
+    assert [u.stack for u in report.stacks] == ["pipeline", "assembly-stage/networking"]
+
+
+def test_check_assembly_warns_near_the_budget(tmp_path):
+    _template(str(tmp_path), "networking", resources=10)
+    report = check_assembly(str(tmp_path), default=StackBudget(resources=11))
+    assert report.errors == []
+    assert report.warnings == ["networking resources 10 is over 90% of budget 11"]
+    assert "networking biggest contributors:" in report.format()
+
+
+def test_report_round_trips_and_merges(tmp_path):
+    a = str(tmp_path / "a")
+    b = str(tmp_path / "b")
+    _template(a, "one", resources=10)
+    _template(b, "two", resources=2)
+    check_assembly(a, default=StackBudget(resources=5)).write(a)
+    check_assembly(b).write(b)
+    merged = merge_reports([BudgetReport.read(a), BudgetReport.read(b)])
+    assert merged.errors == ["one resources 10 exceeds budget 5 (limit 500)"]
+    assert [u.stack for u in merged.stacks] == ["one", "two"]
+
+
+def test_merge_assemblies_merges_budget_reports(tmp_path):
+    sources = []
+    for name, resources in [("a", 1), ("b", 2)]:
+        source = str(tmp_path / name)
+        _template(source, f"{name}-stack", resources=resources)
+        with open(os.path.join(source, "manifest.json"), "w") as fp:
+            json.dump({"artifacts": {f"{name}-stack": {}}}, fp)
+        with open(os.path.join(source, "cdk.out"), "w") as fp:
+            json.dump({"version": "1"}, fp)
+        check_assembly(source).write(source)
+        sources.append(source)
+    outdir = str(tmp_path / "out")
+    merge_assemblies(sources, outdir)
+    report = BudgetReport.read(outdir)
+    assert {u.stack: u.resources for u in report.stacks} == {"a-stack": 1, "b-stack": 2}
@@ -0,0 +1,66 @@
+from lib import tgw_mesh
+from lib.cdk_project_classes import CDKTargetAWSEnv
+from lib.compiled_config import compile_env
+from lib.pipeline_classes import AWSAccount
+
+
+def _env(name, region, account="012345678912", **kwargs):
+    return compile_env(CDKTargetAWSEnv(
+        name=name,
+        aws_acct=AWSAccount(account=account, region=region),
+        approvals=None,
+        tags=[],
+        **kwargs
+    ))
+
+
+def _hub(name, region, cidr, **kwargs):
+    return _env(name, region, vpc_cidrs=cidr, org_arn_to_share="arn", **kwargs)
+
+
+def test_hubs_one_per_region():
+    envs = [
+        _hub("hub-ap", "ap-southeast-2", "10.0.0.0/24"),
+        _env("spoke-ap", "ap-southeast-2", vpc_cidrs="10.0.1.0/24"),
+        _hub("hub-eu", "eu-west-1", "10.1.0.0/24"),
+        _hub("skipped", "eu-west-1", "10.1.1.0/24", skip=True),
+        _env("tgw-routes", "eu-west-1", org_arn_to_share="arn"),  # owns no vpc
+    ]
+    hubs = tgw_mesh.hubs(envs)
+    assert {region: hub.name for region, hub in hubs.items()} == {
+        "ap-southeast-2": "hub-ap", "eu-west-1": "hub-eu"
+    }
+    assert tgw_mesh.mesh_errors(envs) == []
+    peering, = tgw_mesh.peerings(envs)
+    assert (peering.requester, peering.accepter) == ("hub-ap", "hub-eu")
+    assert tgw_mesh.hub_peerings(envs, "spoke-ap") == []
+
+
+def test_mesh_errors_two_hubs_in_a_region():
+    envs = [
+        _hub("a", "ap-southeast-2", "10.0.0.0/24"),
+        _hub("b", "ap-southeast-2", "10.0.1.0/24"),
+    ]
+    assert tgw_mesh.mesh_errors(envs) == [
+        "region ap-southeast-2 has two transit gateway hubs, a and b"
+    ]
+
+
+def test_mesh_errors_hubs_in_different_accounts():
+    envs = [
+        _hub("a", "ap-southeast-2", "10.0.0.0/24"),
+        _hub("b", "eu-west-1", "10.1.0.0/24", account="111111111111"),
+    ]
+    error, = tgw_mesh.mesh_errors(envs)
+    assert "one account" in error
+
+
+def test_region_cidrs_are_summarized():
+    envs = [
+        _env("a", "ap-southeast-2", vpc_cidrs="10.0.0.0/25"),
+        _env("b", "ap-southeast-2", vpc_cidrs="10.0.0.128/25"),
+        _env("c", "eu-west-1", vpc_cidrs="10.1.0.0/24"),
+    ]
+    assert tgw_mesh.region_cidrs(envs) == {
+        "ap-southeast-2": ["10.0.0.0/24"], "eu-west-1": ["10.1.0.0/24"]
+    }